@@ -7,3 +7,4 @@ A Basic parser for US postal addresses.
 """
 
 from .parser import *
+from .cache import LRUCache, phonetic_cache, phonetic_key, preload_phonetic_keys
@@ -0,0 +1,531 @@
+# -*- coding: utf-8 -*-
+# Generated from support/suffixes.csv by "python -m address_parser.grammar". Do not edit.
+
+STREET_TYPES = [
+    ('allee', 'aly'),
+    ('alley', 'aly'),
+    ('ally', 'aly'),
+    ('aly', 'aly'),
+    ('anex', 'anx'),
+    ('annex', 'anx'),
+    ('annx', 'anx'),
+    ('anx', 'anx'),
+    ('arcade', 'arc'),
+    ('arc', 'arc'),
+    ('av', 'ave'),
+    ('ave', 'ave'),
+    ('aven', 'ave'),
+    ('avenu', 'ave'),
+    ('avenue', 'ave'),
+    ('avn', 'ave'),
+    ('avnu', 'ave'),
+    ('avnue', 'ave'),
+    ('bch', 'bch'),
+    ('beach', 'bch'),
+    ('bg', 'bg'),
+    ('burg', 'bg'),
+    ('burgs', 'bg'),
+    ('blf', 'blf'),
+    ('bluf', 'blf'),
+    ('bluff', 'blf'),
+    ('bluffs', 'blf'),
+    ('bl', 'blvd'),
+    ('blv', 'blvd'),
+    ('blvd', 'blvd'),
+    ('boul', 'blvd'),
+    ('boulevard', 'blvd'),
+    ('boulv', 'blvd'),
+    ('bulevard', 'blvd'),
+    ('bv', 'blvd'),
+    ('bvd', 'blvd'),
+    ('bend', 'bnd'),
+    ('bnd', 'bnd'),
+    ('branch', 'br'),
+    ('br', 'br'),
+    ('brnch', 'br'),
+    ('brdge', 'brg'),
+    ('brg', 'brg'),
+    ('bridge', 'brg'),
+    ('brk', 'brk'),
+    ('brook', 'brk'),
+    ('brooks', 'brk'),
+    ('bot', 'btm'),
+    ('bottm', 'btm'),
+    ('bottom', 'btm'),
+    ('btm', 'btm'),
+    ('bps', 'byp'),
+    ('bpss', 'byp'),
+    ('bypa', 'byp'),
+    ('bypas', 'byp'),
+    ('bypass', 'byp'),
+    ('byp', 'byp'),
+    ('byps', 'byp'),
+    ('bypss', 'byp'),
+    ('bayoo', 'byu'),
+    ('bayou', 'byu'),
+    ('byu', 'byu'),
+    ('circ', 'cir'),
+    ('cir', 'cir'),
+    ('circl', 'cir'),
+    ('circle', 'cir'),
+    ('circles', 'cir'),
+    ('crcl', 'cir'),
+    ('crcle', 'cir'),
+    ('clb', 'clb'),
+    ('club', 'clb'),
+    ('clf', 'clfs'),
+    ('clfs', 'clfs'),
+    ('cliff', 'clfs'),
+    ('cliffs', 'clfs'),
+    ('cor', 'cor'),
+    ('corner', 'cor'),
+    ('corners', 'cors'),
+    ('cors', 'cors'),
+    ('camp', 'cp'),
+    ('cmp', 'cp'),
+    ('cp', 'cp'),
+    ('cape', 'cpe'),
+    ('cpe', 'cpe'),
+    ('crecent', 'cres'),
+    ('crescent', 'cres'),
+    ('cres', 'cres'),
+    ('cresent', 'cres'),
+    ('crscnt', 'cres'),
+    ('crsent', 'cres'),
+    ('crsnt', 'cres'),
+    ('ck', 'crk'),
+    ('cr', 'crk'),
+    ('creek', 'crk'),
+    ('crk', 'crk'),
+    ('course', 'crse'),
+    ('crse', 'crse'),
+    ('causeway', 'cswy'),
+    ('causway', 'cswy'),
+    ('cswy', 'cswy'),
+    ('court', 'ct'),
+    ('crt', 'ct'),
+    ('ct', 'ct'),
+    ('cen', 'ctr'),
+    ('cent', 'ctr'),
+    ('center', 'ctr'),
+    ('centers', 'ctr'),
+    ('centr', 'ctr'),
+    ('centre', 'ctr'),
+    ('cnter', 'ctr'),
+    ('cntr', 'ctr'),
+    ('ctr', 'ctr'),
+    ('courts', 'cts'),
+    ('cts', 'cts'),
+    ('cove', 'cv'),
+    ('coves', 'cv'),
+    ('cv', 'cv'),
+    ('can', 'cyn'),
+    ('canyn', 'cyn'),
+    ('canyon', 'cyn'),
+    ('cnyn', 'cyn'),
+    ('cyn', 'cyn'),
+    ('dale', 'dl'),
+    ('dl', 'dl'),
+    ('dam', 'dm'),
+    ('dm', 'dm'),
+    ('dr', 'dr'),
+    ('driv', 'dr'),
+    ('drive', 'dr'),
+    ('drives', 'dr'),
+    ('drv', 'dr'),
+    ('div', 'dv'),
+    ('divide', 'dv'),
+    ('dvd', 'dv'),
+    ('dv', 'dv'),
+    ('estate', 'est'),
+    ('estates', 'est'),
+    ('est', 'est'),
+    ('ests', 'est'),
+    ('exp', 'expy'),
+    ('express', 'expy'),
+    ('expressway', 'expy'),
+    ('expr', 'expy'),
+    ('expw', 'expy'),
+    ('expy', 'expy'),
+    ('extension', 'ext'),
+    ('ext', 'ext'),
+    ('extn', 'ext'),
+    ('extnsn', 'ext'),
+    ('exts', 'ext'),
+    ('fall', 'fall'),
+    ('field', 'fld'),
+    ('fld', 'fld'),
+    ('fields', 'flds'),
+    ('flds', 'flds'),
+    ('falls', 'fls'),
+    ('fls', 'fls'),
+    ('flat', 'flt'),
+    ('flats', 'flt'),
+    ('flt', 'flt'),
+    ('flts', 'flt'),
+    ('ford', 'frd'),
+    ('fords', 'frd'),
+    ('frd', 'frd'),
+    ('forge', 'frg'),
+    ('forges', 'frg'),
+    ('forg', 'frg'),
+    ('frg', 'frg'),
+    ('fork', 'frk'),
+    ('frk', 'frk'),
+    ('forks', 'frks'),
+    ('frks', 'frks'),
+    ('forest', 'frst'),
+    ('forests', 'frst'),
+    ('frst', 'frst'),
+    ('ferry', 'fry'),
+    ('frry', 'fry'),
+    ('fry', 'fry'),
+    ('fort', 'ft'),
+    ('frt', 'ft'),
+    ('ft', 'ft'),
+    ('freeway', 'fwy'),
+    ('freewy', 'fwy'),
+    ('frway', 'fwy'),
+    ('frwy', 'fwy'),
+    ('fwy', 'fwy'),
+    ('garden', 'gdns'),
+    ('gardens', 'gdns'),
+    ('gardn', 'gdns'),
+    ('gdn', 'gdns'),
+    ('gdns', 'gdns'),
+    ('grden', 'gdns'),
+    ('grdn', 'gdns'),
+    ('grdns', 'gdns'),
+    ('glen', 'gln'),
+    ('glens', 'gln'),
+    ('gln', 'gln'),
+    ('green', 'grn'),
+    ('greens', 'grn'),
+    ('grn', 'grn'),
+    ('grove', 'grv'),
+    ('groves', 'grv'),
+    ('grov', 'grv'),
+    ('grv', 'grv'),
+    ('gateway', 'gtwy'),
+    ('gatewy', 'gtwy'),
+    ('gatway', 'gtwy'),
+    ('gtway', 'gtwy'),
+    ('gtwy', 'gtwy'),
+    ('harb', 'hbr'),
+    ('harbor', 'hbr'),
+    ('harbors', 'hbr'),
+    ('harbr', 'hbr'),
+    ('hbr', 'hbr'),
+    ('hrbor', 'hbr'),
+    ('hill', 'hl'),
+    ('hl', 'hl'),
+    ('hills', 'hls'),
+    ('hls', 'hls'),
+    ('hllw', 'holw'),
+    ('hollow', 'holw'),
+    ('hollows', 'holw'),
+    ('holw', 'holw'),
+    ('holws', 'holw'),
+    ('height', 'hts'),
+    ('heights', 'hts'),
+    ('hgts', 'hts'),
+    ('ht', 'hts'),
+    ('hts', 'hts'),
+    ('haven', 'hvn'),
+    ('havn', 'hvn'),
+    ('hvn', 'hvn'),
+    ('highway', 'hwy'),
+    ('highwy', 'hwy'),
+    ('hiway', 'hwy'),
+    ('hiwy', 'hwy'),
+    ('hway', 'hwy'),
+    ('hwy', 'hwy'),
+    ('interstate', 'hwy'),
+    ('sr', 'hwy'),
+    ('i', 'hwy'),
+    ('inlet', 'inlt'),
+    ('inlt', 'inlt'),
+    ('is', 'is'),
+    ('island', 'is'),
+    ('islnd', 'is'),
+    ('isle', 'isle'),
+    ('isles', 'isle'),
+    ('islands', 'iss'),
+    ('islnds', 'iss'),
+    ('iss', 'iss'),
+    ('jction', 'jct'),
+    ('jct', 'jct'),
+    ('jctn', 'jct'),
+    ('jctns', 'jct'),
+    ('jcts', 'jct'),
+    ('junction', 'jct'),
+    ('junctions', 'jct'),
+    ('junctn', 'jct'),
+    ('juncton', 'jct'),
+    ('knl', 'knls'),
+    ('knls', 'knls'),
+    ('knol', 'knls'),
+    ('knoll', 'knls'),
+    ('knolls', 'knls'),
+    ('key', 'ky'),
+    ('keys', 'ky'),
+    ('ky', 'ky'),
+    ('kys', 'ky'),
+    ('lck', 'lcks'),
+    ('lcks', 'lcks'),
+    ('lock', 'lcks'),
+    ('locks', 'lcks'),
+    ('ldge', 'ldg'),
+    ('ldg', 'ldg'),
+    ('lodge', 'ldg'),
+    ('lodg', 'ldg'),
+    ('lf', 'lf'),
+    ('loaf', 'lf'),
+    ('lgt', 'lgt'),
+    ('light', 'lgt'),
+    ('lights', 'lgt'),
+    ('lake', 'lk'),
+    ('lk', 'lk'),
+    ('lakes', 'lks'),
+    ('lks', 'lks'),
+    ('lane', 'ln'),
+    ('lanes', 'ln'),
+    ('ln', 'ln'),
+    ('landing', 'lndg'),
+    ('lndg', 'lndg'),
+    ('lndng', 'lndg'),
+    ('loop', 'loop'),
+    ('loops', 'loop'),
+    ('mall', 'mall'),
+    ('mdw', 'mdws'),
+    ('mdws', 'mdws'),
+    ('meadow', 'mdws'),
+    ('meadows', 'mdws'),
+    ('medows', 'mdws'),
+    ('mill', 'ml'),
+    ('ml', 'ml'),
+    ('mills', 'mls'),
+    ('mls', 'mls'),
+    ('manor', 'mnr'),
+    ('manors', 'mnr'),
+    ('mnr', 'mnr'),
+    ('mnrs', 'mnr'),
+    ('mission', 'msn'),
+    ('missn', 'msn'),
+    ('msn', 'msn'),
+    ('mssn', 'msn'),
+    ('mnt', 'mt'),
+    ('mount', 'mt'),
+    ('mt', 'mt'),
+    ('mntain', 'mtn'),
+    ('mntn', 'mtn'),
+    ('mntns', 'mtn'),
+    ('mountain', 'mtn'),
+    ('mountains', 'mtn'),
+    ('mountin', 'mtn'),
+    ('mtin', 'mtn'),
+    ('mtn', 'mtn'),
+    ('nck', 'nck'),
+    ('neck', 'nck'),
+    ('orchard', 'orch'),
+    ('orch', 'orch'),
+    ('orchrd', 'orch'),
+    ('oval', 'oval'),
+    ('ovl', 'oval'),
+    ('park', 'park'),
+    ('parks', 'park'),
+    ('pk', 'park'),
+    ('prk', 'park'),
+    ('by', 'pass'),
+    ('pass', 'pass'),
+    ('path', 'path'),
+    ('paths', 'path'),
+    ('pike', 'pike'),
+    ('pikes', 'pike'),
+    ('parkway', 'pky'),
+    ('parkways', 'pky'),
+    ('parkwy', 'pky'),
+    ('pkway', 'pky'),
+    ('pkwy', 'pky'),
+    ('pkwys', 'pky'),
+    ('pky', 'pky'),
+    ('place', 'pl'),
+    ('pl', 'pl'),
+    ('plain', 'pln'),
+    ('pln', 'pln'),
+    ('plaines', 'plns'),
+    ('plains', 'plns'),
+    ('plns', 'plns'),
+    ('plaza', 'plz'),
+    ('plza', 'plz'),
+    ('plz', 'plz'),
+    ('pine', 'pnes'),
+    ('pines', 'pnes'),
+    ('pnes', 'pnes'),
+    ('prairie', 'pr'),
+    ('prarie', 'pr'),
+    ('pr', 'pr'),
+    ('prr', 'pr'),
+    ('port', 'prt'),
+    ('ports', 'prt'),
+    ('prt', 'prt'),
+    ('prts', 'prt'),
+    ('point', 'pt'),
+    ('points', 'pt'),
+    ('pt', 'pt'),
+    ('pts', 'pt'),
+    ('radial', 'radl'),
+    ('radiel', 'radl'),
+    ('radl', 'radl'),
+    ('rad', 'radl'),
+    ('rd', 'rd'),
+    ('rds', 'rd'),
+    ('road', 'rd'),
+    ('roads', 'rd'),
+    ('rdge', 'rdg'),
+    ('rdg', 'rdg'),
+    ('rdgs', 'rdg'),
+    ('ridge', 'rdg'),
+    ('ridges', 'rdg'),
+    ('river', 'riv'),
+    ('riv', 'riv'),
+    ('rivr', 'riv'),
+    ('rvr', 'riv'),
+    ('ranches', 'rnch'),
+    ('ranch', 'rnch'),
+    ('rnch', 'rnch'),
+    ('rnchs', 'rnch'),
+    ('row', 'row'),
+    ('rapid', 'rpds'),
+    ('rapids', 'rpds'),
+    ('rpd', 'rpds'),
+    ('rpds', 'rpds'),
+    ('rest', 'rst'),
+    ('rst', 'rst'),
+    ('run', 'run'),
+    ('shl', 'shl'),
+    ('shoal', 'shl'),
+    ('shls', 'shls'),
+    ('shoals', 'shls'),
+    ('shoar', 'shr'),
+    ('shore', 'shr'),
+    ('shr', 'shr'),
+    ('shoars', 'shrs'),
+    ('shores', 'shrs'),
+    ('shrs', 'shrs'),
+    ('smt', 'smt'),
+    ('sumit', 'smt'),
+    ('sumitt', 'smt'),
+    ('summit', 'smt'),
+    ('spg', 'spg'),
+    ('spng', 'spg'),
+    ('spring', 'spg'),
+    ('sprng', 'spg'),
+    ('spgs', 'spgs'),
+    ('spngs', 'spgs'),
+    ('springs', 'spgs'),
+    ('sprngs', 'spgs'),
+    ('spur', 'spur'),
+    ('spurs', 'spur'),
+    ('sqre', 'sq'),
+    ('sqr', 'sq'),
+    ('sq', 'sq'),
+    ('square', 'sq'),
+    ('squares', 'sq'),
+    ('squ', 'sq'),
+    ('streets', 'st'),
+    ('street', 'st'),
+    ('str', 'st'),
+    ('strt', 'st'),
+    ('st', 'st'),
+    ('sta', 'sta'),
+    ('station', 'sta'),
+    ('statn', 'sta'),
+    ('stn', 'sta'),
+    ('stra', 'stra'),
+    ('straven', 'stra'),
+    ('stravenue', 'stra'),
+    ('strave', 'stra'),
+    ('stravn', 'stra'),
+    ('strav', 'stra'),
+    ('strvn', 'stra'),
+    ('strvnue', 'stra'),
+    ('stream', 'strm'),
+    ('streme', 'strm'),
+    ('strm', 'strm'),
+    ('terrace', 'ter'),
+    ('terr', 'ter'),
+    ('ter', 'ter'),
+    ('tpke', 'tpke'),
+    ('tpk', 'tpke'),
+    ('trnpk', 'tpke'),
+    ('turnpike', 'tpke'),
+    ('turnpk', 'tpke'),
+    ('tracks', 'trak'),
+    ('track', 'trak'),
+    ('trak', 'trak'),
+    ('trks', 'trak'),
+    ('trk', 'trak'),
+    ('traces', 'trce'),
+    ('trace', 'trce'),
+    ('trce', 'trce'),
+    ('trafficway', 'trfy'),
+    ('trfy', 'trfy'),
+    ('trails', 'trl'),
+    ('trail', 'trl'),
+    ('trls', 'trl'),
+    ('trl', 'trl'),
+    ('tr', 'trl'),
+    ('tt', 'trl'),
+    ('tl', 'trl'),
+    ('tunel', 'tunl'),
+    ('tunls', 'tunl'),
+    ('tunl', 'tunl'),
+    ('tunnels', 'tunl'),
+    ('tunnel', 'tunl'),
+    ('tunnl', 'tunl'),
+    ('unions', 'un'),
+    ('union', 'un'),
+    ('un', 'un'),
+    ('vdct', 'via'),
+    ('viadct', 'via'),
+    ('viaduct', 'via'),
+    ('via', 'via'),
+    ('vista', 'vis'),
+    ('vist', 'vis'),
+    ('vis', 'vis'),
+    ('vsta', 'vis'),
+    ('vst', 'vis'),
+    ('ville', 'vl'),
+    ('vl', 'vl'),
+    ('villages', 'vlg'),
+    ('village', 'vlg'),
+    ('villag', 'vlg'),
+    ('villg', 'vlg'),
+    ('villiage', 'vlg'),
+    ('vill', 'vlg'),
+    ('vlgs', 'vlg'),
+    ('vlg', 'vlg'),
+    ('valleys', 'vly'),
+    ('valley', 'vly'),
+    ('vally', 'vly'),
+    ('vlly', 'vly'),
+    ('vlys', 'vly'),
+    ('vly', 'vly'),
+    ('views', 'vw'),
+    ('view', 'vw'),
+    ('vws', 'vw'),
+    ('vw', 'vw'),
+    ('walks', 'walk'),
+    ('walk', 'walk'),
+    ('ways', 'way'),
+    ('way', 'way'),
+    ('wy', 'way'),
+    ('wells', 'wls'),
+    ('well', 'wls'),
+    ('wls', 'wls'),
+    ('crossing', 'xing'),
+    ('crssing', 'xing'),
+    ('crssng', 'xing'),
+    ('xing', 'xing'),
+]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2017 Civic Knowledge. This file is licensed under the terms of the
+# Revised BSD License, included in this distribution as LICENSE
+
+"""
+A pandas Series accessor for parsing a column of addresses. Importing this module registers it, and
+requires pandas:
+
+    import address_parser.accessor
+
+    parsed = df['addr'].address.parse(state='CA')
+    df = df.join(parsed)
+
+"""
+
+import pandas as pd
+
+from .columns import FIELDS, parse_frame
+
+
+@pd.api.extensions.register_series_accessor('address')
+class AddressAccessor(object):
+    """The Series.address accessor"""
+
+    def __init__(self, series):
+        self._series = series
+
+    def parse(self, city=None, state=None, zip=None, fields=FIELDS, parser=None):
+        """Parse a Series of address strings, returning a DataFrame with the same index and a typed
+        column for each field. city, state and zip may be scalars or Series, which are aligned on the
+        index of this one; a missing value, NaN or NA, is no override. """
+        from .parser import Parser
+
+        s = self._series.fillna('').astype(str)
+
+        city, state, zip = (_aligned(v, s.index) for v in (city, state, zip))
+
+        return parse_frame(parser or Parser(), s, city, state, zip, fields=fields, index=s.index)
+
+
+def _aligned(v, index):
+    """Align a Series of overrides on the index of the addresses, as a list with None for missing
+    values. Other values are returned as they are, except that a missing scalar is None. """
+
+    if isinstance(v, pd.Series):
+        return [None if pd.isna(x) else x for x in v.reindex(index)]
+    elif v is not None and pd.api.types.is_scalar(v) and pd.isna(v):
+        return None
+    else:
+        return v
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2017 Civic Knowledge. This file is licensed under the terms of the
+# Revised BSD License, included in this distribution as LICENSE
+
+"""
+Parsing from asyncio code, without blocking the event loop. Addresses are collected into small batches,
+which are parsed in a thread or process executor:
+
+    parser = AsyncParser()
+
+    r = await parser.parse('100 Main St, San Diego, CA')
+
+    async for record in parser.parse_stream(lines):
+        ...
+
+"""
+
+import asyncio
+import functools
+
+import six
+
+from .parallel import parse_rows, _parse_chunk, _init_worker, _context
+from .parser import Parser, ParseRecord
+
+_END = object()
+
+
+class AsyncParser(object):
+    """Parse addresses from coroutines. All of the work is done by one Parser, in an executor.
+
+    :param parser: The Parser to use. A new one by default; all parsers share the same grammar.
+    :param executor: 'thread', the default, 'process', or a concurrent.futures.Executor. A thread keeps
+        the event loop responsive, but parsing still holds the GIL. Processes take the parsing off the
+        event loop's interpreter altogether.
+    :param workers: Number of threads or processes, if the executor is created here. Defaults to 1
+        for threads, since parsing is CPU bound, and to the number of CPUs for processes.
+    :param batch_size: Most addresses in a batch.
+    :param batch_delay: Longest time, in seconds, that an address waits for its batch to fill.
+    :param max_concurrency: Most batches in the executor at once. Defaults to twice the workers.
+    :param max_pending: Most addresses waiting in parse() calls. Calls beyond this wait for
+        others to finish before they are queued.
+    """
+
+    def __init__(self, parser=None, executor='thread', workers=None, batch_size=64, batch_delay=0.002,
+                 max_concurrency=None, max_pending=10000):
+        from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+        self.parser = parser or Parser()
+
+        self._own_executor = executor in ('thread', 'process')
+
+        if executor == 'thread':
+            workers = workers or 1
+            self.executor = ThreadPoolExecutor(workers)
+            self._parse_rows = functools.partial(parse_rows, self.parser)
+        elif executor == 'process':
+            import multiprocessing
+            workers = workers or multiprocessing.cpu_count()
+            self.executor = ProcessPoolExecutor(workers, mp_context=_context(),
+                                                initializer=_init_worker, initargs=(self.parser,))
+            self._parse_rows = _parse_chunk
+        else:
+            workers = workers or getattr(executor, '_max_workers', 1)
+            self.executor = executor
+            self._parse_rows = functools.partial(parse_rows, self.parser)
+
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.max_concurrency = max_concurrency or 2 * workers
+        self.max_pending = max_pending
+
+        # Created on first use, so they belong to the running loop
+        self._semaphore = None
+        self._slots = None
+
+        self._pending = []
+        self._flush_handle = None
+
+    def _submit(self, rows):
+        """Start parsing a batch of rows in the executor, returning an asyncio future for the
+        (result, error) pairs"""
+        return asyncio.get_running_loop().run_in_executor(self.executor, self._parse_rows, rows)
+
+    async def parse(self, addrstr, city=None, state=None, zip=None):
+        """Parse one address, returning the same as Parser.parse(), or raising the same exception. Calls
+        that arrive close together are parsed in one batch. """
+
+        if self._slots is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._slots = asyncio.Semaphore(self.max_pending)
+
+        loop = asyncio.get_running_loop()
+
+        async with self._slots:
+            future = loop.create_future()
+            self._pending.append(((addrstr, city, state, zip), future))
+
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.batch_delay, self._flush)
+
+            result, error = await future
+
+        if error is not None:
+            raise error
+
+        return result
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        rows = [row for row, _ in batch]
+
+        try:
+            async with self._semaphore:
+                pairs = await self._submit(rows)
+        except Exception as e:
+            pairs = [(None, e)] * len(batch)
+
+        for (_, future), pair in zip(batch, pairs):
+            if not future.done():
+                future.set_result(pair)
+
+    async def parse_stream(self, addrs, city=None, state=None, zip=None):
+        """Parse an iterable or async iterable of address strings, yielding ParseRecords in input order,
+        as Parser.parse_many() does. city, state and zip are single values for every address.
+
+        Addresses are read from addrs only as fast as they are parsed, with at most max_concurrency
+        batches in the executor, so a fast source can't fill memory. A batch is sent when it is full, or
+        when batch_delay has passed since its first address arrived. """
+
+        inq = asyncio.Queue(self.batch_size * self.max_concurrency)
+        outq = asyncio.Queue(self.max_concurrency)
+
+        tasks = [asyncio.ensure_future(self._read(addrs, inq)),
+                 asyncio.ensure_future(self._batch(inq, outq, city, state, zip))]
+
+        index = 0
+
+        try:
+            while True:
+                item = await outq.get()
+
+                if item is _END:
+                    break
+                elif isinstance(item, BaseException):
+                    raise item
+
+                batch, future = item
+
+                for addrstr, (result, error) in six.moves.zip(batch, await future):
+                    yield ParseRecord(index, addrstr, result, error)
+                    index += 1
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    async def _read(self, addrs, inq):
+        """Copy the input to the queue, followed by _END, or by the exception that ended it"""
+
+        last = _END
+
+        try:
+            if hasattr(addrs, '__aiter__'):
+                async for a in addrs:
+                    await inq.put(a)
+            else:
+                for a in addrs:
+                    await inq.put(a)
+        except asyncio.CancelledError:
+            # The consumer has stopped, and nothing reads the queue
+            last = None
+            raise
+        except Exception as e:
+            last = e
+        finally:
+            if last is not None:
+                await inq.put(last)
+
+    async def _batch(self, inq, outq, city, state, zip):
+        """Group the input into batches, and start parsing each one. The futures go to outq, which is
+        bounded, so this waits when there are too many batches in progress. The output always ends
+        with _END, or with the exception that stopped the input or the batching, so the consumer
+        can't wait for it forever. """
+
+        loop = asyncio.get_running_loop()
+        last = None
+
+        try:
+            while last is None:
+                item = await inq.get()
+
+                if item is _END or isinstance(item, BaseException):
+                    last = item
+                    break
+
+                batch = [item]
+                deadline = loop.time() + self.batch_delay
+
+                while len(batch) < self.batch_size:
+                    if inq.empty():
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        try:
+                            item = await asyncio.wait_for(inq.get(), timeout)
+                        except asyncio.TimeoutError:
+                            break
+                    else:
+                        item = inq.get_nowait()
+
+                    if item is _END or isinstance(item, BaseException):
+                        last = item
+                        break
+
+                    batch.append(item)
+
+                await outq.put((batch, self._submit([(a, city, state, zip) for a in batch])))
+        except asyncio.CancelledError:
+            last = None
+            raise
+        except Exception as e:
+            last = e
+        finally:
+            if last is not None:
+                await outq.put(last)
+
+    def close(self):
+        """Shut down the executor, if it was created by this AsyncParser"""
+        if self._own_executor:
+            self.executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2017 Civic Knowledge. This file is licensed under the terms of the
+# Revised BSD License, included in this distribution as LICENSE
+
+"""
+Caches for parse results: LRUCache in memory, and SQLiteCache and DbmCache on disk, for results that
+should last from one run to the next.
+"""
+
+import os
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class LRUCache(object):
+    '''A bounded mapping that discards the least recently used entries when it is full. Hits, misses and
+    evictions are counted, to help with sizing it. '''
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    @contextmanager
+    def batch(self, keys=()):
+        '''Part of the cache interface; see PersistentCache.batch(). Does nothing here. '''
+        yield self
+
+    def flush(self):
+        '''Part of the cache interface; see PersistentCache.flush(). Does nothing here. '''
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    @property
+    def stats(self):
+        '''Return the counters as a dict'''
+        lookups = self.hits + self.misses
+
+        return dict(
+            size=len(self._data),
+            maxsize=self.maxsize,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            hit_rate=float(self.hits) / lookups if lookups else 0.0
+        )
+
+
+_fingerprint = None
+
+
+def fingerprint():
+    '''Return a digest of the code and tables that parse results depend on: the parser, grammar, state and
+    gazetteer modules, and the street type table as it was loaded, from the snapshot or the CSV file.
+    Persistent caches include it in their keys, so results from another version of the parser are not
+    used. '''
+    global _fingerprint
+
+    if _fingerprint is None:
+        import hashlib
+        from .grammar import get_grammar
+
+        here = os.path.dirname(os.path.abspath(__file__))
+        h = hashlib.md5()
+
+        for name in ('parser.py', 'grammar.py', 'states.py', 'gazetteer.py'):
+            try:
+                with open(os.path.join(here, name), 'rb') as f:
+                    h.update(f.read())
+            except (IOError, OSError):
+                h.update(name.encode('utf8'))
+
+        # The table the parsers use, which is the snapshot, not the CSV file, if the snapshot is stale
+        h.update(repr(sorted(get_grammar().street_types.items())).encode('utf8'))
+
+        _fingerprint = h.hexdigest()
+
+    return _fingerprint
+
+
+class PersistentCache(object):
+    '''A cache of parse results in a file, which lasts between runs. This is the base class; SQLiteCache
+    and DbmCache are the implementations, and others can be added by overriding the underscore methods.
+
+    A cache, in memory or on disk, has get(key), put(key, value), clear(), flush(), batch(keys), stats,
+    and __len__. Keys are hashed, with the fingerprint() of the parser code, to 16 byte digests, and values
+    are pickled. When the fingerprint stored in the file does not match, the file is cleared, so
+    results from an old parser are never returned.
+
+    Writes are kept in memory and written in one transaction when there are write_batch of them, and by
+    flush() and close(). Within a batch(), the values for the keys are read in a few bulk queries
+    first. '''
+
+    # get() returns a new object each time, so the parser does not copy it
+    persistent = True
+
+    # Whether other processes can open the same file at the same time
+    multiprocess = False
+
+    maxsize = None
+
+    def __init__(self, path, write_batch=1000):
+        self.path = path
+        self.write_batch = write_batch
+        self.fingerprint = fingerprint()
+
+        self._lock = threading.RLock()
+        self._pending = {}
+        self._prefetched = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+
+        self._open()
+
+        if self._get_meta('fingerprint') != self.fingerprint:
+            self._clear()
+            self._set_meta('fingerprint', self.fingerprint)
+
+    def __reduce__(self):
+        return (self.__class__, (self.path, self.write_batch))
+
+    def _digest(self, key):
+        import hashlib
+
+        return hashlib.md5((self.fingerprint + repr(key)).encode('utf8')).digest()
+
+    def get(self, key, default=None):
+        import pickle
+
+        d = self._digest(key)
+
+        with self._lock:
+            v = self._prefetched.pop(d, None) or self._pending.get(d)
+
+            if v is None:
+                v = self._get(d)
+
+            if v is None:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+
+        return pickle.loads(v)
+
+    def put(self, key, value):
+        import pickle
+
+        v = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+        with self._lock:
+            self._pending[self._digest(key)] = v
+
+            if len(self._pending) >= self.write_batch:
+                self.flush()
+
+    def flush(self):
+        '''Write the pending values, in one transaction'''
+
+        with self._lock:
+            if self._pending:
+                self._put_many(self._pending.items())
+                self.writes += len(self._pending)
+                self._pending = {}
+
+    @contextmanager
+    def batch(self, keys=()):
+        '''Read the values for keys in bulk, for get() to return, and flush the writes at the end'''
+
+        digests = [self._digest(k) for k in keys]
+
+        with self._lock:
+            self._prefetched.update(self._get_many(d for d in digests if d not in self._pending))
+
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._prefetched = {}
+            self.flush()
+
+    def clear(self):
+        with self._lock:
+            self._pending = {}
+            self._prefetched = {}
+            self._clear()
+            self._set_meta('fingerprint', self.fingerprint)
+            self.hits = self.misses = self.evictions = self.writes = 0
+
+    def __len__(self):
+        with self._lock:
+            self.flush()
+            return self._len()
+
+    def __contains__(self, key):
+        d = self._digest(key)
+
+        with self._lock:
+            return d in self._pending or self._get(d) is not None
+
+    @property
+    def stats(self):
+        '''Return the counters as a dict'''
+        lookups = self.hits + self.misses
+
+        return dict(
+            size=len(self),
+            maxsize=None,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=0,
+            writes=self.writes,
+            hit_rate=float(self.hits) / lookups if lookups else 0.0
+        )
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # The storage. Keys are 16 byte digests and values are bytes.
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+    def _get(self, digest):
+        '''Return the value for a digest, or None'''
+        raise NotImplementedError
+
+    def _get_many(self, digests):
+        '''Return a dict of the values for the digests that are stored'''
+        return {d: v for d, v in ((d, self._get(d)) for d in digests) if v is not None}
+
+    def _put_many(self, items):
+        '''Store (digest, value) pairs, in one transaction if the storage has them'''
+        raise NotImplementedError
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def _len(self):
+        raise NotImplementedError
+
+    def _get_meta(self, name):
+        raise NotImplementedError
+
+    def _set_meta(self, name, value):
+        raise NotImplementedError
+
+
+class SQLiteCache(PersistentCache):
+    '''A persistent cache in an SQLite database. The database is in WAL mode, so the worker processes of
+    Parser.parse_parallel() can share it. '''
+
+    multiprocess = True
+
+    # Most parameters in a query
+    QUERY_KEYS = 500
+
+    def _open(self):
+        import sqlite3
+
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS results (key BLOB PRIMARY KEY, value BLOB) WITHOUT ROWID')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+
+    def _close(self):
+        self._db.close()
+
+    def _get(self, digest):
+        row = self._db.execute('SELECT value FROM results WHERE key = ?', (digest,)).fetchone()
+        return row[0] if row else None
+
+    def _get_many(self, digests):
+        digests = list(digests)
+        found = {}
+
+        for i in range(0, len(digests), self.QUERY_KEYS):
+            chunk = digests[i:i + self.QUERY_KEYS]
+            q = 'SELECT key, value FROM results WHERE key IN ({})'.format(','.join('?' * len(chunk)))
+            found.update(self._db.execute(q, chunk))
+
+        return found
+
+    def _put_many(self, items):
+        with self._transaction():
+            self._db.executemany('INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)', items)
+
+    @contextmanager
+    def _transaction(self):
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        else:
+            self._db.execute('COMMIT')
+
+    def _clear(self):
+        self._db.execute('DELETE FROM results')
+
+    def _len(self):
+        return self._db.execute('SELECT count(*) FROM results').fetchone()[0]
+
+    def _get_meta(self, name):
+        row = self._db.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name, value):
+        self._db.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+
+
+class DbmCache(PersistentCache):
+    '''A persistent cache in a dbm file, with whichever dbm module the standard library has. dbm files
+    can't be opened by more than one process at a time, so parse_parallel() workers don't use it. '''
+
+    # Keys are 16 byte digests, so this can't collide with one
+    _META = b'__meta__:'
+
+    def _open(self):
+        import dbm
+
+        self._db = dbm.open(self.path, 'c')
+
+    def _close(self):
+        self._db.close()
+
+    def _get(self, digest):
+        return self._db.get(digest)
+
+    def _put_many(self, items):
+        for k, v in items:
+            self._db[k] = v
+
+        if hasattr(self._db, 'sync'):
+            self._db.sync()
+
+    def _clear(self):
+        import dbm
+
+        self._db.close()
+        self._db = dbm.open(self.path, 'n')
+
+    def _len(self):
+        return sum(1 for k in self._db.keys() if not k.startswith(self._META))
+
+    def _get_meta(self, name):
+        v = self._db.get(self._META + name.encode('utf8'))
+        return v.decode('utf8') if v is not None else None
+
+    def _set_meta(self, name, value):
+        self._db[self._META + name.encode('utf8')] = value.encode('utf8')
+
+
+# Metaphone keys for street, city and state names, shared by all parsers in the process. The vocabulary
+# of names is small compared to the number of addresses, so most lookups are hits.
+phonetic_cache = LRUCache(100000)
+
+
+def phonetic_key(word):
+    '''Return the metaphone key for a word, from the shared phonetic_cache if possible'''
+
+    key = phonetic_cache.get(word)
+
+    if key is None:
+        from phonetics import metaphone
+
+        key = metaphone(word)
+        phonetic_cache.put(word, key)
+
+    return key
+
+
+def preload_phonetic_keys(words):
+    '''Compute the metaphone keys for an iterable of words, such as the lines of a word list file,
+    and put them in the phonetic_cache. Returns the number of words loaded. '''
+
+    n = 0
+    for word in words:
+        word = word.strip()
+        if word:
+            phonetic_key(word)
+            n += 1
+
+    return n
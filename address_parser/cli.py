@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2017 Civic Knowledge. This file is licensed under the terms of the
+# Revised BSD License, included in this distribution as LICENSE
+
+"""
+The address-parser command. It reads addresses from a CSV, TSV, JSON lines or plain text file, or from
+stdin, and writes the parsed fields and hashes as CSV or JSON lines:
+
+    address-parser addresses.csv -c address --zip-col zip -o parsed.csv --errors errors.csv
+
+Rows are read, parsed and written one at a time, or in bounded chunks with --workers, so memory use
+does not depend on the size of the input.
+
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+
+from itertools import tee
+from operator import itemgetter
+
+FORMATS = ('csv', 'tsv', 'jsonl', 'text')
+
+# The columns of the output, in order. Failed rows have only the index, input and error.
+OUTPUT_FIELDS = ('index', 'input', 'number', 'end_number', 'fraction', 'suite', 'is_block',
+                 'direction', 'name', 'suffix', 'city', 'state', 'zip', 'zip4',
+                 'text', 'hash', 'fuzzy_hash', 'error')
+
+ERROR_FIELDS = ('index', 'input', 'error')
+
+
+def guess_format(path, default='text'):
+    '''Return the format for a file name from its extension'''
+
+    if path:
+        ext = path.rsplit('.', 1)[-1].lower()
+        if ext in FORMATS:
+            return ext
+        if ext in ('json', 'ndjson'):
+            return 'jsonl'
+        if ext == 'txt':
+            return 'text'
+
+    return default
+
+
+class ColumnError(ValueError):
+    '''A column named in the arguments is not in the input'''
+
+
+class RowError(ValueError):
+    '''A row of the input that can't be read, such as a JSON line that isn't an object'''
+
+    def __init__(self, message, line):
+        super(RowError, self).__init__(message)
+        self.line = line
+
+
+def read_rows(f, fmt, address_col=None, city_col=None, state_col=None, zip_col=None):
+    '''Return an iterator of (address, city, state, zip) tuples from an open file, with a RowError in
+    place of each row that can't be read. For the text format, each line is an address, and the column
+    names are ignored.
+
+    The header of a CSV file is read when this is called, and ColumnError is raised if any of the named
+    columns is not in it. JSON lines rows are checked one at a time, so a row without the address
+    column is a RowError. '''
+
+    if fmt == 'text':
+        return ((line.rstrip('\r\n'), None, None, None) for line in f)
+
+    cols = (address_col or 'address', city_col, state_col, zip_col)
+
+    if fmt == 'jsonl':
+        return _json_rows(f, cols)
+
+    rows = csv.DictReader(f, delimiter='\t' if fmt == 'tsv' else ',')
+
+    if rows.fieldnames is not None:
+        for name, col in zip(('address', 'city', 'state', 'zip'), cols):
+            if col and col not in rows.fieldnames:
+                raise ColumnError("No {} column '{}' in the input; use --{}-col".format(name, col, name))
+
+    return (_row(row, cols) for row in rows)
+
+
+def _json_rows(f, cols):
+    '''Yield the rows of a JSON lines file, skipping blank lines'''
+
+    for line in f:
+        if not line.strip():
+            continue
+
+        line = line.rstrip('\r\n')
+
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield RowError('Invalid JSON: {}'.format(e), line)
+            continue
+
+        if not isinstance(row, dict):
+            yield RowError('Not a JSON object', line)
+        elif cols[0] not in row:
+            yield RowError("No address column '{}' in the row".format(cols[0]), line)
+        else:
+            yield _row(row, cols)
+
+
+def _row(row, cols):
+    address_col, city_col, state_col, zip_col = cols
+
+    return (row[address_col] or '',
+            row.get(city_col) if city_col else None,
+            row.get(state_col) if state_col else None,
+            row.get(zip_col) if zip_col else None)
+
+
+def flatten(record):
+    '''Convert a ParseRecord to a flat dict with the OUTPUT_FIELDS keys'''
+
+    d = dict(index=record.index, input=record.input)
+
+    if not record.ok:
+        d['error'] = str(record.error) if record.error is not None else 'blank address'
+        return d
+
+    r = record.result
+    n, road, loc, h = r.number, r.road, r.locality, r.hash
+
+    d.update(
+        number=n.number, end_number=n.end_number, fraction=n.fraction, suite=n.suite, is_block=n.is_block,
+        direction=road.direction, name=road.name, suffix=road.suffix,
+        city=loc.city, state=loc.state, zip=loc.zip,
+        zip4=str(loc.zip4) if loc.zip4 and loc.zip4 != 'None' else None,
+        text=r.text, hash=h.hash, fuzzy_hash=h.fuzzy_hash
+    )
+
+    return d
+
+
+def merge_errors(records, bad):
+    '''Yield flat dicts for the ParseRecords of the rows that could be read, and for the RowErrors in
+    bad, keyed by their position in the input, in input order, with the index counting both. bad is
+    filled as the rows are read, which is never after the records for the rows before them. '''
+
+    def error_row(i):
+        e = bad.pop(i)
+        return dict(index=i, input=e.line, error=str(e))
+
+    i = 0
+
+    for record in records:
+        while i in bad:
+            yield error_row(i)
+            i += 1
+
+        d = flatten(record)
+        d['index'] = i
+        yield d
+        i += 1
+
+    for i in sorted(bad):
+        yield error_row(i)
+
+
+class _Writer(object):
+    '''Write flat dicts as CSV or JSON lines'''
+
+    def __init__(self, f, fmt, fields):
+        self.f = f
+        self.fields = fields
+
+        if fmt == 'jsonl':
+            self.write = self._write_json
+        else:
+            self._csv = csv.DictWriter(f, fields, delimiter='\t' if fmt == 'tsv' else ',',
+                                       extrasaction='ignore', lineterminator='\n')
+            self._csv.writeheader()
+            self.write = self._csv.writerow
+
+    def _write_json(self, d):
+        self.f.write(json.dumps({k: d.get(k) for k in self.fields}))
+        self.f.write('\n')
+
+
+def _open(path, mode, encoding):
+    if not path or path == '-':
+        return None
+
+    # The csv module does its own newline handling, and text lines have their line endings stripped
+    return io.open(path, mode, encoding=encoding, newline='')
+
+
+def make_arg_parser():
+    ap = argparse.ArgumentParser(prog='address-parser',
+                                 description='Parse a file of street addresses into their parts')
+
+    ap.add_argument('input', nargs='?', help="Input file. Reads stdin if it is omitted or '-'")
+    ap.add_argument('-o', '--output', help="Output file. Writes to stdout if it is omitted or '-'")
+    ap.add_argument('-f', '--format', choices=FORMATS,
+                    help='Input format. Guessed from the input file extension; text for stdin')
+    ap.add_argument('-F', '--output-format', choices=('csv', 'tsv', 'jsonl'),
+                    help='Output format. Guessed from the output file extension; csv for stdout')
+    ap.add_argument('-c', '--address-col', default='address', help="Address column name. Default 'address'")
+    ap.add_argument('--city-col', help='City column name')
+    ap.add_argument('--state-col', help='State column name')
+    ap.add_argument('--zip-col', help='Zip column name')
+    ap.add_argument('-e', '--errors',
+                    help='Write rows that fail to parse to this file, instead of the output. '
+                         'Its format is guessed from its extension')
+    ap.add_argument('-w', '--workers', type=int, default=1,
+                    help='Number of worker processes. 0 for one per CPU. Default 1')
+    ap.add_argument('--chunksize', type=int, default=500, help='Rows per chunk sent to a worker')
+    ap.add_argument('--cache-size', type=int, default=10000, help='Parse result cache size, per process')
+    ap.add_argument('--encoding', default='utf-8', help='Input and output file encoding')
+    ap.add_argument('-q', '--quiet', action='store_true', help="Don't print the row counts and rate to stderr")
+
+    return ap
+
+
+def main(argv=None):
+    from .parser import Parser
+
+    ap = make_arg_parser()
+    args = ap.parse_args(argv)
+
+    in_fmt = args.format or guess_format(args.input)
+    out_fmt = args.output_format or guess_format(args.output, 'csv')
+    if out_fmt == 'text':
+        out_fmt = 'csv'
+
+    inp = _open(args.input, 'r', args.encoding) or sys.stdin
+
+    # Check the columns before opening the output, so a usage error doesn't leave a partial file
+    try:
+        rows = read_rows(inp, in_fmt, args.address_col, args.city_col, args.state_col, args.zip_col)
+    except ColumnError as e:
+        if inp is not sys.stdin:
+            inp.close()
+        ap.error(str(e))
+
+    out = _open(args.output, 'w', args.encoding) or sys.stdout
+    err = _open(args.errors, 'w', args.encoding)
+
+    parser = Parser(cache_size=args.cache_size or None)
+
+    # Rows that can't be read go around the parser, and are merged back into the output in order
+    bad = {}
+
+    def readable(rows):
+        for i, row in enumerate(rows):
+            if isinstance(row, RowError):
+                bad[i] = row
+            else:
+                yield row
+
+    rows = readable(rows)
+
+    # The four columns are consumed in step by the parser, so tee() only ever holds a few rows
+    addrs, cities, states, zips = [map(itemgetter(i), t) for i, t in enumerate(tee(rows, 4))]
+
+    if args.workers == 1:
+        records = parser.parse_many(addrs, cities, states, zips)
+    else:
+        records = parser.parse_parallel(addrs, cities, states, zips, workers=args.workers or None,
+                                        chunksize=args.chunksize)
+
+    writer = _Writer(out, out_fmt, OUTPUT_FIELDS)
+    err_writer = _Writer(err, guess_format(args.errors, out_fmt), ERROR_FIELDS) if err else None
+
+    n = errors = 0
+    t0 = time.time()
+
+    try:
+        for d in merge_errors(records, bad):
+            n += 1
+
+            if 'error' in d:
+                errors += 1
+                if err_writer:
+                    err_writer.write(d)
+                    continue
+
+            writer.write(d)
+    finally:
+        for f in (inp, out, err):
+            if f not in (None, sys.stdin, sys.stdout):
+                f.close()
+
+    dt = time.time() - t0
+
+    if not args.quiet:
+        sys.stderr.write('{} rows, {} errors in {:.2f}s, {:.0f} rows/sec\n'.format(
+            n, errors, dt, n / dt if dt else 0))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2017 Civic Knowledge. This file is licensed under the terms of the
+# Revised BSD License, included in this distribution as LICENSE
+
+"""
+Columnar parsing, for pandas and other column oriented pipelines. Rather than a result object per row,
+parse_columns() returns one column per field. Each distinct input is parsed only once, and the values are
+scattered back to the rows that have it.
+
+With pandas, parse_frame() returns a DataFrame with typed columns, and address_parser.accessor adds
+a Series.address accessor for it.
+
+"""
+
+import six
+
+# The result fields, in column order, and how to get each from a ParsedAddress. state_mismatch is not a
+# default column, but can be asked for with the fields argument.
+FIELDS = ('number', 'end_number', 'fraction', 'suite', 'is_block',
+          'direction', 'name', 'suffix', 'city', 'state', 'zip', 'zip4',
+          'text', 'hash', 'fuzzy_hash')
+
+_getters = dict(
+    number=lambda r: r._number,
+    end_number=lambda r: r._end_number,
+    fraction=lambda r: r._fraction,
+    suite=lambda r: r._suite,
+    is_block=lambda r: bool(r._is_block),
+    direction=lambda r: r._direction or None,
+    name=lambda r: r._name,
+    suffix=lambda r: r._suffix,
+    city=lambda r: r._city,
+    state=lambda r: r._state,
+    zip=lambda r: str(r._zip) if r._zip else None,
+    zip4=lambda r: str(r._zip4) if r._zip4 and r._zip4 != 'None' else None,
+    state_mismatch=lambda r: bool(r._state_mismatch),
+    text=lambda r: r.text,
+    hash=lambda r: r.hash.hash,
+    fuzzy_hash=lambda r: r.hash.fuzzy_hash
+)
+
+# pandas dtypes for the columns. Fields with few distinct values are categories.
+DTYPES = dict(
+    number='Int64',
+    is_block='boolean',
+    state_mismatch='boolean',
+    direction='category',
+    suffix='category',
+    city='category',
+    state='category',
+    zip='category',
+    zip4='category',
+)
+
+
+def _unique_columns(parser, addrs, city, state, zip, fields):
+    """Parse the distinct rows with Parser.parse_batch(), returning a column of values for each field, and
+    a column of error messages, for the distinct rows, and the inverse index that maps input rows to
+    distinct rows. """
+
+    batch = parser.parse_batch(addrs, city, state, zip)
+
+    getters = [_getters[f] for f in fields]
+    columns = [[] for _ in fields]
+    errors = []
+
+    for r, e in six.moves.zip(batch.unique_results, batch.unique_errors):
+        if r:
+            for c, g in six.moves.zip(columns, getters):
+                c.append(g(r))
+            errors.append(None)
+        else:
+            for c in columns:
+                c.append(None)
+            errors.append(str(e) if e is not None else 'blank address')
+
+    ucols = dict(six.moves.zip(fields, columns))
+    ucols['error'] = errors
+
+    return ucols, batch.inverse
+
+
+def parse_columns(parser, addrs, city=None, state=None, zip=None, fields=FIELDS):
+    """Parse an iterable of address strings, returning a dict of lists, one for each field in fields, plus
+    an 'error' list, which is None for rows that parsed. The city, state and zip arguments are the same
+    as for Parser.parse_many(). """
+
+    ucols, inverse = _unique_columns(parser, addrs, city, state, zip, fields)
+
+    return {k: [v[i] for i in inverse] for k, v in ucols.items()}
+
+
+def parse_frame(parser, addrs, city=None, state=None, zip=None, fields=FIELDS, index=None):
+    """Like parse_columns(), but return a pandas DataFrame with a typed column for each field"""
+    import numpy as np
+    import pandas as pd
+
+    ucols, inverse = _unique_columns(parser, addrs, city, state, zip, fields)
+
+    inverse = np.asarray(inverse, dtype=np.intp)
+
+    columns = {}
+
+    for k in list(fields) + ['error']:
+        dtype = DTYPES.get(k)
+
+        if dtype == 'category':
+            # Build the categorical on the distinct rows, then scatter the codes
+            u = pd.Categorical(ucols[k])
+            columns[k] = pd.Categorical.from_codes(u.codes[inverse], u.categories)
+        else:
+            u = pd.array(ucols[k], dtype=dtype) if dtype else np.asarray(ucols[k], dtype=object)
+            columns[k] = u.take(inverse)
+
+    return pd.DataFrame(columns, index=index)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2017 Civic Knowledge. This file is licensed under the terms of the
+# Revised BSD License, included in this distribution as LICENSE
+
+"""
+Parsing text files of addresses, one per line. The file is memory mapped and split into ranges of about
+chunk_bytes that end at a newline, and each range is read, decoded and parsed on its own, in this process
+or in a worker process. Only the ranges in flight are in memory, so memory use does not depend on the size
+of the file.
+
+    for r in parser.parse_file('addresses.txt'):
+        print(r.line, r.offset, r.result)
+
+Each record has the byte offset of its line, and of the line after it, so a run that stops can be resumed:
+
+    for r in parser.parse_file('addresses.txt', offset=last.next_offset, line=last.line + 1):
+        ...
+
+"""
+
+import mmap
+import os
+
+import six
+
+from collections import deque, namedtuple
+
+from .parser import ParseRecord
+
+
+class FileRecord(namedtuple('FileRecord', ParseRecord._fields + ('line', 'offset', 'next_offset'))):
+    """A ParseRecord from Parser.parse_file(), with the line number, starting from 1, and the byte offsets
+    of the line and of the next line. index counts the records yielded by this call. """
+
+    __slots__ = ()
+
+    ok = ParseRecord.ok
+
+
+def _ranges(mm, offset, chunk_bytes):
+    """Yield (start, end) byte ranges of mm, from offset, that end after a newline or at the end"""
+
+    size = len(mm)
+    start = offset
+
+    while start < size:
+        nl = mm.find(b'\n', min(start + chunk_bytes, size) - 1)
+        end = size if nl < 0 else nl + 1
+        yield start, end
+        start = end
+
+
+def _lines(block, start, encoding, errors):
+    """Split a block of bytes that starts at offset start into (offset, next offset, line) tuples, with
+    the line endings removed"""
+
+    parts = block.split(b'\n')
+
+    # A block that ends with a newline has an empty last part, which is not a line
+    if not parts[-1]:
+        parts.pop()
+
+    lines = []
+    offset = start
+
+    for p in parts:
+        end = offset + len(p) + 1
+        lines.append((offset, end, p.rstrip(b'\r').decode(encoding, errors)))
+        offset = end
+
+    # The last line of a file may not end with a newline
+    if lines and not block.endswith(b'\n'):
+        o, end, l = lines[-1]
+        lines[-1] = (o, end - 1, l)
+
+    return lines
+
+
+def parse_range(parser, block, start, encoding='utf-8', errors='replace', city=None, state=None, zip=None):
+    """Parse the lines in a block of bytes that starts at offset start, returning a list of
+    (offset, next offset, line, result, error) tuples"""
+
+    lines = _lines(block, start, encoding, errors)
+
+    records = parser.parse_many([l for _, _, l in lines], city, state, zip)
+
+    return [(o, n, l, r.result, r.error) for (o, n, l), r in six.moves.zip(lines, records)]
+
+
+def _parse_file_range(path, start, end, args):
+    """Read and parse a range of a file in a worker"""
+    from . import parallel
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        block = f.read(end - start)
+
+    return parse_range(parallel._worker_parser, block, start, *args)
+
+
+def parse_file(parser, path, encoding='utf-8', workers=1, offset=0, line=1, city=None, state=None, zip=None,
+               chunk_bytes=1 << 16, errors='replace', prefetch=2):
+    """Parse a text file with an address on each line, yielding FileRecords in file order.
+
+    :param workers: Number of worker processes. With 1, the default, lines are parsed in this process.
+        None means the number of CPUs.
+    :param offset: Byte offset to start at, which must be the start of a line, such as the next_offset
+        of a record from an earlier run.
+    :param line: The line number of the line at offset.
+    :param chunk_bytes: About how many bytes of the file are parsed at once. Ranges always end at a newline.
+    :param errors: How decoding errors are handled, as for bytes.decode().
+
+    city, state and zip are single values for every line. With workers, at most workers * prefetch
+    ranges are in flight at once. """
+
+    import multiprocessing
+
+    workers = workers or multiprocessing.cpu_count()
+    args = (encoding, errors, city, state, zip)
+
+    with open(path, 'rb') as f:
+        # An empty file can't be mapped
+        if os.fstat(f.fileno()).st_size <= offset:
+            return
+
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            if workers == 1:
+                parsed = (parse_range(parser, mm[s:e], s, *args) for s, e in _ranges(mm, offset, chunk_bytes))
+
+                for r in _file_records(parsed, line):
+                    yield r
+
+                return
+
+            from .parallel import _pool
+
+            pool = _pool(parser, workers)
+
+            try:
+                window = workers * prefetch
+                pending = deque()
+
+                def parsed():
+                    for s, e in _ranges(mm, offset, chunk_bytes):
+                        pending.append(pool.apply_async(_parse_file_range, (path, s, e, args)))
+
+                        if len(pending) >= window:
+                            yield pending.popleft().get()
+
+                    while pending:
+                        yield pending.popleft().get()
+
+                for r in _file_records(parsed(), line):
+                    yield r
+
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+        finally:
+            mm.close()
+
+
+def _file_records(parsed, line):
+    """Yield FileRecords for an iterable of the lists returned by parse_range()"""
+
+    index = 0
+
+    for rows in parsed:
+        for o, n, l, result, error in rows:
+            yield FileRecord(index, l, result, error, line, o, n)
+            index += 1
+            line += 1
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2017 Civic Knowledge. This file is licensed under the terms of the
+# Revised BSD License, included in this distribution as LICENSE
+
+"""
+A gazetteer of city names, for finding the city at the end of an address that has no comma before it,
+such as '100 Main St Chula Vista CA'. Names are stored in a trie of their tokens, last token first, so
+the longest name that ends the address is found by walking back from the last token, in time that
+depends on the length of the name, not on the number of names.
+
+The bundled list, support/cities.csv, has the cities and communities of San Diego County and the larger
+cities of California.
+
+"""
+
+import os
+import threading
+
+import six
+
+CITIES_CSV = os.path.join(os.path.dirname(__file__), 'support', 'cities.csv')
+
+# The key in a trie node that marks the end of a name
+_END = None
+
+
+def read_cities(path=CITIES_CSV):
+    '''Read city names from the first column of a CSV file. A first row of 'name' is a header. '''
+    import csv
+
+    with open(path, 'r') as f:
+        names = [row[0] for row in csv.reader(f) if row and row[0].strip()]
+
+    if names and names[0].lower() == 'name':
+        names = names[1:]
+
+    return names
+
+
+class Gazetteer(object):
+    '''A set of city names, matched against the end of a ParserState's tokens. Names are split into
+    tokens by the parser's scanner, so they match the token values of the addresses. '''
+
+    def __init__(self, names):
+        from .grammar import get_grammar
+        from .parser import FastScanner
+
+        self._scan = scan = get_grammar().scanner(FastScanner).scan
+
+        self.names = []
+        self._trie = {}
+
+        seen = set()
+
+        for name in names:
+            canonical = ' '.join(name.lower().split())
+
+            if not canonical or canonical in seen:
+                continue
+
+            seen.add(canonical)
+            self.names.append(canonical)
+
+            # In lowercase, the scanner splits words that start with a suite word, such as 'north', into
+            # 'no' 'rth', and the suite is removed before the city is matched, so names are scanned in
+            # uppercase, as the words are when they can match.
+            values = [v for _, v in scan(canonical.upper())[0]]
+
+            node = self._trie
+            for v in reversed(values):
+                node = node.setdefault(v, {})
+
+            node[_END] = canonical
+
+    def __reduce__(self):
+        return (self.__class__, (self.names,))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        values = [v for _, v in self._scan(name.strip().upper())[0]]
+        return bool(values) and self.match(reversed(values))[0] == len(values)
+
+    @property
+    def digest(self):
+        '''A digest of the names, which persistent caches add to their keys'''
+        import hashlib
+
+        return hashlib.md5('|'.join(sorted(self.names)).encode('utf8')).hexdigest()
+
+    def match(self, values):
+        '''Find the longest name that matches the start of values, which are token values from the end of
+        an address, last first. Returns the number of tokens it matched and the name, or (0, None). '''
+
+        node = self._trie
+        longest = (0, None)
+
+        for i, v in enumerate(values, 1):
+            node = node.get(v)
+
+            if node is None:
+                break
+
+            if _END in node:
+                longest = (i, node[_END])
+
+        return longest
+
+
+_bundled = None
+_bundled_lock = threading.Lock()
+
+
+def get_gazetteer(cities=True):
+    '''Return a Gazetteer for the Parser cities argument: True for the bundled list, which is built once
+    and shared, a path to a CSV file, an iterable of names, or a Gazetteer. '''
+    global _bundled
+
+    if isinstance(cities, Gazetteer):
+        return cities
+
+    if cities is True:
+        with _bundled_lock:
+            if _bundled is None:
+                _bundled = Gazetteer(read_cities())
+        return _bundled
+
+    if isinstance(cities, six.string_types):
+        return Gazetteer(read_cities(cities))
+
+    return Gazetteer(cities)
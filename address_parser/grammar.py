@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2017 Civic Knowledge. This file is licensed under the terms of the
+# Revised BSD License, included in this distribution as LICENSE
+
+"""
+The word tables and compiled patterns that parsers use. They are built once per process, by get_grammar(),
+and shared by all Parser instances.
+
+The state table and the zip prefix table are in states.py.
+
+The street type table comes from support/suffixes.csv. A snapshot of it is kept in _suffixes.py, so it can be
+loaded without parsing the CSV file; after changing the CSV file, regenerate the snapshot with:
+
+    python -m address_parser.grammar
+
+"""
+
+import os
+import re
+import threading
+
+from types import MappingProxyType
+
+from .states import STATE_NAMES, COMMON_WORDS
+
+SUFFIXES_CSV = os.path.join(os.path.dirname(__file__), 'support', 'suffixes.csv')
+
+SUFFIXES_SNAPSHOT = os.path.join(os.path.dirname(__file__), '_suffixes.py')
+
+SUITE_WORDS = ('suite', 'ste',
+               'apt', 'apartment',
+               'room', 'rm',
+               '#', 'no',
+               'unit')
+
+STATES = tuple(abbr for abbr, _ in STATE_NAMES)
+
+DIRECTIONS = ('n', 's', 'e', 'w', 'north', 'south', 'east', 'west', 'ne', 'se', 'nw', 'sw')
+
+ORDINALS = ('st', 'th', 'nd', 'rd')
+
+# Token flags. The first four are the indexed patterns, in order, and are set if the pattern matches
+# anywhere in the token value.
+ZIP = 1 << 0  # zip_regex
+STATE = 1 << 1  # state_regex
+SUITE = 1 << 2  # suite_regex
+HIGHWAY = 1 << 3  # highway_regex
+HIGHWAY_WORD = 1 << 4  # The value starts with a highway word
+SUITE_WORD = 1 << 5  # The value starts with a suite word
+STREET_TYPE = 1 << 6  # The lowercased value is in the street type table
+DIRECTION = 1 << 7  # N, S, E, W, North, NE, ...
+ORDINAL = 1 << 8  # The ordinal suffix of a number, st, nd, rd, th
+BLOCK = 1 << 9  # 'block'
+OF = 1 << 10  # 'of'
+STATE_NAME = 1 << 11  # The last word of a full state name
+
+# Values that are only lowercase letters, for which the flags can be found with set lookups
+_plain_word = re.compile(r'[a-z]+\Z').match
+
+
+def read_street_types(path=SUFFIXES_CSV):
+    '''Read the street type table from a CSV file of (name, abbreviation) rows'''
+    import csv
+
+    street_types = {}
+
+    with open(path, 'r') as f:
+        for row in csv.reader(f):
+            street_types[row[0].lower()] = row[1].lower()
+
+    return street_types
+
+
+def load_street_types():
+    '''Return the street type table from the snapshot, or from the CSV file if there is no snapshot'''
+
+    try:
+        from ._suffixes import STREET_TYPES
+        return dict(STREET_TYPES)
+    except ImportError:
+        return read_street_types()
+
+
+def write_snapshot(path=SUFFIXES_SNAPSHOT):
+    '''Write the street type table from the CSV file to a Python module'''
+
+    with open(path, 'w') as f:
+        f.write('# -*- coding: utf-8 -*-\n')
+        f.write('# Generated from support/suffixes.csv by "python -m address_parser.grammar". Do not edit.\n\n')
+        f.write('STREET_TYPES = [\n')
+        for k, v in read_street_types().items():
+            f.write('    ({!r}, {!r}),\n'.format(k, v))
+        f.write(']\n')
+
+
+class Grammar(object):
+    '''The tables and compiled patterns used by parsers. It is shared by all of the parsers in a process,
+    so it can't be changed after it is constructed. '''
+
+    def __init__(self, street_types, suite_words=SUITE_WORDS, states=STATES, state_names=STATE_NAMES):
+
+        self.street_types = MappingProxyType(street_types)
+
+        self.highway_words = tuple(k for k, v in street_types.items() if v == 'hwy')
+        self.highway_regex = re.compile(r'\b(?:' + '|'.join(self.highway_words) + r')\b')
+
+        self.suite_words = tuple(suite_words)
+        self.suite_regex = re.compile(r'\b(?:' + '|'.join(self.suite_words) + r')\b')
+
+        self.zip_regex = re.compile(r'^(\d{5}(\-\d{4})?)$')
+
+        self.states = tuple(states)
+        self.state_regex = re.compile(r'^(' + '|'.join(self.states) + r')$')
+
+        # Patterns that ParserState.has() and find() look for often. Which of them match each token
+        # value is computed once and kept in _token_flags, as a bit for each pattern.
+        self.indexed_patterns = (self.zip_regex, self.state_regex, self.suite_regex, self.highway_regex)
+        self.pattern_bits = MappingProxyType({p: i for i, p in enumerate(self.indexed_patterns)})
+
+        self.state_names = tuple((abbr, name) for abbr, name in state_names if abbr in self.states)
+
+        self._word_flags = {}
+        for words, flag in ((self.highway_words, HIGHWAY | HIGHWAY_WORD), (self.suite_words, SUITE | SUITE_WORD),
+                            (self.states, STATE), (DIRECTIONS, DIRECTION), (ORDINALS, ORDINAL),
+                            (('block',), BLOCK), (('of',), OF),
+                            ([name.split()[-1] for _, name in self.state_names], STATE_NAME)):
+            for w in words:
+                self._word_flags[w] = self._word_flags.get(w, 0) | flag
+
+        # The lexicon, the flags for every word the grammar knows. It's also a cache, and the
+        # flags for other token values are added as they are seen.
+        self._token_flags = {w: self.classify(w) for w in list(self.street_types) + list(self._word_flags)}
+
+        # Abbreviations that are taken for a state wherever they end an address. The others are also
+        # common words, or words of the grammar, such as 'ct' and 'ne', and need a comma or a zip.
+        self.sure_states = frozenset(w for w in self.states
+                                     if w not in COMMON_WORDS and self._token_flags[w] == STATE)
+
+        self._scanners = {}
+
+        # Full state names, in a trie of their token values, last first, as the Gazetteer keeps city names.
+        # Names are scanned in both cases, since in lowercase the scanner splits 'north' into 'no' 'rth'.
+        from .parser import FastScanner
+
+        scan = self.scanner(FastScanner).scan
+
+        self._state_trie = {}
+        for abbr, name in self.state_names:
+            for text in (name, name.upper()):
+                node = self._state_trie
+                for _, v in reversed(scan(text)[0]):
+                    node = node.setdefault(v, {})
+                node[None] = abbr
+
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError("A Grammar is shared by all parsers, and can't be changed")
+
+        object.__setattr__(self, name, value)
+
+    def scanner(self, cls):
+        '''Return the shared instance of a Scanner class for this grammar'''
+
+        try:
+            return self._scanners[cls]
+        except KeyError:
+            return self._scanners.setdefault(cls, cls(self))
+
+    def match_state(self, values):
+        '''Find the longest full state name that matches the start of values, which are token values from
+        the end of an address, last first. Returns the number of tokens it matched and the abbreviation,
+        or (0, None). '''
+
+        node = self._state_trie
+        longest = (0, None)
+
+        for i, v in enumerate(values, 1):
+            node = node.get(v)
+
+            if node is None:
+                break
+
+            if None in node:
+                longest = (i, node[None])
+
+        return longest
+
+    def classify(self, value):
+        '''Compute the flags for a token value'''
+
+        if _plain_word(value):
+            # Word boundaries can only be at the ends of the value, so the patterns match only
+            # if the whole value is one of their words.
+            flags = self._word_flags.get(value, 0)
+        else:
+            flags = 0
+            for i, pattern in enumerate(self.indexed_patterns):
+                if pattern.search(value):
+                    flags |= 1 << i
+
+            if self.highway_regex.match(value):
+                flags |= HIGHWAY_WORD
+
+            if self.suite_regex.match(value):
+                flags |= SUITE_WORD
+
+            flags |= self._word_flags.get(value, 0) & (DIRECTION | ORDINAL | BLOCK | OF)
+
+        if value.lower() in self.street_types:
+            flags |= STREET_TYPE
+
+        return flags
+
+    def token_flags(self, value):
+        '''Return the flags for a token value, from the lexicon if possible'''
+
+        try:
+            return self._token_flags[value]
+        except KeyError:
+            pass
+
+        flags = self.classify(value)
+
+        # Parsers in several threads may add the same value at once, but they add the same flags, and
+        # single dict operations are atomic, with or without the GIL, so no lock is needed.
+        if len(self._token_flags) < 100000:
+            self._token_flags[value] = flags
+
+        return flags
+
+
+_grammar = None
+_grammar_lock = threading.Lock()
+
+
+def get_grammar():
+    '''Return the process-wide Grammar, building it the first time'''
+    global _grammar
+
+    if _grammar is None:
+        with _grammar_lock:
+            if _grammar is None:
+                _grammar = Grammar(load_street_types())
+
+    return _grammar
+
+
+if __name__ == '__main__':
+    write_snapshot()
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2017 Civic Knowledge. This file is licensed under the terms of the
+# Revised BSD License, included in this distribution as LICENSE
+
+"""
+An on-disk index from address hashes to record ids, for deduplicating and looking up large sets of
+addresses. The file is a header, a fan-out table and fixed-width entries, each a 16 byte md5 digest and
+an 8 byte record id, sorted by digest and then id. The fan-out table has the position of the first entry
+for each value of the leading bits of the digest, as in a git pack index, so a lookup is a binary search
+over a few entries. The file is memory mapped, not loaded into memory.
+
+    AddressIndex.build_from_records('addresses.idx', parser.parse_many(lines))
+
+    with AddressIndex('addresses.idx') as idx:
+        idx.get(parser.parse(line).hash.hash)  # The ids of the records with the same hash
+
+Indexes built on separate shards can be combined with AddressIndex.merge().
+
+"""
+
+import heapq
+import os
+import struct
+import tempfile
+
+MAGIC = b'APIDX001'
+
+# Magic, entry count, digest size, fan-out bits
+HEADER = struct.Struct('>8sQHB5x')
+
+FANOUT = struct.Struct('>Q')
+
+DIGEST_SIZE = 16
+
+ENTRY = struct.Struct('>16sQ')
+
+
+def _digest(key):
+    """Convert a hex string hash, as in ParsedAddress.hash.hash, to the 16 byte digest"""
+
+    if isinstance(key, bytes) and len(key) == DIGEST_SIZE:
+        return key
+
+    return bytes.fromhex(key)
+
+
+def _fanout_bits(n):
+    """The number of leading digest bits in the fan-out table, for about 8 entries per bucket"""
+    return min(16, (n // 8).bit_length())
+
+
+def _data_offset(bits):
+    return HEADER.size + ((1 << bits) + 1) * FANOUT.size
+
+
+def _read_entries(path, buffer_entries=8192):
+    """Yield the packed entries of an index file, or of a file of entries without a header"""
+
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if header[:len(MAGIC)] == MAGIC:
+            f.seek(_data_offset(HEADER.unpack(header)[3]))
+        else:
+            f.seek(0)
+
+        size = ENTRY.size * buffer_entries
+
+        while True:
+            block = f.read(size)
+            if not block:
+                return
+
+            for i in range(0, len(block), ENTRY.size):
+                yield block[i:i + ENTRY.size]
+
+
+def _write_index(path, entries, n):
+    """Write an iterable of n packed, sorted entries to an index file"""
+
+    bits = _fanout_bits(n)
+    shift = 16 - bits
+    counts = [0] * (1 << bits)
+
+    tmp = path + '.tmp'
+
+    with open(tmp, 'wb') as f:
+        f.seek(_data_offset(bits))
+
+        written = 0
+        for e in entries:
+            f.write(e)
+            counts[(e[0] << 8 | e[1]) >> shift] += 1
+            written += 1
+
+        if written != n:
+            raise ValueError("Expected {} entries, got {}".format(n, written))
+
+        table = [0]
+        for c in counts:
+            table.append(table[-1] + c)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, n, DIGEST_SIZE, bits))
+        f.write(b''.join(FANOUT.pack(t) for t in table))
+
+    os.replace(tmp, path)
+
+
+class _Digests(object):
+    """A sequence view of the digests in an index, for bisect"""
+
+    def __init__(self, index):
+        self._mm = index._mm
+        self._n = len(index)
+        self._offset = index._offset
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        o = self._offset + i * ENTRY.size
+        return self._mm[o:o + DIGEST_SIZE]
+
+
+class AddressIndex(object):
+    """A read-only, memory-mapped index from address hash digests to record ids"""
+
+    def __init__(self, path):
+        import mmap
+
+        self.path = path
+        self._f = open(path, 'rb')
+
+        header = self._f.read(HEADER.size)
+        magic, self._n, digest_size, self._bits = HEADER.unpack(header)
+
+        if magic != MAGIC or digest_size != DIGEST_SIZE:
+            self._f.close()
+            raise ValueError("'{}' is not an address index".format(path))
+
+        self._offset = _data_offset(self._bits)
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._digests = _Digests(self)
+
+    @classmethod
+    def build(cls, path, pairs, run_size=1000000, tmpdir=None):
+        """Build an index file from an iterable of (hash, record_id) pairs, where hash is a hex digest
+        string, as in ParsedAddress.hash.hash, or the 16 byte digest. Pairs are sorted in runs of run_size
+        in memory, and the runs are merged from temporary files, so any number of pairs can be indexed.
+        Returns the opened index. """
+
+        pack = ENTRY.pack
+        runs = []
+        run = []
+        n = 0
+
+        def flush():
+            run.sort()
+            fd, run_path = tempfile.mkstemp(suffix='.run', dir=tmpdir or os.path.dirname(os.path.abspath(path)))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(b''.join(run))
+            runs.append(run_path)
+            del run[:]
+
+        try:
+            for key, record_id in pairs:
+                run.append(pack(_digest(key), record_id))
+                n += 1
+                if len(run) >= run_size:
+                    flush()
+
+            if runs:
+                if run:
+                    flush()
+                entries = heapq.merge(*[_read_entries(r) for r in runs])
+            else:
+                run.sort()
+                entries = run
+
+            _write_index(path, entries, n)
+        finally:
+            for r in runs:
+                os.remove(r)
+
+        return cls(path)
+
+    @classmethod
+    def build_from_records(cls, path, records, field='hash', **kwargs):
+        """Build an index from ParseRecords, such as from Parser.parse_many(), with the record index as
+        the id. field is 'hash' or 'fuzzy_hash'. Records that failed to parse are skipped. """
+
+        pairs = ((getattr(r.result.hash, field), r.index) for r in records if r.ok)
+
+        return cls.build(path, pairs, **kwargs)
+
+    @classmethod
+    def merge(cls, path, indexes, offsets=None):
+        """Merge indexes, or paths of index files, into a new index at path. If the shards numbered their
+        records separately, offsets gives a number to add to the ids of each index. Returns the opened
+        index. """
+
+        paths = [i.path if isinstance(i, AddressIndex) else i for i in indexes]
+
+        n = 0
+        for p in paths:
+            with cls(p) as i:
+                n += len(i)
+
+        if offsets is None:
+            streams = [_read_entries(p) for p in paths]
+        else:
+            def shifted(p, offset):
+                for e in _read_entries(p):
+                    digest, record_id = ENTRY.unpack(e)
+                    yield ENTRY.pack(digest, record_id + offset)
+
+            # Adding an offset keeps each stream in order
+            streams = [shifted(p, o) for p, o in zip(paths, offsets)]
+
+        _write_index(path, heapq.merge(*streams), n)
+
+        return cls(path)
+
+    def __len__(self):
+        return self._n
+
+    def _entry(self, i):
+        return ENTRY.unpack_from(self._mm, self._offset + i * ENTRY.size)
+
+    def _range(self, digest):
+        from bisect import bisect_left, bisect_right
+
+        p = (digest[0] << 8 | digest[1]) >> (16 - self._bits)
+        lo, hi = struct.unpack_from('>QQ', self._mm, HEADER.size + p * FANOUT.size)
+
+        lo = bisect_left(self._digests, digest, lo, hi)
+
+        return lo, bisect_right(self._digests, digest, lo, hi)
+
+    def get(self, key):
+        """Return the list of record ids with a hash, which is empty if there are none"""
+
+        lo, hi = self._range(_digest(key))
+
+        return [self._entry(i)[1] for i in range(lo, hi)]
+
+    def count(self, key):
+        lo, hi = self._range(_digest(key))
+        return hi - lo
+
+    def __contains__(self, key):
+        return self.count(key) > 0
+
+    def __iter__(self):
+        """Yield (hex digest, record id) for every entry, in order"""
+
+        for i in range(self._n):
+            digest, record_id = self._entry(i)
+            yield digest.hex(), record_id
+
+    def groups(self, min_size=2):
+        """Yield (hex digest, [record ids]) for each hash with at least min_size records, which are the
+        sets of duplicate records"""
+
+        group = []
+        last = None
+
+        for i in range(self._n):
+            digest, record_id = self._entry(i)
+            if digest != last:
+                if len(group) >= min_size:
+                    yield last.hex(), group
+                group = []
+                last = digest
+            group.append(record_id)
+
+        if len(group) >= min_size:
+            yield last.hex(), group
+
+    def close(self):
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
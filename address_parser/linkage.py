@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2017 Civic Knowledge. This file is licensed under the terms of the
+# Revised BSD License, included in this distribution as LICENSE
+
+"""
+Fuzzy record linkage between two sets of addresses. Comparing every pair is quadratic, so the records of
+one side are grouped into blocks, by keys built from the parsed fields, and each record of the other side
+is compared only with the records that share a block with it:
+
+    index = BlockIndex()
+    index.add_records(parser.parse_many(left_lines))
+
+    for c in index.match(parser.parse_many(right_lines), threshold=0.8):
+        print(c.left, c.right, c.score)
+
+    index.stats['avoided']  # Comparisons that blocking saved
+
+Records are compared by the similarity of their fuzzy hash strings, which hold the number, the metaphone
+keys of the street, city and state, and the zip.
+
+"""
+
+from collections import namedtuple
+from difflib import SequenceMatcher
+
+from .cache import phonetic_key
+
+Candidate = namedtuple('Candidate', 'left right score')
+
+
+def _street(r):
+    return phonetic_key(r._name) if r._name else None
+
+
+# Each blocking key function returns a key for a ParsedAddress, or None if the address lacks the fields.
+# Several keys are used, so that an error in one field, such as a wrong zip or a misspelled street, does
+# not keep a pair out of every block.
+KEYS = dict(
+    zip_number=lambda r: ('zn', r._zip, r._tnumber) if r._zip else None,
+    number_street=lambda r: ('ns', r._tnumber, _street(r)) if r._name else None,
+    zip_street=lambda r: ('zs', r._zip, _street(r)) if r._zip and r._name else None,
+)
+
+
+def blocking_keys(result, keys=KEYS):
+    """Return the blocking keys for a ParsedAddress"""
+    return [k for k in (f(result) for f in keys.values()) if k is not None]
+
+
+class BlockIndex(object):
+    '''An inverted index from blocking keys to the records of one side of a linkage.
+
+    :param keys: A dict of blocking key functions, by name. Defaults to KEYS.
+    :param max_block_size: Blocks with more records than this are dropped, since comparing with all of
+        them would approach the cost of comparing every pair. Each record is in several blocks, so it can
+        still be found through the others.
+
+    The index holds the fuzzy hash string of each record, and the ids in each block. '''
+
+    def __init__(self, keys=KEYS, max_block_size=1000):
+        self.keys = keys
+        self.max_block_size = max_block_size
+
+        self._ids = []
+        self._strings = []
+        self._blocks = {}
+        self._interned = {}
+
+        self.queried = 0
+        self.compared = 0
+        self.matched = 0
+
+    def add(self, record_id, result):
+        '''Add a ParsedAddress to the index'''
+
+        pos = len(self._ids)
+
+        s = result.hash.fuzzy_hash_string
+        self._ids.append(record_id)
+        self._strings.append(self._interned.setdefault(s, s))
+
+        for k in blocking_keys(result, self.keys):
+            block = self._blocks.get(k, ())
+
+            if block is None:  # Oversized
+                continue
+            elif not block:
+                self._blocks[k] = [pos]
+            elif len(block) >= self.max_block_size:
+                self._blocks[k] = None
+            else:
+                block.append(pos)
+
+    def add_records(self, records):
+        '''Add ParseRecords, such as from Parser.parse_many(), with the record index as the id. Records that
+        failed to parse are skipped. Returns the number added. '''
+
+        n = 0
+        for r in records:
+            if r.ok:
+                self.add(r.index, r.result)
+                n += 1
+
+        return n
+
+    def __len__(self):
+        return len(self._ids)
+
+    def candidates(self, result):
+        '''Return the positions of the indexed records that share a block with a ParsedAddress'''
+
+        positions = set()
+
+        for k in blocking_keys(result, self.keys):
+            block = self._blocks.get(k)
+            if block:
+                positions.update(block)
+
+        return positions
+
+    def compare(self, result, threshold=0.8):
+        '''Return (record id, score) for the indexed records that share a block with a ParsedAddress and
+        have a similarity of at least threshold, best first'''
+
+        s = result.hash.fuzzy_hash_string
+
+        # SequenceMatcher caches information about the second sequence
+        sm = SequenceMatcher(None, '', s)
+
+        found = []
+        scores = {}
+        positions = self.candidates(result)
+
+        for pos in positions:
+            t = self._strings[pos]
+
+            # Equal fuzzy strings are common, and many records can share one
+            score = scores.get(t)
+
+            if score is None:
+                if t == s:
+                    score = 1.0
+                else:
+                    sm.set_seq1(t)
+                    # The quick ratios are upper bounds, and much cheaper
+                    if sm.real_quick_ratio() < threshold or sm.quick_ratio() < threshold:
+                        score = 0.0
+                    else:
+                        score = sm.ratio()
+                scores[t] = score
+
+            if score >= threshold:
+                found.append((self._ids[pos], score))
+
+        self.queried += 1
+        self.compared += len(positions)
+        self.matched += len(found)
+
+        found.sort(key=lambda e: (-e[1], e[0]))
+
+        return found
+
+    def match(self, records, threshold=0.8, top=None):
+        '''Compare ParseRecords, such as from Parser.parse_many(), with the index, yielding a Candidate
+        (left id, right record index, score) for each pair with a similarity of at least threshold. The
+        records are streamed, and the candidates for each record are yielded together, best first; top
+        limits the number for each record. '''
+
+        for r in records:
+            if not r.ok:
+                continue
+
+            for record_id, score in self.compare(r.result, threshold)[:top]:
+                yield Candidate(record_id, r.index, score)
+
+    @property
+    def stats(self):
+        '''Return the counters as a dict. avoided is the number of comparisons that blocking saved, out
+        of the comparisons of every indexed record with every queried record. '''
+
+        blocks = [b for b in self._blocks.values() if b is not None]
+        possible = len(self._ids) * self.queried
+
+        return dict(
+            records=len(self._ids),
+            blocks=len(blocks),
+            oversized_blocks=len(self._blocks) - len(blocks),
+            largest_block=max((len(b) for b in blocks), default=0),
+            queried=self.queried,
+            compared=self.compared,
+            matched=self.matched,
+            possible=possible,
+            avoided=possible - self.compared,
+            reduction_ratio=1 - float(self.compared) / possible if possible else 0.0
+        )
+
+
+def link(left, right, threshold=0.8, top=None, **kwargs):
+    '''Link two iterables of ParseRecords, indexing the left side and streaming the right, yielding
+    Candidates. Other keyword arguments are passed to BlockIndex. The index is created when the
+    generator starts; to get its stats, create a BlockIndex and call match() instead. '''
+
+    index = BlockIndex(**kwargs)
+    index.add_records(left)
+
+    for c in index.match(right, threshold, top):
+        yield c
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2017 Civic Knowledge. This file is licensed under the terms of the
+# Revised BSD License, included in this distribution as LICENSE
+
+"""
+Multi-process and multi-threaded parsing. The address lines are grouped into chunks, and each chunk is
+parsed in a worker process, by a Parser that was built once for that worker, or in a thread, by the
+caller's Parser.
+"""
+
+from collections import deque
+from itertools import islice
+
+# The Parser used by the functions that run in worker processes. With the 'fork' start method,
+# the grammar is inherited from the parent, so it is not rebuilt.
+_worker_parser = None
+
+
+def _init_worker(parser):
+    import pickle
+
+    global _worker_parser
+
+    # With 'fork', the parser arrives as the parent's object, with the parent's open cache files. Rebuilding
+    # it from its pickle gives the worker its own connection to a cache that processes can share, and
+    # drops a cache that they can't, as it does with the other start methods.
+    _worker_parser = pickle.loads(pickle.dumps(parser))
+
+
+def parse_rows(parser, chunk):
+    """Parse a list of (addrstr, city, state, zip) rows, returning (result, error) pairs"""
+
+    addrs, cities, states, zips = zip(*chunk)
+
+    return [(r.result, r.error) for r in parser.parse_many(addrs, cities, states, zips)]
+
+
+def _parse_chunk(chunk):
+    """Parse a chunk of rows in a worker"""
+    return parse_rows(_worker_parser, chunk)
+
+
+def _chunks(rows, chunksize):
+    while True:
+        chunk = list(islice(rows, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _records(index, chunk, get):
+    from .parser import ParseRecord
+
+    for i, ((addrstr, _, _, _), (result, error)) in enumerate(zip(chunk, get()), index):
+        yield ParseRecord(i, addrstr, result, error)
+
+
+def _run_chunks(rows, chunksize, window, submit):
+    """Send chunks of rows to submit(), which starts parsing them and returns a function that waits
+    for the (result, error) pairs, and yield ParseRecords in input order. At most window chunks are
+    in flight at once. """
+
+    pending = deque()
+    index = 0
+
+    for chunk in _chunks(rows, chunksize):
+        pending.append((chunk, submit(chunk)))
+
+        if len(pending) >= window:
+            for r in _records(index, *pending.popleft()):
+                yield r
+                index += 1
+
+    while pending:
+        for r in _records(index, *pending.popleft()):
+            yield r
+            index += 1
+
+
+def _context():
+    import multiprocessing
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    else:
+        return multiprocessing.get_context()
+
+
+def _pool(parser, workers):
+    return _context().Pool(workers, initializer=_init_worker, initargs=(parser,))
+
+
+def parse_parallel(parser, addrs, city=None, state=None, zip=None, workers=None, chunksize=500, prefetch=2):
+    """Parse addrs in a pool of worker processes, yielding ParseRecords in input order.
+
+    The input is consumed in chunks of chunksize lines, and at most workers * prefetch chunks are in
+    flight at once, so memory use is bounded no matter how long the input is.
+
+    """
+    import multiprocessing
+
+    workers = workers or multiprocessing.cpu_count()
+
+    if workers == 1:
+        for r in parser.parse_many(addrs, city, state, zip):
+            yield r
+        return
+
+    rows = parser._rows(addrs, city, state, zip)
+
+    pool = _pool(parser, workers)
+
+    try:
+        for r in _run_chunks(rows, chunksize, workers * prefetch,
+                             lambda chunk: pool.apply_async(_parse_chunk, (chunk,)).get):
+            yield r
+
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def parse_threaded(parser, addrs, city=None, state=None, zip=None, workers=None, chunksize=100, prefetch=2):
+    """Parse addrs in a pool of threads that share parser, yielding ParseRecords in input order.
+
+    Parser.parse() is thread safe, but on an interpreter with a GIL, threads don't parse faster than one
+    thread does; use parse_parallel() there. On a free-threaded build, threads scale with the cores,
+    without the cost of sending the results between processes.
+
+    """
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+
+    rows = parser._rows(addrs, city, state, zip)
+
+    with ThreadPoolExecutor(workers) as executor:
+        for r in _run_chunks(rows, chunksize, workers * prefetch,
+                             lambda chunk: executor.submit(parse_rows, parser, chunk).result):
+            yield r
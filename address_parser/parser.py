@@ -8,12 +8,15 @@ A Basic parser for US postal addresses.
 
 
 
-import os
-import csv
-import sys
+import re
 import six
 
-import hashlib
+from collections import namedtuple
+from contextlib import nullcontext
+from itertools import islice, repeat
+
+from .grammar import STATE, STATE_NAME, SUITE_WORD, HIGHWAY_WORD, STREET_TYPE, DIRECTION, ORDINAL, BLOCK, OF
+from .states import state_code, zip_states
 
 
 class Bunch(object):
@@ -22,6 +25,10 @@ class Bunch(object):
     def __init__(self, **kwds):
         self.__dict__.update(kwds)
 
+    def copy(self):
+        '''Return a copy, including copies of nested bunches'''
+        return self.__class__(**{k: (v.copy() if isinstance(v, Bunch) else v) for k, v in self.__dict__.items()})
+
     @property
     def dict(self):
         '''From the top level, return the whole structure as a dict'''
@@ -79,64 +86,506 @@ class TopBunch(Bunch):
                                       self.road.name, self.road.suffix] if i])
 
 
+def _field(name):
+    """A property that gets and sets a field on the ParsedAddress behind a _Part"""
+
+    def fget(self):
+        return getattr(self._address, name)
+
+    def fset(self, v):
+        setattr(self._address, name, v)
+
+    return property(fget, fset)
+
+
+def _lazy_field(name, make):
+    """A property for a field on the ParsedAddress behind a _Part that is computed by the
+    ParsedAddress method named make the first time it is read"""
+
+    def fget(self):
+        a = self._address
+        v = getattr(a, name)
+        if v is None:
+            v = getattr(a, make)()
+            setattr(a, name, v)
+        return v
+
+    def fset(self, v):
+        setattr(self._address, name, v)
+
+    return property(fget, fset)
+
+
+class _Part(object):
+    """A view of one group of the fields in a ParsedAddress, with the attributes of the nested Bunch
+    that it replaces. """
+
+    __slots__ = ('_address',)
+
+    _fields = ()
+
+    def __init__(self, address):
+        self._address = address
+
+    @property
+    def dict(self):
+        return {k: getattr(self, k) for k in self._fields}
+
+
+class NumberPart(_Part):
+    __slots__ = ()
+    _fields = ('type', 'number', 'tnumber', 'end_number', 'fraction', 'suite', 'is_block')
+
+    type = 'P'
+    number = _field('_number')
+    tnumber = _field('_tnumber')
+    end_number = _field('_end_number')
+    fraction = _field('_fraction')
+    suite = _field('_suite')
+    is_block = _field('_is_block')
+
+
+class RoadPart(_Part):
+    __slots__ = ()
+    _fields = ('type', 'name', 'direction', 'suffix')
+
+    type = 'P'
+    name = _field('_name')
+    direction = _field('_direction')
+    suffix = _field('_suffix')
+
+
+class LocalityPart(_Part):
+    __slots__ = ()
+    _fields = ('type', 'city', 'state', 'zip', 'zip4', 'state_mismatch')
+
+    type = 'P'
+    city = _field('_city')
+    state = _field('_state')
+    zip = _field('_zip')
+    zip4 = _field('_zip4')
+    state_mismatch = _field('_state_mismatch')
+
+
+class HashPart(_Part):
+    __slots__ = ()
+    _fields = ('hash_string', 'hash', 'fuzzy_hash_string', 'fuzzy_hash')
+
+    hash_string = _lazy_field('_hash_string', '_make_hash_string')
+    hash = _lazy_field('_hash', '_make_hash')
+    fuzzy_hash_string = _lazy_field('_fuzzy_hash_string', '_make_fuzzy_hash_string')
+    fuzzy_hash = _lazy_field('_fuzzy_hash', '_make_fuzzy_hash')
+
+
+class ParsedAddress(object):
+    """A parse result. It has the same attributes as the TopBunch that parsers used to return, such as
+    number.number, road.name and locality.zip, but the fields are stored flat in slots, so a result
+    is a single small object. The number, road, locality and hash groups are views that are created
+    when they are accessed.
+
+    The text and the hashes are computed the first time they are read, and then kept. """
+
+    __slots__ = ('_number', '_tnumber', '_end_number', '_fraction', '_suite', '_is_block',
+                 '_name', '_direction', '_suffix',
+                 '_city', '_state', '_zip', '_zip4', '_state_mismatch',
+                 '_hash_string', '_hash', '_fuzzy_hash_string', '_fuzzy_hash',
+                 '_text', '_cross_street')
+
+    def __init__(self, number, tnumber, end_number, fraction, suite, is_block,
+                 name, direction, suffix,
+                 city, state, zip, zip4,
+                 cross_street=None, state_mismatch=False):
+        self._number = number
+        self._tnumber = tnumber
+        self._end_number = end_number
+        self._fraction = fraction
+        self._suite = suite
+        self._is_block = is_block
+        self._name = name
+        self._direction = direction
+        self._suffix = suffix
+        self._city = city
+        self._state = state
+        self._zip = zip
+        self._zip4 = zip4
+        self._state_mismatch = state_mismatch
+        self._cross_street = cross_street
+
+        self._hash_string = None
+        self._hash = None
+        self._fuzzy_hash_string = None
+        self._fuzzy_hash = None
+        self._text = None
+
+    @property
+    def number(self):
+        return NumberPart(self)
+
+    @property
+    def road(self):
+        return RoadPart(self)
+
+    @property
+    def locality(self):
+        return LocalityPart(self)
+
+    @property
+    def hash(self):
+        return HashPart(self)
+
+    @property
+    def text(self):
+        """The whole address, including a cross street, as text"""
+        if self._text is None:
+            if self._cross_street:
+                self._text = str(self) + " / " + self._cross_street.text
+            else:
+                self._text = str(self)
+
+        return self._text
+
+    @text.setter
+    def text(self, v):
+        self._text = v
+
+    def _make_hash_string(self):
+        import unicodedata
+
+        s = '|'.join([
+            self._tnumber,
+            self._end_number or '.',
+            self._fraction or '.',
+            self._suite or '.',
+            str(self._is_block or '.'),
+            self._name or '.',
+            self._direction or '.',
+            self._suffix or '.',
+            self._city or '.',
+            self._state or '.',
+            str(self._zip4)
+        ]).lower()
+
+        return unicodedata.normalize('NFC', s)
+
+    def _make_fuzzy_hash_string(self):
+        import unicodedata
+        from .cache import phonetic_key
+
+        s = '|'.join([
+            self._tnumber,
+            self._end_number or '.',
+            phonetic_key(self._name) if self._name else '.',
+            phonetic_key(self._city) if self._city else '.',
+            phonetic_key(self._state) if self._state else '.',
+            str(self._zip4) if self._zip4 else '.'
+        ]).lower()
+
+        return unicodedata.normalize('NFC', s)
+
+    def _make_hash(self):
+        import hashlib
+
+        return hashlib.md5(self.hash.hash_string.encode('utf8')).hexdigest()
+
+    def _make_fuzzy_hash(self):
+        import hashlib
+
+        return hashlib.md5(self.hash.fuzzy_hash_string.encode('utf8')).hexdigest()
+
+    def __reduce__(self):
+        # The slot values as a tuple pickle in about half the time and space of the default state, which
+        # matters for persistent caches and for results sent back from worker processes.
+        return (_restore_parsed, tuple(getattr(self, k) for k in self.__slots__))
+
+    def copy(self):
+        c = ParsedAddress.__new__(ParsedAddress)
+
+        for k in self.__slots__:
+            setattr(c, k, getattr(self, k))
+
+        return c
+
+    @property
+    def dict(self):
+        """Return the whole structure as a dict of dicts"""
+        return dict(
+            number=self.number.dict,
+            road=self.road.dict,
+            locality=self.locality.dict,
+            hash=self.hash.dict,
+            text=self.text
+        )
+
+    @property
+    def args(self):
+        '''Returns kwargs for use in the Geocoder.geocoder method.
+
+        '''
+
+        return dict(
+            number=self._number,
+            name=self._name,
+            direction=self._direction,
+            suffix=self._suffix,
+            city=self._city,
+            state=self._state,
+            zip=self._zip
+        )
+
+    def __str__(self):
+
+        a = self.street_str()
+
+        if self._city and self._city != 'none':
+            a += ", " + self._city.title()
+
+        if self._state:
+            a += ", " + self._state.upper()
+
+        if self._zip:
+            a += " " + str(self._zip)
+
+        return a
+
+    def street_str(self):
+        """Just the street part"""
+
+        return " ".join(
+            [str(i).title() for i in [self._number if self._number > 0 else '', self._direction,
+                                      self._name, self._suffix] if i])
+
+
+def _restore_parsed(*values):
+    c = ParsedAddress.__new__(ParsedAddress)
+
+    for k, v in six.moves.zip(ParsedAddress.__slots__, values):
+        setattr(c, k, v)
+
+    return c
+
+
 class ParseError(Exception):
-    pass
+    """Raised when an address can't be parsed. reason is a short code for the kind of failure, for
+    counting failures, and the message has the details. """
+
+    def __init__(self, message, reason='failed'):
+        super(ParseError, self).__init__(message)
+        self.reason = reason
+
+
+class ParseRecord(namedtuple('ParseRecord', 'index input result error')):
+    """One record yielded by Parser.parse_many(). Exactly one of result and error is meaningful:
+    result is the parsed address ( or False for a blank line ) and error is the exception raised
+    while parsing it, or None. """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None and bool(self.result)
+
+
+class BatchResult(object):
+    """The results of Parser.parse_batch(), aligned with the input rows. Rows with the same normalized
+    input share one result object, so results should be copied before they are changed.
+
+    results[i] is the parsed address for row i, False for a blank row or None if parsing raised an
+    exception, which is in errors[i]. The results for the distinct rows are in unique_results, and
+    inverse[i] is the position of row i in it. """
+
+    def __init__(self, inputs, inverse, unique_results, unique_errors, parse_time, elapsed):
+        self.inputs = inputs
+        self.inverse = inverse
+        self.unique_results = unique_results
+        self.unique_errors = unique_errors
+        self.parse_time = parse_time
+        self.elapsed = elapsed
+
+    @property
+    def results(self):
+        u = self.unique_results
+        return [u[i] for i in self.inverse]
+
+    @property
+    def errors(self):
+        u = self.unique_errors
+        return [u[i] for i in self.inverse]
+
+    def __len__(self):
+        return len(self.inverse)
+
+    def __getitem__(self, i):
+        return self.unique_results[self.inverse[i]]
+
+    def __iter__(self):
+        u = self.unique_results
+        return (u[i] for i in self.inverse)
+
+    def records(self):
+        """Yield a ParseRecord for each row, as parse_many() does"""
+        r, e = self.unique_results, self.unique_errors
+
+        for index, (addrstr, i) in enumerate(six.moves.zip(self.inputs, self.inverse)):
+            yield ParseRecord(index, addrstr, r[i], e[i])
+
+    @property
+    def dedupe_ratio(self):
+        """The fraction of the rows that were duplicates, and were not parsed"""
+        return 1.0 - float(len(self.unique_results)) / len(self.inverse) if self.inverse else 0.0
+
+    @property
+    def time_saved(self):
+        """An estimate of the seconds saved by not parsing the duplicate rows, from the mean time to
+        parse a distinct row. """
+        n = len(self.unique_results)
+        return self.parse_time / n * (len(self.inverse) - n) if n else 0.0
+
+    @property
+    def stats(self):
+        return dict(
+            rows=len(self.inverse),
+            unique=len(self.unique_results),
+            dedupe_ratio=self.dedupe_ratio,
+            parse_time=self.parse_time,
+            elapsed=self.elapsed,
+            time_saved=self.time_saved
+        )
 
 
 class Parser(object):
-    def __init__(self, cities=None):
+    """Parses address strings. One Parser can be shared by many threads: each parse has its own
+    ParserState, and the only state shared between parses is the grammar's token lexicon, the result
+    cache, the phonetic cache and the metrics, which are all safe to update concurrently. """
+
+    def __init__(self, cities=None, cache_size=None, scanner_class=None, instrument=False, metrics=False,
+                 cache=None):
         '''
         Constructor
+
+        :param cities: A gazetteer of city names, for finding a city at the end of an address that has no
+            comma before it. True for the bundled list of San Diego County and California cities, a path
+            to a CSV file with the names in the first column, an iterable of names, or a Gazetteer. The
+            default, None, finds the city only after a comma.
+        :param cache_size: If set, keep up to this many parse results in an LRU cache. Cached results
+            are copied when returned, so callers can change them freely.
+        :param scanner_class: The tokenizer. FastScanner, the default, and Scanner produce the same tokens.
+        :param instrument: If True, record the time and hits of each parse stage in stage_stats.
+        :param metrics: If True, count parses, failures and latency in a Metrics, in the metrics attribute.
+            May also be a Metrics, to share one between parsers.
+        :param cache: A cache to use instead of an LRUCache, such as a SQLiteCache, which keeps results
+            between runs.
         '''
-        import re
+        from .cache import LRUCache
+        from .grammar import get_grammar
 
-        self.street_types, self.highway_words, self.highway_regex = self.init_street_types()
-        self.suite_words, self.suite_regex = self.init_suite_types()
+        self.grammar = g = get_grammar()
 
-        self.zip_regex = re.compile(r'^(\d{5}(\-\d{4})?)$')
+        self.street_types, self.highway_words, self.highway_regex = g.street_types, g.highway_words, g.highway_regex
+        self.suite_words, self.suite_regex = g.suite_words, g.suite_regex
 
-        # Punting on the full state regex for now.
-        self.state_regex = re.compile(r'^(ca)$')
+        self.zip_regex = g.zip_regex
+        self.state_regex = g.state_regex
 
         if cities:
-            self.city_words, self.city_regex = self.init__cities(cities)
-
-        self.scanner = Scanner(self)
+            from .gazetteer import get_gazetteer
+            self.gazetteer = get_gazetteer(cities)
+            # Results depend on the gazetteer, so it is part of the cache keys
+            self._cache_tag = (self.gazetteer.digest,)
+        else:
+            self.gazetteer = None
+            self._cache_tag = ()
 
-    def init_street_types(self):
-        import re
+        self.scanner = g.scanner(scanner_class or FastScanner)
 
-        street_types = {}
+        self.indexed_patterns = g.indexed_patterns
+        self.pattern_bits = g.pattern_bits
+        self.token_flags = g.token_flags
 
-        with open(os.path.join(os.path.dirname(sys.modules[__name__].__file__), 'support', 'suffixes.csv'), 'r') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                street_types[row[0].lower()] = row[1].lower()
+        if cache is not None:
+            self.cache = cache
+        else:
+            self.cache = LRUCache(cache_size) if cache_size else None
 
-        highway_words = [k for k, v in street_types.items() if v == 'hwy']
-        highway_regex = re.compile(r'\b(?:' + '|'.join(highway_words) + r')\b')
+        self.stage_stats = None
+        self.instrument(instrument)
 
-        return street_types, highway_words, highway_regex
+        if metrics is True:
+            from .stats import Metrics
+            self.metrics = Metrics(cache=self.cache)
+        else:
+            self.metrics = metrics or None
 
-    def init_suite_types(self):
-        import re
+    def __reduce__(self):
+        # Parsers are rebuilt in the receiving process, rather than copied, when they are pickled
+        # to send to a worker process. A persistent cache that processes can share is reopened there.
+        cache = self.cache if getattr(self.cache, 'multiprocess', False) else None
 
-        suite_words = ['suite', 'ste',
-                       'apt', 'apartment',
-                       'room', 'rm',
-                       '#', 'no',
-                       'unit'
-                       ]
+        return (self.__class__, (self.gazetteer, getattr(self.cache, 'maxsize', None), self.scanner.__class__,
+                                 self.stage_stats is not None, self.metrics is not None, cache))
 
-        suite_regex = re.compile(r'\b(?:' + '|'.join(suite_words) + r')\b')
+    def instrument(self, enable=True):
+        '''Turn recording of per stage parse statistics on or off. The statistics are in stage_stats, which is
+        None when recording is off; call stage_stats.reset() to clear them. '''
 
-        return suite_words, suite_regex
+        if not enable:
+            self.stage_stats = None
+        elif self.stage_stats is None:
+            from .stats import StageStats
+            self.stage_stats = StageStats(ParserState.STAGES)
 
     def parse(self, addrstr, city=None, state=None, zip=None):
 
         if not addrstr.strip():
+            if self.metrics is not None:
+                self.metrics.observe_empty()
             return False
 
+        if self.metrics is not None:
+            return self._parse_measured(addrstr, city, state, zip)
+
+        return self._parse(addrstr, city, state, zip)
+
+    def _parse_measured(self, addrstr, city, state, zip):
+        """_parse(), recording the outcome and the time in the metrics"""
+        import time
+
+        t0 = time.perf_counter()
+
+        try:
+            r = self._parse(addrstr, city, state, zip)
+        except Exception as e:
+            self.metrics.observe_failure(e, time.perf_counter() - t0)
+            raise
+
+        self.metrics.observe_parse(time.perf_counter() - t0, r._cross_street is not None)
+
+        return r
+
+    def _parse(self, addrstr, city, state, zip):
+        """Parse a non-blank address string, through the cache if there is one. Shared by parse()
+        and parse_many() """
+
+        if self.cache is None:
+            return self._parse_address(addrstr, city, state, zip)
+
+        # Runs of whitespace only matter inside tokens that the scanner can't classify, so they
+        # are collapsed for the cache key. The address itself is what gets parsed, so an address
+        # gets the same result with the cache as without it.
+        key = (' '.join(addrstr.split()), city, state, zip) + self._cache_tag
+
+        r = self.cache.get(key)
+
+        if r is None:
+            r = self._parse_address(addrstr, city, state, zip)
+            self.cache.put(key, r)
+        elif getattr(self.cache, 'persistent', False):
+            # Results from a persistent cache are unpickled, so they are already copies
+            return r
+
+        return r.copy()
+
+    def _parse_address(self, addrstr, city, state, zip):
+
         bas = addrstr.split(' / ')
 
         if len(bas) == 0:
@@ -147,7 +596,7 @@ class Parser(object):
             ps1 = ParserState(self, bas[0]).parse()
             if bas[1]:
                 ps2 = ParserState(self, bas[1]).parse()
-                ps1.number.cross_street = ps2
+                ps1.cross_street = ps2
 
         if city:
             ps1.city = str(city).title()
@@ -158,10 +607,195 @@ class Parser(object):
         if zip:
             ps1.zip = zip
 
-        ps1.as_text = str(ps1)
+        ps1.check_state()
+
+        if ps1.cross_street:
+            ps1.cross_street.check_state()
 
         return ps1.result
 
+    def parse_many(self, addrs, city=None, state=None, zip=None):
+        """Parse an iterable of address strings, yielding a ParseRecord for each one, in input order.
+
+        The city, state and zip arguments may be either a single value, applied to every address,
+        or an iterable that runs parallel to addrs; a ValueError is raised if it has fewer or more values
+        than addrs. Errors are captured in the record rather than raised, so a bad line never stops
+        the batch.
+
+        On the bundled tests/support/test_geocoder_addresses.txt this should sustain at least
+        5,000 addresses per second on one core; see benchmarks/bench_parse_many.py
+
+        """
+
+        metrics = self.metrics
+        parse = self._parse if metrics is None else self._parse_measured
+
+        rows = self._rows(addrs, city, state, zip)
+
+        try:
+            for i, (addrstr, c, s, z) in enumerate(rows):
+                try:
+                    if addrstr.isspace() or not addrstr:
+                        if metrics is not None:
+                            metrics.observe_empty()
+                        r = False
+                    else:
+                        r = parse(addrstr, c, s, z)
+                except Exception as e:
+                    yield ParseRecord(i, addrstr, None, e)
+                else:
+                    yield ParseRecord(i, addrstr, r, None)
+        finally:
+            # Write the results that a persistent cache is holding
+            if self.cache is not None:
+                self.cache.flush()
+
+    def parse_batch(self, addrs, city=None, state=None, zip=None, fold_case=False):
+        """Parse a batch of addresses, parsing each distinct input only once, and return a BatchResult
+        with the results aligned to the input rows.
+
+        Inputs are the same if they are equal after collapsing runs of whitespace, and, with fold_case,
+        after lowercasing, and the normalized string is what gets parsed. Case can change the parse of a
+        few inputs, such as a one letter suite, so with fold_case the result for a row is the result for
+        its lowercased address.
+
+        The city, state and zip arguments are the same as for parse_many(). """
+        import time
+
+        t0 = time.time()
+
+        inputs = addrs if isinstance(addrs, (list, tuple)) else list(addrs)
+
+        rows = self._rows(inputs, city, state, zip)
+
+        positions = {}
+        unique = []
+        inverse = []
+
+        for addrstr, c, s, z in rows:
+            norm = ' '.join(addrstr.split()) if addrstr else ''
+            key = (norm.lower() if fold_case else norm, c, s, z)
+
+            try:
+                inverse.append(positions[key])
+            except KeyError:
+                positions[key] = len(unique)
+                inverse.append(len(unique))
+                unique.append(key)
+
+        t1 = time.time()
+
+        results = []
+        errors = []
+
+        if unique:
+            # A persistent cache reads the results it has for the batch in bulk. The normalized rows
+            # are also the cache keys.
+            keys = [k + self._cache_tag for k in unique] if self._cache_tag else unique
+
+            with self.cache.batch(keys) if self.cache is not None else nullcontext():
+                for r in self.parse_many(*[list(c) for c in six.moves.zip(*unique)]):
+                    results.append(r.result)
+                    errors.append(r.error)
+
+        t2 = time.time()
+
+        return BatchResult(inputs, inverse, results, errors, t2 - t1, t2 - t0)
+
+    def parse_parallel(self, addrs, city=None, state=None, zip=None, workers=None, chunksize=500):
+        """Like parse_many(), but parse in a pool of worker processes. Lines are sent to the workers in
+        chunks of chunksize lines, and results are yielded in input order. workers defaults to the number
+        of CPUs. """
+        from .parallel import parse_parallel
+
+        return parse_parallel(self, addrs, city, state, zip, workers=workers, chunksize=chunksize)
+
+    def parse_file(self, path, encoding='utf-8', workers=1, offset=0, line=1, city=None, state=None, zip=None,
+                   chunk_bytes=1 << 16):
+        """Parse a text file with an address on each line, yielding FileRecords, which are ParseRecords
+        with the line number and the byte offsets of the line and of the next one. The file is memory
+        mapped and parsed in newline aligned ranges of about chunk_bytes, in this process or in worker
+        processes. To resume, pass the next_offset and line + 1 of the last record. See
+        address_parser.files """
+        from .files import parse_file
+
+        return parse_file(self, path, encoding=encoding, workers=workers, offset=offset, line=line,
+                          city=city, state=state, zip=zip, chunk_bytes=chunk_bytes)
+
+    def parse_columns(self, addrs, city=None, state=None, zip=None, fields=None):
+        """Parse an iterable of address strings, returning a dict with a list for each result field, plus
+        an 'error' list. Each distinct address is parsed only once. See address_parser.columns """
+        from .columns import parse_columns, FIELDS
+
+        return parse_columns(self, addrs, city, state, zip, fields=fields or FIELDS)
+
+    def parse_threaded(self, addrs, city=None, state=None, zip=None, workers=None, chunksize=100):
+        """Like parse_many(), but parse in a pool of threads that share this parser. This is for
+        free-threaded Python builds; with the GIL, use parse_parallel(). workers defaults to the
+        number of CPUs. """
+        from .parallel import parse_threaded
+
+        return parse_threaded(self, addrs, city, state, zip, workers=workers, chunksize=chunksize)
+
+    @staticmethod
+    def _column(v):
+        """Return an iterator for a parse_many() override argument, which may be a scalar or an iterable"""
+
+        if _scalar(v):
+            return repeat(v)
+        else:
+            return iter(v)
+
+    @staticmethod
+    def _rows(addrs, city=None, state=None, zip=None):
+        """Return an iterator of (addrstr, city, state, zip) rows for the parse_many() arguments. Raises
+        ValueError, when the rows run out, if an iterable city, state or zip has a different length than
+        addrs. """
+
+        columns = (city, state, zip)
+
+        if all(_scalar(v) for v in columns):
+            return six.moves.zip(addrs, repeat(city), repeat(state), repeat(zip))
+
+        return _checked_rows(addrs, columns)
+
+
+def _scalar(v):
+    return v is None or isinstance(v, (six.string_types, six.integer_types))
+
+
+# Fills in for the values of a column that is shorter than the addresses
+_MISSING = object()
+
+
+def _checked_rows(addrs, columns):
+    """Yield the rows of Parser._rows() when some of the columns are iterables"""
+
+    names = ('city', 'state', 'zip')
+    iterables = [i for i, v in enumerate(columns) if not _scalar(v)]
+    row = [None] + list(columns)
+
+    for values in six.moves.zip_longest(addrs, *[columns[i] for i in iterables], fillvalue=_MISSING):
+        if values[0] is _MISSING:
+            name = names[next(iterables[j] for j, v in enumerate(values[1:]) if v is not _MISSING)]
+            raise ValueError("{} has more values than addrs".format(name))
+
+        for j, v in enumerate(values[1:]):
+            if v is _MISSING:
+                raise ValueError("{} has fewer values than addrs".format(names[iterables[j]]))
+
+        row[0] = values[0]
+        for i, v in six.moves.zip(iterables, values[1:]):
+            row[i + 1] = v
+
+        yield tuple(row)
+
+
+_alphanumber_match = re.compile(r'(\d+)([a-zA-Z]+)').match
+_fraction_split = re.compile(r'\s*[/]\s*').split
+_multinumber_split = re.compile(r'\s*[&/\-]\s*').split
+_po_box_search = re.compile(r'\bp\.?\s*o\.?\s*box\b', re.IGNORECASE).search
+
 
 class Scanner(object):
     END = 0
@@ -212,17 +846,13 @@ class Scanner(object):
 
     @staticmethod
     def s_fractionnumber(scanner, token):
-        import re
-
-        t1, t2 = re.split(r'\s*[/]\s*', token, 1)
+        t1, t2 = _fraction_split(token, 1)
 
         return (Scanner.MULTINUMBER, '{}/{}'.format(t1, t2))
 
     @staticmethod
     def s_multinumber(scanner, token):
-        import re
-
-        t1, t2 = re.split(r'\s*[&/\-]\s*', token, 1)
+        t1, t2 = _multinumber_split(token, 1)
 
         return (Scanner.MULTINUMBER, '{}-{}'.format(t1, t2))
 
@@ -260,30 +890,485 @@ class Scanner(object):
         ])
 
     def scan(self, s):
+        # re.Scanner stores the current match on itself, so concurrent scans overwrite each other's
+        # scanner.match. None of the token functions read it, so that is harmless.
         return self.scanner.scan(s)
 
+    def scan_tagged(self, s):
+        """Scan a string, returning the tokens, a list of the lexicon flags of each token, and the
+        part of the string that could not be scanned. """
+
+        tokens, rest = self.scan(s)
+        token_flags = self.parser.token_flags
+
+        return tokens, [token_flags(v) for _, v in tokens], rest
+
+
+class FastScanner(Scanner):
+    """A Scanner that matches one compiled pattern, with a named group for each kind of token, and
+    dispatches on the name of the group that matched, rather than calling a function for each token.
+    It produces the same tokens as Scanner. """
+
+    def __init__(self, parser):
+
+        self.parser = parser
+
+        suite_regex = r'(?:' + '|'.join(self.parser.suite_words) + r')'
+
+        # The alternatives, in the same order as in Scanner, since the first one that matches wins.
+        # re.Scanner compiles without the UNICODE flag, so \s, \d and \b only match ASCII there.
+        self.pattern = re.compile('|'.join('(?P<{}>{})'.format(name, regex) for name, regex in [
+            ('space', r"\s+"),
+            ('suiteintro', suite_regex),
+            ('fractionnumber', r"\d+\s*[\/]\s*\d+"),
+            ('multinumber', r"[a-zA-Z]*\d+[a-zA-Z]*\s*[\&\-]\s*[a-zA-Z]*\d+[a-zA-Z]*(?:\/\d+)?"),
+            ('word', r"[a-zA-Z\.\-\'\`]+"),
+            ('alphanumber', r"\d+[a-zA-Z]+"),
+            ('numberalpha', r"[a-zA-Z]+\d+"),
+            ('number', r"\d+"),
+            ('comma', r","),
+            ('conjunction', r"&"),
+            ('other', r".+\b"),
+        ]), re.ASCII)
+
+    def scan(self, s):
+        WORD, NUMBER, ALPHANUMBER, MULTINUMBER = self.WORD, self.NUMBER, self.ALPHANUMBER, self.MULTINUMBER
+
+        result = []
+        append = result.append
+        match = self.pattern.scanner(s).match
+        i = 0
+
+        while True:
+            m = match()
+            if not m:
+                break
+
+            j = m.end()
+            if i == j:
+                break
+
+            kind = m.lastgroup
+
+            if kind == 'space':
+                pass
+            elif kind == 'word':
+                append((WORD, m.group().lower().strip('.')))
+            elif kind == 'number':
+                append((NUMBER, m.group()))
+            elif kind == 'comma':
+                append((self.COMMA, ''))
+            elif kind == 'alphanumber' or kind == 'numberalpha':
+                append((ALPHANUMBER, m.group()))
+            elif kind == 'suiteintro':
+                append((self.SUITEINTRO, m.group().lower().strip(',').strip()))
+            elif kind == 'multinumber':
+                append((MULTINUMBER, '{}-{}'.format(*_multinumber_split(m.group(), 1))))
+            elif kind == 'fractionnumber':
+                append((MULTINUMBER, '{}/{}'.format(*_fraction_split(m.group(), 1))))
+            elif kind == 'conjunction':
+                append((self.CONJUNCTION, ''))
+            else:
+                append((self.OTHER, m.group().lower().strip()))
+
+            i = j
+
+        return result, s[i:]
+
+
+class TokenStream(object):
+    """The remaining tokens of a ParserState. The tokens are kept in a list with a cursor at the front, so
+    taking tokens from the front or the end and putting them back doesn't copy the list. save() shares the
+    list with the snapshot, and the list is only copied if it is changed while a snapshot refers to it.
+
+    A token taken far from the end leaves a tombstone, None, in its slot, so nothing shifts, and a token
+    put back where one was taken goes into the tombstone. The list is compacted when the tombstones
+    outnumber the tokens. Positions skip the tombstones; a finger remembers the last position looked up,
+    so finding a token and then taking it, or looking at the tokens in order, doesn't walk the list again.
+
+    The stream also keeps counts of the remaining tokens by type, by value and by each bit of a flags
+    value that the classify function assigns to each token value, so membership tests don't scan the
+    tokens. The counts are updated as tokens are taken and inserted. """
+
+    __slots__ = ('_tokens', '_flags', '_head', '_shared', '_saved', '_classify', '_n', '_dead',
+                 '_fpos', '_fj', '_type_counts', '_value_counts', '_bit_counts', 'last_flags')
+
+    # A token taken within this many slots of the end is deleted, shifting the rest, instead of leaving
+    # a tombstone. The cost of a shift is bounded, and short streams never have tombstones to walk over.
+    SHIFT = 32
+
+    def __init__(self, tokens, classify=None, nbits=0, flags=None):
+        self._tokens = tokens
+        self._classify = classify
+
+        if flags is not None:
+            self._flags = flags
+        elif classify:
+            self._flags = [classify(v) for _, v in tokens]
+        else:
+            self._flags = [0] * len(tokens)
+
+        self.last_flags = 0
+        self._head = 0
+        self._shared = False
+        self._saved = []
+        self._bit_counts = [0] * nbits
+
+        self._recount()
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        it = islice(self._tokens, self._head, None)
+        return (t for t in it if t is not None) if self._dead else it
+
+    def __getitem__(self, i):
+        return self._tokens[self._index(i)]
+
+    def flags_at(self, i):
+        """Return the flags of the token at position i, or 0 if there is no token there"""
+        try:
+            return self._flags[self._index(i)]
+        except IndexError:
+            return 0
+
+    def _index(self, i):
+        """Convert a position in the remaining tokens to an index in the list"""
+        n = self._n
+        p = i if i >= 0 else n + i
+
+        if not 0 <= p < n:
+            raise IndexError('token index out of range')
+
+        if not self._dead:
+            return self._head + p
+
+        # Walk from the finger, or from the end nearer to the position. The finger (fp, j) says
+        # that there are fp tokens before index j.
+        fp, j = self._fpos, self._fj
+
+        if p < abs(p - fp):
+            fp, j = 0, self._head
+        elif n - p < abs(p - fp):
+            fp, j = n, len(self._tokens)
+
+        tokens = self._tokens
+
+        if p >= fp:
+            while True:
+                if tokens[j] is not None:
+                    if fp == p:
+                        break
+                    fp += 1
+                j += 1
+        else:
+            while fp > p:
+                j -= 1
+                if tokens[j] is not None:
+                    fp -= 1
+
+        self._fpos, self._fj = p, j
+
+        return j
+
+    def _own(self):
+        """Copy the list if a snapshot refers to it, before changing it"""
+        if self._shared:
+            self._compact()
+            self._shared = False
+
+    def _compact(self):
+        """Replace the list with a copy of the remaining tokens, without tombstones"""
+        tokens, flags, h = self._tokens, self._flags, self._head
+
+        if self._dead:
+            keep = [j for j in range(h, len(tokens)) if tokens[j] is not None]
+            self._tokens = [tokens[j] for j in keep]
+            self._flags = [flags[j] for j in keep]
+        else:
+            self._tokens = tokens[h:]
+            self._flags = flags[h:]
+
+        self._head = 0
+        self._dead = 0
+        self._fpos, self._fj = 0, 0
+
+    def _remove(self, j):
+        """Leave a tombstone at index j, which is not the head"""
+        self._tokens[j] = None
+        self._flags[j] = 0
+        self._n -= 1
+        self._dead += 1
+
+        if j < self._fj:
+            self._fpos -= 1
+
+    def _advance(self):
+        """Move the head past tombstones"""
+        tokens, h = self._tokens, self._head
+
+        while h < len(tokens) and tokens[h] is None:
+            h += 1
+            self._dead -= 1
+
+        self._head = h
+
+        if self._fj < h:
+            self._fpos, self._fj = 0, h
+
+    def _count(self, t, f, d):
+        """Add d to the counts for token t, which has flags f"""
+        tc = self._type_counts
+        tc[t[0]] = tc.get(t[0], 0) + d
+
+        vc = self._value_counts
+        vc[t[1]] = vc.get(t[1], 0) + d
+
+        if f:
+            bc = self._bit_counts
+            for i in range(len(bc)):
+                if f & (1 << i):
+                    bc[i] += d
+
+    def _recount(self):
+        self._type_counts = {}
+        self._value_counts = {}
+        self._bit_counts = [0] * len(self._bit_counts)
+        self._n = 0
+        self._dead = 0
+        self._fpos, self._fj = 0, self._head
+
+        for j in range(self._head, len(self._tokens)):
+            t = self._tokens[j]
+            if t is None:
+                self._dead += 1
+            else:
+                self._n += 1
+                self._count(t, self._flags[j], 1)
+
+    def take(self, i=0):
+        """Remove and return the token at position i"""
+
+        if i == 0:
+            j = self._head
+            t = self._tokens[j]
+            self.last_flags = f = self._flags[j]
+            self._count(t, f, -1)
+            self._n -= 1
+
+            if j < self._fj:
+                self._fpos -= 1
+
+            self._head = j + 1
+            if self._dead:
+                self._advance()
+            elif self._fj <= j:
+                self._fpos, self._fj = 0, j + 1
+
+            return t
+
+        p = i if i >= 0 else self._n + i
+
+        if p <= 0:
+            if p == 0:
+                return self.take()
+            raise IndexError('token index out of range')
+
+        self._own()
+
+        j = self._index(p)
+        tokens, flags = self._tokens, self._flags
+        t = tokens[j]
+        self.last_flags = flags[j]
+        self._count(t, self.last_flags, -1)
+        self._fpos, self._fj = p, j
+
+        if len(tokens) - j <= self.SHIFT:
+            # Near the end, as in every ordinary address, shifting the rest is cheaper than a tombstone
+            del tokens[j]
+            del flags[j]
+            self._n -= 1
+        else:
+            self._remove(j)
+
+            if self._dead > 16 and self._dead > self._n:
+                self._compact()
+
+        return t
+
+    def insert(self, i, t):
+        """Insert a token before position i"""
+
+        f = self._classify(t[1]) if self._classify else 0
+        n = self._n
+        p = max(n + i, 0) if i < 0 else min(i, n)
+
+        if p == 0 and self._head > 0 and not self._shared:
+            self._head -= 1
+            j = self._head
+            self._tokens[j] = t
+            self._flags[j] = f
+            self._fpos += 1
+        else:
+            self._own()
+            j = self._index(p) if p < n else len(self._tokens)
+
+            if j > self._head and self._tokens[j - 1] is None:
+                # Back into the slot of a token that was taken
+                j -= 1
+                self._tokens[j] = t
+                self._flags[j] = f
+                self._dead -= 1
+            else:
+                self._tokens.insert(j, t)
+                self._flags.insert(j, f)
+
+            self._fpos, self._fj = p, j
+
+        self._n += 1
+        self._count(t, f, 1)
+
+    def discard(self, flag, limit=None):
+        """Remove the first limit remaining tokens with any of the lexicon flags in flag, or all of them
+        if limit is None, in one pass. Return the number removed"""
+
+        self._own()
+
+        tokens, flags = self._tokens, self._flags
+        k = 0
+
+        for j in range(self._head, len(tokens)):
+            if k == limit:
+                break
+
+            if flags[j] & flag:
+                self._count(tokens[j], flags[j], -1)
+                self._remove(j)
+                k += 1
+
+        self._advance()
+
+        if self._dead > 16 and self._dead > self._n:
+            self._compact()
+
+        return k
+
+    def save(self):
+        self._saved.append((self._tokens, self._flags, self._head))
+        self._shared = True
+
+    def restore(self):
+        if self._saved:
+            self._tokens, self._flags, self._head = self._saved.pop(0)
+            self._shared = True
+            self._recount()
+
+    def has_type(self, ttype):
+        return self._type_counts.get(ttype, 0) > 0
+
+    def has_value(self, value):
+        return self._value_counts.get(value, 0) > 0
+
+    def has_bit(self, i):
+        return self._bit_counts[i] > 0
+
+    def _live(self, reverse):
+        """Generate the position and the list index of each remaining token"""
+        tokens, h = self._tokens, self._head
+
+        if reverse:
+            p = self._n
+            for j in range(len(tokens) - 1, h - 1, -1):
+                if tokens[j] is not None:
+                    p -= 1
+                    yield p, j
+        elif not self._dead:
+            for j in range(h, len(tokens)):
+                yield j - h, j
+        else:
+            p = 0
+            for j in range(h, len(tokens)):
+                if tokens[j] is not None:
+                    yield p, j
+                    p += 1
+
+    def _found(self, p, j):
+        """Put the finger on a token that was found, so taking it doesn't walk the list again"""
+        self._fpos, self._fj = p, j
+        return p
+
+    def find_type(self, ttype, reverse=False):
+        """Return the position of the first remaining token of the given type, or False"""
+        if self.has_type(ttype):
+            tokens = self._tokens
+            for p, j in self._live(reverse):
+                if tokens[j][0] == ttype:
+                    return self._found(p, j)
+
+        return False
+
+    def find_value(self, value, reverse=False):
+        """Return the position of the first remaining token with the given value, or False"""
+        if self.has_value(value):
+            tokens = self._tokens
+            for p, j in self._live(reverse):
+                if tokens[j][1] == value:
+                    return self._found(p, j)
+
+        return False
+
+    def find_bit(self, i, reverse=False):
+        """Return the position of the first remaining token that has flag bit i set, or False"""
+        if self.has_bit(i):
+            flags = self._flags
+            mask = 1 << i
+            for p, j in self._live(reverse):
+                if flags[j] & mask:
+                    return self._found(p, j)
+
+        return False
+
+    def find_flag(self, flag, reverse=False):
+        """Return the position of the first remaining token with any of the lexicon flags in flag, or
+        False. The flags have no counts, so this always scans the tokens; check a count first, as with
+        has_value(), when the flag is usually absent"""
+        flags = self._flags
+        for p, j in self._live(reverse):
+            if flags[j] & flag:
+                return self._found(p, j)
+
+        return False
+
 
 class ParserState(object):
+
+    __slots__ = ('parser', 'input', 'tokens',
+                 'ttype', 'toks', 'tflags', 'start', 'end', 'line',
+                 'number', 'multinumber', 'fraction', 'is_block',
+                 'street_direction', 'street_name', 'street_type', 'suite',
+                 'zip', 'state', 'city', 'cross_street', 'state_mismatch',
+                 '_hash')
+
     def __init__(self, parser, s):
         '''
         Constructor
         '''
-        import re
 
         self.parser = parser
 
         self.input = s
 
-        self.tokens = []
-
-        self.tokens, rest = self.parser.scanner.scan(self.input)
+        tokens, flags, rest = self.parser.scanner.scan_tagged(self.input)
 
-        self.tokens.append((Scanner.END, ''))
+        tokens.append((Scanner.END, ''))
+        flags.append(0)
 
-        self._saved_tokens = []
+        self.tokens = TokenStream(tokens, self.parser.token_flags, len(self.parser.indexed_patterns), flags)
 
         self.ttype = None
         self.toks = None
+        self.tflags = 0
         self.start = None
         self.end = None
         self.line = None
@@ -300,6 +1385,7 @@ class ParserState(object):
         self.state = None
         self.city = None
         self.cross_street = None
+        self.state_mismatch = False
 
         self._hash = None
 
@@ -334,7 +1420,7 @@ class ParserState(object):
         return " ".join(
             [str(i).title() for i in [self.street_direction, self.street_name, self.street_type] if i]).strip()
 
-    def fail(self, m=None, expected=None):
+    def fail(self, m=None, expected=None, reason='failed'):
 
         message = ("Failed for '{toks}' in '{line}' , type={type_name} "
                    .format(toks=self.toks, type_name=Scanner.types[self.ttype], line=self.input)
@@ -350,7 +1436,7 @@ class ParserState(object):
         if m:
             message += ". message: {}".format(m)
 
-        raise ParseError(message)
+        raise ParseError(message, reason)
 
     LAST = -2
 
@@ -364,121 +1450,68 @@ class ParserState(object):
 
     @property
     def result(self):
-        '''Return a representation of the parser state as nested objects. '''
-
-        return TopBunch(
-            number=Bunch(
-                type='P',
-                number=int(self.number) if self.number else -1,
-                tnumber=str(self.number),
-                end_number=self.multinumber,
-                fraction=self.fraction,
-                suite=self.suite,
-                is_block=self.is_block
-            ),
-
-            road=Bunch(
-                type='P',
-                name=self.street_name,
-                direction=self.street_direction if self.street_direction else '',
-                suffix=self.street_type if self.street_type else ''
-            ),
-
-            locality=Bunch(
-                type='P',
-                city=self.city,
-                state=self.state,
-                zip=self.zip,
-                zip4=self.zip4
-
-            ),
-
-            hash=Bunch(
-                hash_string=self.hash_string,
-                hash=self.hash,
-                fuzzy_hash_string=self.fuzzy_hash_string,
-                fuzzy_hash=self.fuzzy_hash,
-
-            ),
-
-            text=str(self)
+        '''Return the parser state as a ParsedAddress '''
+
+        return ParsedAddress(
+            number=int(self.number) if self.number else -1,
+            tnumber=str(self.number),
+            end_number=self.multinumber,
+            fraction=self.fraction,
+            suite=self.suite,
+            is_block=self.is_block,
+
+            name=self.street_name,
+            direction=self.street_direction if self.street_direction else '',
+            suffix=self.street_type if self.street_type else '',
+
+            city=self.city,
+            state=self.state,
+            zip=self.zip,
+            zip4=self.zip4,
+
+            cross_street=self.cross_street.result if self.cross_street else None,
+            state_mismatch=self.state_mismatch
         )
 
     @property
     def hash_string(self):
-
-        import unicodedata
-
-        s = '|'.join([
-            str(self.number),
-            self.multinumber or '.',
-            self.fraction or '.',
-            self.suite or '.',
-            str(self.is_block or '.'),
-            self.street_name or '.',
-            self.street_direction or '.',
-            self.street_type or '.',
-            self.city or '.',
-            self.state or '.',
-            str(self.zip4)
-        ]).lower()
-
-        return unicodedata.normalize('NFC', s)
+        return self.result.hash.hash_string
 
     @property
     def hash(self):
         """A complete hash of the most common parts"""
-        import hashlib
-        m = hashlib.md5()
-
-        m.update(self.hash_string.encode('utf8'))
-
-        return m.hexdigest()
+        return self.result.hash.hash
 
     @property
     def fuzzy_hash_string(self):
         """The fuzzy hash string, before hashing. Useful for computing string distances. """
-        import unicodedata
-        from phonetics import metaphone
-
-        s = '|'.join([
-            str(self.number),
-            self.multinumber or '.',
-            metaphone(self.street_name) if self.street_name else '.',
-            metaphone(self.city) if self.city else '.',
-            metaphone(self.state) if self.state else '.',
-            str(self.zip4) if self.zip4 else '.'
-        ]).lower()
-
-        return unicodedata.normalize('NFC', s)
+        return self.result.hash.fuzzy_hash_string
 
     @property
     def fuzzy_hash(self):
         """A more minimal hash that uses only the number, street name, city, state and zip 4"""
-        import hashlib
-        m = hashlib.md5()
-
-        m.update(self.fuzzy_hash_string.encode('utf8'))
-
-        return m.hexdigest()
+        return self.result.hash.fuzzy_hash
 
 
     def next(self, location=0):
         try:
-            self.ttype, self.toks = self.tokens.pop(location)
+            self.ttype, self.toks = self.tokens.take(location)
+            self.tflags = self.tokens.last_flags
             return int(self.ttype), self.toks
         except StopIteration:
             return Scanner.END, None
 
     def unshift(self, type, token):
         """Put a token back on the front of the token list. """
-        self.tokens = [(type, token)] + self.tokens
+        self.tokens.insert(0, (type, token))
         self.ttype, self.toks = (type, token)
+        self.tflags = self.parser.token_flags(token)
 
     def put(self, pos, type, token):
         """Put a token back at a given  position. """
-        self.tokens = self.tokens[0:pos] + [(type, token)] + self.tokens[pos:]
+        self.tokens.insert(pos, (type, token))
         self.ttype, self.toks = (type, token)
+        self.tflags = self.parser.token_flags(token)
 
     def pop(self):
         """Pop a token from the end, just before the end marker"""
@@ -495,6 +1528,10 @@ class ParserState(object):
         except StopIteration:
             return Scanner.END, None
 
+    def peek_flags(self, location=0):
+        """Return the lexicon flags of a token without removing it"""
+        return self.tokens.flags_at(location)
+
     def has(self, p):
         """Return true if the remainder of the string has the given token.
         p may be a string, rexex or integer.
@@ -508,9 +1545,11 @@ class ParserState(object):
         import re
 
         if isinstance(p, six.string_types):
-            return str(p) in [str(toks) for _, toks in self.tokens]
+            return self.tokens.has_value(str(p))
         elif isinstance(p, int):
-            return p in [type_ for type_, _ in self.tokens]
+            return self.tokens.has_type(p)
+        elif p in self.parser.pattern_bits:
+            return self.tokens.has_bit(self.parser.pattern_bits[p])
         else:
             matches = [str(toks) for _, toks in self.tokens if re.search(p, str(toks))]
             return len(matches) > 0
@@ -521,22 +1560,22 @@ class ParserState(object):
         import re
 
         if isinstance(p, six.string_types):
-            def eq(x):
-                return x[1] == p
+            return self.tokens.find_value(p, reverse)
         elif isinstance(p, int):
-            def eq(x):
-                return x[0] == p
-        else:
-            def eq(x):
-                return re.search(p, str(x[1]))
+            return self.tokens.find_type(p, reverse)
+        elif p in self.parser.pattern_bits:
+            return self.tokens.find_bit(self.parser.pattern_bits[p], reverse)
+
+        def eq(x):
+            return re.search(p, str(x[1]))
 
         if not reverse:
             for i, t in enumerate(self.tokens):
                 if eq(t):
                     return i
         else:
-            for i, t in reversed(list(enumerate(self.tokens))):
-                if eq(t):
+            for i in range(len(self.tokens) - 1, -1, -1):
+                if eq(self.tokens[i]):
                     return i
 
         return False
@@ -553,12 +1592,10 @@ class ParserState(object):
 
     def save(self):
         """Save the current set of remaining tokens, to restore later"""
-        self._saved_tokens.append(list(self.tokens))
+        self.tokens.save()
 
     def restore(self):
-
-        if self._saved_tokens:
-            self.tokens = self._saved_tokens.pop(0)
+        self.tokens.restore()
 
     def rest(self):
         """Generator for the remainder of the tokens"""
@@ -572,145 +1609,296 @@ class ParserState(object):
         """ Return the remaining tokens as a string"""
         return " ".join([str(toks) for _, toks in self.tokens])
 
+    # The stages of parse(), in order. Each returns True if it found what it was looking for.
+    STAGES = ('number', 'fraction', 'block', 'zip', 'state', 'suite', 'city', 'trailing_suite',
+              'street_type', 'direction', 'street')
+
     def parse(self):
-        import re
-        #
-        # Start with the number
-        #
+        stats = self.parser.stage_stats
+
+        if stats is not None:
+            return self._parse_instrumented(stats)
+
+        self.parse_number()
+        self.parse_fraction()
+        self.remove_block()
+        self.parse_zip()
+        self.parse_state()
+        self.parse_suite()
+        self.parse_city()
+        self.parse_trailing_suite()
+        self.parse_street_type()
+        self.parse_direction()
+        self.parse_street()
+
+        return self
+
+    def _parse_instrumented(self, stats):
+        """parse(), recording the time and the result of each stage in a StageStats"""
+        import time
+
+        clock = time.perf_counter
+
+        stages = (self.parse_number, self.parse_fraction, self.remove_block, self.parse_zip,
+                  self.parse_state, self.parse_suite, self.parse_city, self.parse_trailing_suite,
+                  self.parse_street_type, self.parse_direction)
+
+        times = []
+        hits = []
+        branch = None
+
+        try:
+            t0 = clock()
+            for stage in stages:
+                hits.append(bool(stage()))
+                t1 = clock()
+                times.append(t1 - t0)
+                t0 = t1
+
+            branch = self.parse_street()
+            hits.append(True)
+            times.append(clock() - t0)
+        finally:
+            stats.record(times, hits, branch)
+
+        return self
+
+    def parse_number(self):
+        """Start with the number"""
+
+        ttype = self.peek()[0]
 
-        if self.peek()[0] == Scanner.NUMBER:
+        if ttype == Scanner.NUMBER:
             self.number = int(self.next()[1])
 
-        elif self.peek()[0] == Scanner.MULTINUMBER:
+        elif ttype == Scanner.MULTINUMBER:
             self.multinumber = self.next()[1]
 
-        elif self.peek()[0] == Scanner.ALPHANUMBER:
-            matches = re.match(r'(\d+)([a-zA-Z]+)', self.next()[1])
+        elif ttype == Scanner.ALPHANUMBER:
+            matches = _alphanumber_match(self.next()[1])
             self.number = int(matches.group(1))
             self.suite = matches.group(2)
 
-        #
-        # Fractions on the house number
-        #
+        else:
+            return False
+
+        return True
+
+    def parse_fraction(self):
+        """Fractions on the house number"""
 
         if self.peek()[0] == Scanner.FRACTIONNUMBER:
             self.fraction = self.next()[1]
+            return True
 
-        #
-        # Remove "block" if it exists. In the SANDAG crime dataset,
-        # There are many entries with "BLOCK" twice.
-        #
-        while True:
-            t = self.pluck('block')
-            if t:
-                self.is_block = True
-                t = self.pluck('of')
-            else:
-                break
+        return False
+
+    def remove_block(self):
+        """Remove "block" if it exists. In the SANDAG crime dataset,
+        There are many entries with "BLOCK" twice. """
+
+        tokens = self.tokens
 
-        #
-        # Remove a zip, or zip + 4. We've already removed a leading
-        # house number, so we shouldn't get matches for 5 digit house numbers
-        #
+        # The flags have no counts, but they are only set on these words, so the value counts say
+        # whether there is anything to find. Each "block" takes the first "of" with it, so removing every
+        # "block" and as many "of"s, each in one pass, is the same as removing them in pairs.
+        if tokens.has_value('block'):
+            n = tokens.discard(BLOCK)
+            self.is_block = True
+
+            if tokens.has_value('of'):
+                tokens.discard(OF, n)
+
+        return self.is_block
+
+    def parse_zip(self):
+        """Remove a zip, or zip + 4. We've already removed a leading
+        house number, so we shouldn't get matches for 5 digit house numbers """
 
         if self.has(self.parser.zip_regex):
             t = self.pluck(self.parser.zip_regex, reverse=True)
             if t:
                 self.zip = t[1]
+                return True
 
-        #
-        #  Remove a state code, if it is the last
-        #
-        if self.has(self.parser.state_regex):
-            if self.parser.state_regex.match(self.peek(self.LAST)[1]):
-                t = self.pop()
-                self.state = t[1]
+        return False
 
-                if self.peek(self.LAST)[0] == self.parser.scanner.COMMA:
-                    self.pop()
+    def parse_state(self):
+        """Remove a state, if it is the last: an abbreviation, or a full name such as 'new york'. Full names,
+        and abbreviations that are also common words, such as 'or' and 'ct', must follow a comma, or be
+        the state of the zip. """
 
-        #
-        # Extract complex suite codes.
-        #
+        flags = self.peek_flags(self.LAST)
 
-        if self.has(self.parser.scanner.SUITEINTRO):
-            p = self.find(self.parser.scanner.SUITEINTRO)
-            o = []
-            while True:
-                t = self.next(p)
+        if not flags & (STATE | STATE_NAME):
+            return False
 
-                if t[0] not in (Scanner.SUITEINTRO,
-                                Scanner.NUMBER,
-                                Scanner.MULTINUMBER,
-                                Scanner.ALPHANUMBER):
-                    break
+        g = self.parser.grammar
+        n = len(self.tokens) - 1  # Not counting the end marker
+        value = self.tokens[self.LAST][1]
 
+        if flags & STATE_NAME:
+            k, state = g.match_state(self.tokens[j][1] for j in range(self.LAST, self.LAST - n, -1))
 
-                elif t[0] != self.parser.scanner.SUITEINTRO:
-                    o.append(t[1])
+            if not k:
+                return False
+        else:
+            k, state = 1, value
+
+        # A state with nothing before it is more likely the street, unless the zip is in the state
+        if k < n and (state == value and state in g.sure_states
+                      or self.peek(self.LAST - k)[0] == self.parser.scanner.COMMA):
+            pass
+        elif state not in zip_states(self.zip):
+            return False
+
+        for _ in range(k):
+            self.pop()
+
+        self.state = state
+
+        if self.peek(self.LAST)[0] == self.parser.scanner.COMMA:
+            self.pop()
+
+        return True
+
+    def check_state(self):
+        """Fill in a missing state from the zip prefix table, or flag a state that the zip is not in. The
+        state is only filled in for a street address, with a number and a street name; in a PO box,
+        or a number alone, the five digits that were taken for the zip may be something else. """
+
+        states = zip_states(self.zip) if self.zip else ()
+
+        if not states:
+            return
+
+        if not self.state:
+            if self.number and self.street_name and not _po_box_search(self.input):
+                self.state = states[0]
+        else:
+            code = state_code(self.state)
+            self.state_mismatch = code is not None and code not in states
 
-            if t[0] != self.parser.scanner.COMMA:
+    def parse_suite(self):
+        """Extract complex suite codes."""
+
+        if not self.has(self.parser.scanner.SUITEINTRO):
+            return False
+
+        p = self.find(self.parser.scanner.SUITEINTRO)
+        o = []
+        while True:
+            t = self.next(p)
+
+            if t[0] not in (Scanner.SUITEINTRO,
+                            Scanner.NUMBER,
+                            Scanner.MULTINUMBER,
+                            Scanner.ALPHANUMBER):
+                break
+
+            elif t[0] != self.parser.scanner.SUITEINTRO:
+                o.append(t[1])
+
+        if t[0] != self.parser.scanner.COMMA:
+            self.put(p, *t)
+
+        self.suite = ' '.join(reversed(o))
+
+        return True
+
+    def parse_city(self):
+        """Comma delimited strings at the end are usually the city. Without a comma, look for a name from
+        the parser's gazetteer at the end."""
+
+        if not self.has(self.parser.scanner.COMMA):
+            return self.parser.gazetteer is not None and self.match_city()
+
+        p = self.find(self.parser.scanner.COMMA, reverse=True)
+
+        o = []
+        while True:
+            t = self.next(p)
+            if t[0] == self.parser.scanner.END:
                 self.put(p, *t)
+                break
+            elif t[0] != self.parser.scanner.COMMA:
+                o.append(t[1])
 
-            self.suite = ' '.join(reversed(o))
+        self.city = ' '.join(o)
 
-            #
-        # Comma delimited strings at the end are usually the city
-        #
+        return True
 
-        if self.has(self.parser.scanner.COMMA):
-            p = self.find(self.parser.scanner.COMMA, reverse=True)
+    def match_city(self):
+        """Remove the longest city name from the gazetteer that ends the tokens. The name must follow a
+        street type or a direction, with at least one other token before that, so that a street named
+        after a city is not taken for one. """
 
-            o = []
-            while True:
-                t = self.next(p)
-                if t[0] == self.parser.scanner.END:
-                    self.put(p, *t)
-                    break
-                elif t[0] != self.parser.scanner.COMMA:
-                    o.append(t[1])
+        n = len(self.tokens) - 1  # Not counting the end marker
+        tokens = self.tokens
 
-            self.city = ' '.join(o)
+        k, name = self.parser.gazetteer.match(tokens[j][1] for j in range(self.LAST, self.LAST - n, -1))
 
-        # Pull a suite, unit, room identifier off the end.
-        if self.has(self.parser.suite_regex):
+        if not k or n - k < 2 or not self.peek_flags(self.LAST - k) & (STREET_TYPE | DIRECTION):
+            return False
 
-            suite_names = []
+        for _ in range(k):
+            self.pop()
 
+        self.city = name
+
+        return True
+
+    def parse_trailing_suite(self):
+        """Pull a suite, unit, room identifier off the end."""
+
+        if not self.has(self.parser.suite_regex):
+            return False
+
+        suite_names = []
+
+        try:
             while True:
                 r = self.pop()
 
-                if self.parser.suite_regex.match(r[1]):
+                if self.tflags & SUITE_WORD:
                     break
                 else:
                     suite_names.append(r[1])
-            self.suite = ' '.join(reversed(suite_names))
+        except IndexError:
+            # The suite word was taken by an earlier stage, and the tokens ran out
+            self.fail("No suite word before the trailing suite", reason='no_suite_word')
+
+        self.suite = ' '.join(reversed(suite_names))
+
+        return True
 
-        #
-        # See if we have a street type as the last item
-        #
+    def parse_street_type(self):
+        """See if we have a street type as the last item"""
 
         ttype, last_toks = self.peek(self.LAST)
 
-        if last_toks and last_toks.lower() in self.parser.street_types:
+        if self.peek_flags(self.LAST) & STREET_TYPE:
             self.street_type = self.parser.street_types[last_toks.lower()]
             self.pop()
+            return True
+
+        return False
 
-        self.parse_direction()  # N, S, E, W
+    def parse_street(self):
+        """Parse the street name with the first of the street parsers that matches, returning
+        the name of the one that did. The simple street parser takes whatever is left, so it
+        always matches."""
 
         if self.parse_highway():
-            pass
+            return 'highway'
         elif self.parse_numbered_street():
-            pass
-        elif self.parse_simple_street():
-            pass
-        else:
-            self.fail("Couldn't parse the street name")
+            return 'numbered'
 
-        return self
+        self.parse_simple_street()
+
+        return 'simple'
 
     def parse_highway(self):
-        import re
 
         if not self.has(self.parser.highway_regex):
             return False
@@ -722,7 +1910,7 @@ class ParserState(object):
         hwy_word = None
         number = None
         for ttype, toks in self.rest():
-            if not re.match(self.parser.highway_regex, toks):
+            if not self.tflags & HIGHWAY_WORD:
 
                 if ttype == Scanner.NUMBER:
                     number = toks
@@ -738,7 +1926,7 @@ class ParserState(object):
         if number and hwy_word:
             self.street_type = 'highway'
 
-            if re.match(r'^(?:i|interstate)$', hwy_word.strip()):
+            if hwy_word.strip() in ('i', 'interstate'):
                 hwy_word = "interstate"
             else:
                 hwy_word = "highway"
@@ -756,17 +1944,15 @@ class ParserState(object):
         if self.peek(1)[0] == Scanner.END:
             return
 
-        ttype, toks = self.peek()
-        if toks and toks[0] in ('n', 's', 'e', 'w'):
-            if (len(toks) == 1 or toks in ('north', 'south', 'east', 'west', 'ne', 'se', 'nw', 'sw')):
-                if len(toks) == 2:
-                    self.street_direction = toks.upper()
-                else:
-                    self.street_direction = toks[0].upper()
+        if self.peek_flags() & DIRECTION:
+            ttype, toks = self.next()
 
-                self.next()
+            if len(toks) == 2:
+                self.street_direction = toks.upper()
+            else:
+                self.street_direction = toks[0].upper()
 
-                return True
+            return True
 
         return False
 
@@ -783,7 +1969,7 @@ class ParserState(object):
         ordinal = ''
 
         ttype, toks = self.next()
-        if toks in ('st', 'th', 'nd', 'rd'):
+        if self.tflags & ORDINAL:
             ordinal = toks
         else:
             self.unshift(ttype, toks)
@@ -791,7 +1977,7 @@ class ParserState(object):
         self.street_name = (str(number) + ordinal).title()
 
         ttype, toks = self.next()
-        if toks in self.parser.street_types:
+        if self.tflags & STREET_TYPE:
             self.street_type = self.parser.street_types[toks.lower()]
         else:
             self.unshift(ttype, toks)
@@ -810,7 +1996,7 @@ class ParserState(object):
 
             elif t[0] != self.parser.scanner.COMMA:
 
-                if t[1].lower() in self.parser.street_types and i != 0:
+                if self.tflags & STREET_TYPE and i != 0:
                     # i != 0 prevents 'Mission' from being mis interpreted.
                     self.street_type = self.parser.street_types[t[1].lower()]
                     break
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2017 Civic Knowledge. This file is licensed under the terms of the
+# Revised BSD License, included in this distribution as LICENSE
+
+"""
+The US state table, and the table of the states for the three digit prefixes of zip codes. Both are
+built when the module is imported, once per process, and looking up a zip is an index into a tuple.
+
+    zip_states('92101')  # ('ca',)
+    state_code('New York')  # 'ny'
+
+"""
+
+# Abbreviations and full names of the states, the District of Columbia and the territories
+STATE_NAMES = (
+    ('al', 'alabama'), ('ak', 'alaska'), ('az', 'arizona'), ('ar', 'arkansas'), ('ca', 'california'),
+    ('co', 'colorado'), ('ct', 'connecticut'), ('de', 'delaware'), ('fl', 'florida'), ('ga', 'georgia'),
+    ('hi', 'hawaii'), ('id', 'idaho'), ('il', 'illinois'), ('in', 'indiana'), ('ia', 'iowa'),
+    ('ks', 'kansas'), ('ky', 'kentucky'), ('la', 'louisiana'), ('me', 'maine'), ('md', 'maryland'),
+    ('ma', 'massachusetts'), ('mi', 'michigan'), ('mn', 'minnesota'), ('ms', 'mississippi'),
+    ('mo', 'missouri'), ('mt', 'montana'), ('ne', 'nebraska'), ('nv', 'nevada'), ('nh', 'new hampshire'),
+    ('nj', 'new jersey'), ('nm', 'new mexico'), ('ny', 'new york'), ('nc', 'north carolina'),
+    ('nd', 'north dakota'), ('oh', 'ohio'), ('ok', 'oklahoma'), ('or', 'oregon'), ('pa', 'pennsylvania'),
+    ('ri', 'rhode island'), ('sc', 'south carolina'), ('sd', 'south dakota'), ('tn', 'tennessee'),
+    ('tx', 'texas'), ('ut', 'utah'), ('vt', 'vermont'), ('va', 'virginia'), ('wa', 'washington'),
+    ('wv', 'west virginia'), ('wi', 'wisconsin'), ('wy', 'wyoming'),
+    ('dc', 'district of columbia'),
+    ('as', 'american samoa'), ('gu', 'guam'), ('mp', 'northern mariana islands'), ('pr', 'puerto rico'),
+    ('vi', 'virgin islands'), ('fm', 'federated states of micronesia'), ('mh', 'marshall islands'),
+    ('pw', 'palau'),
+)
+
+# Abbreviations that are also common words, so they are taken for a state only with other evidence: a
+# comma before them, or a zip in the state. Abbreviations that are street types, directions or other
+# words of the grammar are treated the same way.
+COMMON_WORDS = frozenset(('al', 'as', 'co', 'de', 'hi', 'id', 'in', 'la', 'ma', 'me', 'mi', 'mo', 'oh', 'ok',
+                          'or', 'pa'))
+
+# The states for each range of three digit zip prefixes, as (first, last, states). The first state is the
+# one for most of the range; the others also have zips in it. Military and unassigned prefixes are left out.
+ZIP3_RANGES = (
+    (5, 5, 'ny'), (6, 7, 'pr'), (8, 8, 'vi'), (9, 9, 'pr'),
+    (10, 27, 'ma'), (28, 29, 'ri'), (30, 38, 'nh'), (39, 49, 'me'), (50, 54, 'vt'), (55, 55, 'ma'),
+    (56, 59, 'vt'), (60, 69, 'ct'), (70, 89, 'nj'),
+    (100, 149, 'ny'), (150, 196, 'pa'), (197, 199, 'de'),
+    (200, 200, 'dc'), (201, 201, 'va'), (202, 205, 'dc'), (206, 219, 'md'), (220, 246, 'va'),
+    (247, 268, 'wv'), (270, 289, 'nc'), (290, 299, 'sc'),
+    (300, 319, 'ga'), (320, 339, 'fl'), (341, 349, 'fl'), (350, 369, 'al'), (370, 385, 'tn'),
+    (386, 397, 'ms'), (398, 399, 'ga'),
+    (400, 427, 'ky'), (430, 459, 'oh'), (460, 479, 'in'), (480, 499, 'mi'),
+    (500, 528, 'ia'), (530, 549, 'wi'), (550, 567, 'mn'), (569, 569, 'dc'), (570, 577, 'sd'),
+    (580, 588, 'nd'), (590, 599, 'mt'),
+    (600, 629, 'il'), (630, 658, 'mo'), (660, 679, 'ks'), (680, 693, 'ne'),
+    (700, 714, 'la'), (716, 729, 'ar'), (730, 731, 'ok'), (733, 733, 'tx'), (734, 749, 'ok'),
+    (750, 799, 'tx'),
+    (800, 816, 'co'), (820, 831, 'wy'), (832, 838, 'id'), (840, 847, 'ut'), (850, 865, 'az'),
+    (870, 884, 'nm'), (885, 885, 'tx'), (889, 898, 'nv'),
+    (900, 961, 'ca'), (967, 968, 'hi as'), (969, 969, 'gu mp pw fm mh'), (970, 979, 'or'),
+    (980, 994, 'wa'), (995, 999, 'ak'),
+)
+
+
+def _zip3_table(ranges=ZIP3_RANGES):
+    '''Expand the ranges into a tuple of the states for each prefix, from 0 to 999'''
+
+    table = [()] * 1000
+
+    for first, last, states in ranges:
+        states = tuple(states.split())
+        for i in range(first, last + 1):
+            table[i] = states
+
+    return tuple(table)
+
+
+ZIP3 = _zip3_table()
+
+# Abbreviations and full names, to abbreviations
+STATE_CODES = dict((name, abbr) for abbr, name in STATE_NAMES)
+STATE_CODES.update((abbr, abbr) for abbr, _ in STATE_NAMES)
+
+
+def zip_states(zip):
+    '''Return the states for the prefix of a zip code, most likely first, or () if the zip is not a US zip
+    code or the prefix is not assigned to a state'''
+
+    z = str(zip)[:5]
+
+    if len(z) != 5 or not z.isdigit():
+        return ()
+
+    return ZIP3[int(z[:3])]
+
+
+def state_code(state):
+    '''Return the abbreviation for a state abbreviation or full name, in any case, or None'''
+
+    return STATE_CODES.get(' '.join(str(state).lower().split()))
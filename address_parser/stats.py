@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2017 Civic Knowledge. This file is licensed under the terms of the
+# Revised BSD License, included in this distribution as LICENSE
+
+"""
+Instrumentation and metrics for parsers.
+"""
+
+import threading
+
+from bisect import bisect_left
+
+
+class StageStats(object):
+    '''Time spent in, and hits for, each stage of ParserState.parse(), aggregated over many parses, plus
+    counts of which street parser won. A stage hits when it finds what it looks for, such as a zip code.
+
+    A Parser built with instrument=True records into one of these, in its stage_stats attribute. '''
+
+    BRANCHES = ('highway', 'numbered', 'simple', 'failed')
+
+    def __init__(self, stages):
+        self.stages = tuple(stages)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.parses = 0
+            self.times = [0.0] * len(self.stages)
+            self.calls = [0] * len(self.stages)
+            self.hits = [0] * len(self.stages)
+            self.branches = dict.fromkeys(self.BRANCHES, 0)
+
+    def record(self, times, hits, branch):
+        '''Add the stage times and hits of one parse. times and hits may be shorter than the list of
+        stages, if the parse failed part way through. '''
+
+        with self._lock:
+            self.parses += 1
+
+            for i, (t, h) in enumerate(zip(times, hits)):
+                self.times[i] += t
+                self.calls[i] += 1
+                self.hits[i] += h
+
+            self.branches[branch or 'failed'] += 1
+
+    @property
+    def stats(self):
+        '''Return the counters as a dict'''
+
+        with self._lock:
+            return dict(
+                parses=self.parses,
+                stages={s: dict(time=t, calls=c, hits=h, mean_us=t / c * 1e6 if c else 0.0)
+                        for s, t, c, h in zip(self.stages, self.times, self.calls, self.hits)},
+                branches=dict(self.branches)
+            )
+
+    def __str__(self):
+        stats = self.stats
+        total = sum(s['time'] for s in stats['stages'].values()) or 1.0
+
+        lines = ['{:16s} {:>9s} {:>9s} {:>9s} {:>6s}'.format('stage', 'calls', 'hits', 'mean us', 'time%')]
+
+        for name in self.stages:
+            s = stats['stages'][name]
+            lines.append('{:16s} {:9d} {:9d} {:9.2f} {:6.1f}'.format(
+                name, s['calls'], s['hits'], s['mean_us'], s['time'] / total * 100))
+
+        lines.append('branches: ' + ', '.join('{}={}'.format(b, stats['branches'][b]) for b in self.BRANCHES))
+
+        return '\n'.join(lines)
+
+
+class Metrics(object):
+    '''Counters and a latency histogram for the parses done by a Parser, cheap enough to leave on in
+    production. A Parser built with metrics=True records into one of these, in its metrics attribute,
+    and several parsers can share one.
+
+    Counters are the number of addresses parsed, parses that failed, by reason, blank inputs, for which
+    the parser returns False, and parses that had a cross street. Failures that raise a ParseError are
+    counted under its reason, and other exceptions under the name of their class. '''
+
+    # Upper bounds of the latency histogram buckets, in seconds
+    BUCKETS = (25e-6, 50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 10e-3, 100e-3)
+
+    def __init__(self, buckets=BUCKETS, cache=None):
+        self.buckets = tuple(buckets)
+        self.cache = cache
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        '''Clear the counters. The cache counters are not changed. '''
+        with self._lock:
+            self.parsed = 0
+            self.empty = 0
+            self.cross_streets = 0
+            self.failed = {}
+            self.latency_counts = [0] * (len(self.buckets) + 1)
+            self.latency_sum = 0.0
+
+    def _observe(self, seconds):
+        self.latency_counts[bisect_left(self.buckets, seconds)] += 1
+        self.latency_sum += seconds
+
+    def observe_parse(self, seconds, cross_street=False):
+        with self._lock:
+            self.parsed += 1
+            if cross_street:
+                self.cross_streets += 1
+            self._observe(seconds)
+
+    def observe_failure(self, e, seconds):
+        reason = getattr(e, 'reason', None) or e.__class__.__name__
+
+        with self._lock:
+            self.failed[reason] = self.failed.get(reason, 0) + 1
+            self._observe(seconds)
+
+    def observe_empty(self):
+        with self._lock:
+            self.empty += 1
+
+    @property
+    def stats(self):
+        '''Return the counters as a dict. The histogram bucket counts are cumulative, as in Prometheus,
+        and keyed by the upper bound of the bucket. '''
+
+        with self._lock:
+            cumulative = []
+            n = 0
+            for c in self.latency_counts:
+                n += c
+                cumulative.append(n)
+
+            d = dict(
+                parsed=self.parsed,
+                failed=dict(self.failed),
+                empty=self.empty,
+                cross_streets=self.cross_streets,
+                latency=dict(
+                    buckets=dict(zip(self.buckets + (float('inf'),), cumulative)),
+                    sum=self.latency_sum,
+                    count=n
+                )
+            )
+
+        if self.cache is not None:
+            d['cache'] = self.cache.stats
+
+        return d
+
+    def prometheus(self, prefix='address_parser'):
+        '''Return the metrics in the Prometheus text exposition format'''
+
+        s = self.stats
+        lines = []
+
+        def metric(name, kind, help, samples):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+            for suffix, labels, value in samples:
+                label_str = '{' + ','.join('{}="{}"'.format(k, v) for k, v in labels) + '}' if labels else ''
+                lines.append('{}_{}{}{} {}'.format(prefix, name, suffix, label_str, value))
+
+        metric('parsed_total', 'counter', 'Addresses parsed', [('', (), s['parsed'])])
+        metric('failed_total', 'counter', 'Addresses that failed to parse, by reason',
+               [('', (('reason', r),), n) for r, n in sorted(s['failed'].items())])
+        metric('empty_total', 'counter', 'Blank inputs', [('', (), s['empty'])])
+        metric('cross_street_total', 'counter', 'Addresses parsed with a cross street',
+               [('', (), s['cross_streets'])])
+
+        lat = s['latency']
+        metric('parse_seconds', 'histogram', 'Time to parse an address',
+               [('_bucket', (('le', '+Inf' if b == float('inf') else repr(b)),), n)
+                for b, n in sorted(lat['buckets'].items())] +
+               [('_sum', (), lat['sum']), ('_count', (), lat['count'])])
+
+        if 'cache' in s:
+            c = s['cache']
+            metric('cache_hits_total', 'counter', 'Parse cache hits', [('', (), c['hits'])])
+            metric('cache_misses_total', 'counter', 'Parse cache misses', [('', (), c['misses'])])
+            metric('cache_evictions_total', 'counter', 'Parse cache evictions', [('', (), c['evictions'])])
+            metric('cache_size', 'gauge', 'Entries in the parse cache', [('', (), c['size'])])
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Event loop lag while a corpus is parsed from a coroutine: directly on the loop with Parser.parse(), and with
+AsyncParser in a thread or in worker processes. A ticker task sleeps for 1ms at a time, and the lag is how
+late it wakes up.
+
+    python benchmarks/bench_async.py
+
+"""
+
+from __future__ import print_function
+
+import asyncio
+import os
+import time
+
+from address_parser import Parser
+from address_parser.aio import AsyncParser
+
+CORPUS = os.path.join(os.path.dirname(__file__), '..', 'tests', 'support', 'test_geocoder_addresses.txt')
+
+
+async def ticker(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(0.001)
+        lags.append(loop.time() - t0 - 0.001)
+
+
+async def on_loop(lines, payload=500):
+    """Parse payloads of addresses on the loop, yielding only between payloads, as a request
+    handler would"""
+    parser = Parser()
+    for i in range(0, len(lines), payload):
+        for line in lines[i:i + payload]:
+            try:
+                parser.parse(line)
+            except Exception:
+                pass
+        await asyncio.sleep(0)
+
+
+def with_async_parser(executor):
+    async def run(lines):
+        async with AsyncParser(executor=executor) as parser:
+            async for _ in parser.parse_stream(lines):
+                pass
+    return run
+
+
+async def measure(f, lines):
+    lags = []
+    stop = asyncio.Event()
+    tick = asyncio.ensure_future(ticker(lags, stop))
+
+    t0 = time.time()
+    await f(lines)
+    dt = time.time() - t0
+
+    stop.set()
+    await tick
+
+    lags.sort()
+    p50 = lags[len(lags) // 2] if lags else 0
+    p99 = lags[int(len(lags) * 0.99)] if lags else 0
+
+    return len(lines) / dt, p50 * 1e3, p99 * 1e3
+
+
+def main():
+    with open(CORPUS) as f:
+        lines = f.read().splitlines()
+
+    for name, f in (('on the loop', on_loop),
+                    ('thread', with_async_parser('thread')),
+                    ('process', with_async_parser('process'))):
+        rate, p50, p99 = asyncio.run(measure(f, lines))
+        print("{:12s} {:8.0f} lines/sec   loop lag p50 {:6.2f}ms  p99 {:6.2f}ms".format(name, rate, p50, p99))
+
+
+if __name__ == '__main__':
+    main()
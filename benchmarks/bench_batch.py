@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+parse_batch() against parse_many() on a repetitive feed, made by sampling the crime corpus with replacement.
+
+    python benchmarks/bench_batch.py
+
+"""
+
+from __future__ import print_function
+
+import os
+import random
+import time
+
+from address_parser import Parser
+
+CORPUS = os.path.join(os.path.dirname(__file__), '..', 'tests', 'support', 'crime_addresses.txt')
+
+
+def main(rows=50000):
+    parser = Parser()
+
+    with open(CORPUS) as f:
+        lines = f.read().splitlines()
+
+    random.seed(0)
+    feed = [random.choice(lines) for _ in range(rows)]
+
+    t0 = time.time()
+    for _ in parser.parse_many(feed):
+        pass
+    dt = time.time() - t0
+    print("parse_many   {:8d} rows {:10.0f} rows/sec".format(rows, rows / dt))
+
+    batch = parser.parse_batch(feed)
+    stats = batch.stats
+    print("parse_batch  {:8d} rows {:10.0f} rows/sec".format(rows, rows / stats['elapsed']))
+    print("  {unique} unique, dedupe ratio {dedupe_ratio:.3f}, "
+          "estimated {time_saved:.2f}s saved".format(**stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Parser.parse_file() compared with parsing the lines of open(path), and its peak memory as the file grows,
+which should stay flat.
+
+    python benchmarks/bench_file.py [workers]
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from address_parser import Parser
+
+SUPPORT = os.path.join(os.path.dirname(__file__), '..', 'tests', 'support')
+
+
+def make_file(path, copies):
+    with open(os.path.join(SUPPORT, 'test_geocoder_addresses.txt'), 'rb') as f:
+        data = f.read()
+
+    with open(path, 'wb') as f:
+        for _ in range(copies):
+            f.write(data)
+
+
+def consume(records):
+    n = 0
+    for r in records:
+        n += 1
+    return n
+
+
+def main(workers=1):
+    parser = Parser()
+    d = tempfile.mkdtemp()
+
+    try:
+        for copies in (2, 8, 32):
+            path = os.path.join(d, 'addresses.txt')
+            make_file(path, copies)
+            size = os.path.getsize(path)
+
+            t0 = time.time()
+            with open(path) as f:
+                n = consume(parser.parse_many(line.rstrip('\n') for line in f))
+            t_open = time.time() - t0
+
+            t0 = time.time()
+            n_file = consume(parser.parse_file(path, workers=workers))
+            t_file = time.time() - t0
+
+            assert n == n_file
+
+            tracemalloc.start()
+            consume(parser.parse_file(path, workers=workers))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            print("{:6.1f}MB {:7d} lines  open() {:8.0f} lines/s  parse_file {:8.0f} lines/s  peak {:6.1f}MB".format(
+                size / 1e6, n, n / t_open, n / t_file, peak / 1e6))
+    finally:
+        for f in os.listdir(d):
+            os.remove(os.path.join(d, f))
+        os.rmdir(d)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Per-parse latency when only the street name is read, and when the text and all of the hashes are read too.
+
+    python benchmarks/bench_lazy.py
+
+"""
+
+from __future__ import print_function
+
+import os
+import time
+
+from address_parser import Parser
+
+CORPUS = os.path.join(os.path.dirname(__file__), '..', 'tests', 'support', 'test_geocoder_addresses.txt')
+
+
+def street_only(r):
+    return r.road.name
+
+
+def everything(r):
+    h = r.hash
+    return r.road.name, r.text, h.hash_string, h.hash, h.fuzzy_hash_string, h.fuzzy_hash
+
+
+def main(repeat=5):
+    parser = Parser()
+
+    with open(CORPUS) as f:
+        lines = f.read().splitlines()
+
+    for name, f in (('street name', street_only), ('text + hashes', everything)):
+        best = None
+        for _ in range(repeat):
+            t0 = time.time()
+            for line in lines:
+                f(parser.parse(line))
+            dt = time.time() - t0
+            best = dt if best is None else min(best, dt)
+
+        print("{:14s} {:8.1f} us/parse".format(name, best / len(lines) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
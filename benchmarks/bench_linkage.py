@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Record linkage time and comparisons as the number of records grows. The right side is a copy of the
+left side with typos in the street names and some zips dropped, so every right record has a true match.
+The time per record should stay roughly flat, and recall near 1.
+
+    python benchmarks/bench_linkage.py
+
+"""
+
+from __future__ import print_function
+
+import random
+import time
+
+from address_parser import Parser
+from address_parser.linkage import BlockIndex
+
+SYLLABLES = ['ca', 'mi', 'no', 'del', 'mar', 'vis', 'ta', 'ro', 'sa', 'lin', 'co', 'ver', 'ga', 'pal', 'om']
+SUFFIXES = ['st', 'ave', 'dr', 'blvd', 'way', 'ct', 'rd', 'ln', 'pl']
+
+
+def synthetic(n, seed=0):
+    rnd = random.Random(seed)
+    streets = [''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 3))) for _ in range(max(50, n // 20))]
+
+    return ['{} {} {}, san diego, ca {}'.format(rnd.randint(1, 9999), rnd.choice(streets), rnd.choice(SUFFIXES),
+                                                rnd.randint(92101, 92199))
+            for _ in range(n)]
+
+
+def perturb(line, rnd):
+    number, street, rest = line.split(' ', 2)
+
+    i = rnd.randrange(len(street) - 1)
+    street = street[:i] + street[i + 1] + street[i] + street[i + 2:]
+
+    if rnd.random() < 0.3:
+        rest = rest.rsplit(' ', 1)[0]
+
+    return ' '.join((number, street, rest))
+
+
+def main():
+    parser = Parser()
+    rnd = random.Random(1)
+
+    for n in (5000, 10000, 20000, 40000):
+        left = synthetic(n)
+        right = [perturb(l, rnd) for l in left]
+
+        left_records = list(parser.parse_many(left))
+        right_records = list(parser.parse_many(right))
+
+        t0 = time.time()
+        index = BlockIndex()
+        index.add_records(left_records)
+        t1 = time.time()
+        best = {}
+        for c in index.match(right_records, threshold=0.7, top=1):
+            best[c.right] = c.left
+        t2 = time.time()
+
+        recall = sum(1 for r, l in best.items() if r == l) / float(n)
+        s = index.stats
+
+        print("n={:6d} index {:6.2f}s match {:6.2f}s {:6.1f} us/record  compared {:9d} avoided {:.5f}  "
+              "recall {:.3f}".format(n, t1 - t0, t2 - t1, (t2 - t0) / n * 1e6, s['compared'],
+                                     s['reduction_ratio'], recall))
+
+
+if __name__ == '__main__':
+    main()
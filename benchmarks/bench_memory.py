@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Bytes per parse result held in memory, for ParsedAddress and for the nested TopBunch / Bunch
+structure that parsers used to return.
+
+    python benchmarks/bench_memory.py
+
+"""
+
+from __future__ import print_function
+
+import os
+import tracemalloc
+
+from address_parser import Parser, Bunch, TopBunch
+
+CORPUS = os.path.join(os.path.dirname(__file__), '..', 'tests', 'support', 'test_geocoder_addresses.txt')
+
+
+def as_bunch(r):
+    """Build the TopBunch that older versions returned for a result"""
+    return TopBunch(**{k: (Bunch(**v) if isinstance(v, dict) else v) for k, v in r.dict.items()})
+
+
+def measure(results, f):
+    """Return the bytes allocated per object when f is applied to each of results"""
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = [f(r) for r in results]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (after - before) / float(len(held))
+
+
+def main():
+    parser = Parser()
+
+    with open(CORPUS) as f:
+        results = [r.result for r in parser.parse_many(f) if r.ok]
+
+    # Both measurements share the field values with the results, so only the containers are counted
+    print("TopBunch      {:8.0f} bytes/result".format(measure(results, as_bunch)))
+    print("ParsedAddress {:8.0f} bytes/result".format(measure(results, lambda r: r.copy())))
+
+
+if __name__ == '__main__':
+    main()
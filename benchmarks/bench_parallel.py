@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Scaling of Parser.parse_parallel() with the number of worker processes, on the crime and geocoder corpora.
+
+    python benchmarks/bench_parallel.py [max_workers]
+
+"""
+
+from __future__ import print_function
+
+import multiprocessing
+import os
+import sys
+import time
+
+from address_parser import Parser
+
+SUPPORT = os.path.join(os.path.dirname(__file__), '..', 'tests', 'support')
+
+
+def main(max_workers=None, copies=10):
+    parser = Parser()
+
+    lines = []
+    for name in ('crime_addresses', 'test_geocoder_addresses'):
+        with open(os.path.join(SUPPORT, name + '.txt')) as f:
+            lines.extend(f.read().splitlines())
+
+    lines = lines * copies
+
+    max_workers = max_workers or multiprocessing.cpu_count()
+
+    base = None
+    workers = 1
+    while workers <= max_workers:
+        t0 = time.time()
+        for _ in parser.parse_parallel(lines, workers=workers, chunksize=1000):
+            pass
+        rate = len(lines) / (time.time() - t0)
+        base = base or rate
+
+        print("workers={:3d} {:10.0f} lines/sec speedup={:5.2f}".format(workers, rate, rate / base))
+
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of Parser.parse_many() against a loop over Parser.parse(), on the geocoder test corpus.
+
+    python benchmarks/bench_parse_many.py
+
+"""
+
+from __future__ import print_function
+
+import os
+import time
+
+from address_parser import Parser
+
+CORPUS = os.path.join(os.path.dirname(__file__), '..', 'tests', 'support', 'test_geocoder_addresses.txt')
+
+
+def parse_loop(parser, lines):
+    n = 0
+    for line in lines:
+        try:
+            if parser.parse(line):
+                n += 1
+        except Exception:
+            pass
+    return n
+
+
+def parse_many(parser, lines):
+    return sum(1 for r in parser.parse_many(lines) if r.ok)
+
+
+def main(repeat=5):
+    parser = Parser()
+
+    with open(CORPUS) as f:
+        lines = f.read().splitlines()
+
+    for name, f in (('parse loop', parse_loop), ('parse_many', parse_many)):
+        best = None
+        for _ in range(repeat):
+            t0 = time.time()
+            f(parser, lines)
+            dt = time.time() - t0
+            best = dt if best is None else min(best, dt)
+
+        print("{:12s} {:8d} lines {:10.0f} lines/sec".format(name, len(lines), len(lines) / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Parse time as the number of tokens in the input grows. The per-token time should stay roughly flat.
+
+    python benchmarks/bench_scaling.py
+
+"""
+
+from __future__ import print_function
+
+import time
+
+from address_parser import Parser
+
+STREET_WORDS = ['del', 'mar', 'vista', 'camino', 'real', 'de', 'la', 'cruz', '12', 'b']
+
+# Every 'block' and 'of' is removed from the middle of the tokens, so these exercise the tombstones
+BLOCK_WORDS = ['del', 'mar', 'vista', 'suite', '12', 'b', 'block', 'of', 'camino', 'real']
+
+
+def synthetic(n, words=STREET_WORDS):
+    """An address line with about n tokens, mostly in the street name"""
+    words = (words * (n // len(words) + 1))[:n]
+    return "100 N " + " ".join(words) + " street, san diego, ca 92101"
+
+
+def main(repeat=3):
+    parser = Parser()
+
+    for name, words in (('street', STREET_WORDS), ('block', BLOCK_WORDS)):
+        for n in (10, 100, 1000, 5000, 20000):
+            line = synthetic(n, words)
+            best = None
+            for _ in range(repeat):
+                t0 = time.time()
+                parser.parse(line)
+                dt = time.time() - t0
+                best = dt if best is None else min(best, dt)
+
+            print("{:6s} tokens={:6d} {:10.2f} ms {:8.2f} us/token".format(name, n, best * 1e3, best / n * 1e6))
+
+
+if __name__ == '__main__':
+    main()
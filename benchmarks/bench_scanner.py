@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Tokens per second for Scanner, which uses re.Scanner, and FastScanner, on all of the test corpora.
+
+    python benchmarks/bench_scanner.py
+
+"""
+
+from __future__ import print_function
+
+import glob
+import os
+import time
+
+from address_parser import Parser, Scanner, FastScanner
+
+SUPPORT = os.path.join(os.path.dirname(__file__), '..', 'tests', 'support')
+
+
+def main(repeat=5):
+    parser = Parser()
+
+    lines = []
+    for fn in sorted(glob.glob(os.path.join(SUPPORT, '*.txt'))):
+        with open(fn) as f:
+            lines.extend(f.read().splitlines())
+
+    for cls in (Scanner, FastScanner):
+        scanner = cls(parser)
+        best = None
+        for _ in range(repeat):
+            t0 = time.time()
+            n = sum(len(scanner.scan(line)[0]) for line in lines)
+            dt = time.time() - t0
+            best = dt if best is None else min(best, dt)
+
+        print("{:12s} {:8d} tokens {:10.0f} tokens/sec".format(cls.__name__, n, n / best))
+
+
+if __name__ == '__main__':
+    main()
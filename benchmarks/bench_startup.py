@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Import time of the package, and the time to construct the first and later Parsers, each measured in a
+fresh interpreter.
+
+    python benchmarks/bench_startup.py
+
+"""
+
+from __future__ import print_function
+
+import subprocess
+import sys
+
+SCRIPT = """
+import time
+t0 = time.time()
+import address_parser
+t1 = time.time()
+address_parser.Parser()
+t2 = time.time()
+for _ in range(100):
+    address_parser.Parser()
+t3 = time.time()
+print((t1 - t0) * 1e3, (t2 - t1) * 1e3, (t3 - t2) * 1e3 / 100)
+"""
+
+
+def main(repeat=10):
+    runs = [[float(v) for v in subprocess.check_output([sys.executable, '-c', SCRIPT]).split()]
+            for _ in range(repeat)]
+
+    imp, first, later = (min(col) for col in zip(*runs))
+
+    print("import        {:8.2f} ms".format(imp))
+    print("first Parser  {:8.2f} ms".format(first))
+    print("later Parser  {:8.3f} ms".format(later))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of Parser.parse_threaded() as the number of threads grows, on the geocoder test corpus. On an
+interpreter with the GIL, the rate stays about flat; on a free-threaded build, such as python3.13t, it
+should grow with the number of cores.
+
+    python benchmarks/bench_threads.py
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from address_parser import Parser
+
+CORPUS = os.path.join(os.path.dirname(__file__), '..', 'tests', 'support', 'test_geocoder_addresses.txt')
+
+
+def main(repeat=3, copies=4):
+    parser = Parser()
+
+    with open(CORPUS) as f:
+        lines = f.read().splitlines() * copies
+
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print("Python {}, GIL {}, {} CPUs".format(sys.version.split()[0], 'enabled' if gil else 'disabled',
+                                              os.cpu_count()))
+
+    for workers in (1, 2, 4, 8):
+        best = None
+        for _ in range(repeat):
+            t0 = time.time()
+            for _ in parser.parse_threaded(lines, workers=workers):
+                pass
+            dt = time.time() - t0
+            best = dt if best is None else min(best, dt)
+
+        print("threads={:2d} {:8d} lines {:10.0f} lines/sec".format(workers, len(lines), len(lines) / best))
+
+
+if __name__ == '__main__':
+    main()
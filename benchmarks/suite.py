@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+The benchmark suite. Runs Parser.parse() and the layers under it, Scanner.scan(), ParserState.parse(),
+ParserState.result and the hashes, over the bundled corpora and over synthetic long and pathological
+inputs, and reports, for each case:
+
+    throughput      operations per second, the best of several runs
+    p50, p99        latency of a single operation, in microseconds
+    peak            peak traced memory of a single operation, in bytes, the mean over the inputs
+    allocs          memory blocks allocated per operation, from tracemalloc snapshots before and after a
+                    batch with the results held; blocks freed before the batch ends are not in them
+    retained        memory blocks per operation still allocated after the results are released, such
+                    as cache entries
+
+Results can be saved as JSON, and compared with a saved baseline, such as one from main:
+
+    git checkout main && python benchmarks/suite.py --save /tmp/main.json
+    git checkout my-branch && python benchmarks/suite.py --compare /tmp/main.json
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from address_parser import Parser
+from address_parser.parser import ParserState
+
+SUPPORT = os.path.join(os.path.dirname(__file__), '..', 'tests', 'support')
+
+CORPORA = ('crime_addresses', 'test_geocoder_addresses', 'bad_license_addresses')
+
+LAYERS = ('scan', 'state', 'result', 'hash', 'fuzzy_hash', 'parse')
+
+
+def load_corpus(name):
+    with open(os.path.join(SUPPORT, name + '.txt')) as f:
+        return [line for line in f.read().splitlines() if line.strip()]
+
+
+def synthetic_long(n=200, words=60, seed=0):
+    """Addresses with long runs of street name words"""
+    rnd = random.Random(seed)
+    vocab = ['grand', 'mission', 'valley', 'el', 'camino', 'real', 'old', 'town', 'la', 'jolla', 'del', 'mar']
+
+    return ['{} {} ave, san diego, ca 92101'.format(rnd.randint(1, 9999),
+                                                    ' '.join(rnd.choice(vocab) for _ in range(words)))
+            for _ in range(n)]
+
+
+def synthetic_pathological(n=200, seed=0):
+    """Inputs that exercise the slow paths: repeated 'block' words, many commas, many suites
+    and numbers, and tokens that the scanner can't classify"""
+    rnd = random.Random(seed)
+
+    makers = [
+        lambda: '100 ' + 'block ' * rnd.randint(10, 40) + 'acacia avenue, carlsbad ca',
+        lambda: '100 main st' + ', x' * rnd.randint(10, 40) + ', ca 92101',
+        lambda: '100 main st ' + ' '.join('ste {}'.format(i) for i in range(rnd.randint(5, 20))),
+        lambda: ' '.join(str(rnd.randint(1, 99999)) for _ in range(rnd.randint(10, 50))),
+        lambda: '100 ' + ' '.join('{}$%^'.format(i) for i in range(rnd.randint(10, 40))) + ' st',
+    ]
+
+    return [rnd.choice(makers)() for _ in range(n)]
+
+
+def inputs():
+    d = {name: load_corpus(name) for name in CORPORA}
+    d['synthetic_long'] = synthetic_long()
+    d['synthetic_pathological'] = synthetic_pathological()
+    return d
+
+
+def _states(parser, lines):
+    """Parsed states for the lines that don't raise"""
+    states = []
+    for line in lines:
+        try:
+            states.append(ParserState(parser, line).parse())
+        except Exception:
+            pass
+    return states
+
+
+def _ok(f):
+    def g(x):
+        try:
+            return f(x)
+        except Exception:
+            return None
+    return g
+
+
+def operations(parser, lines):
+    """Return, for each layer, a function that prepares a list of fresh arguments and the operation
+    to apply to each. The preparation is not timed. """
+
+    states = _states(parser, lines)
+    scan = parser.scanner.scan
+
+    return dict(
+        scan=(lambda: lines, scan),
+        state=(lambda: lines, _ok(lambda line: ParserState(parser, line).parse())),
+        result=(lambda: states, lambda ps: ps.result),
+        # Hashes are cached on the result, so each run gets new results
+        hash=(lambda: [ps.result for ps in states], lambda r: r.hash.hash),
+        fuzzy_hash=(lambda: [ps.result for ps in states], lambda r: r.hash.fuzzy_hash),
+        parse=(lambda: lines, _ok(parser.parse)),
+    )
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def measure(prepare, op, repeat):
+    """Run one case, returning a dict of its measurements"""
+
+    # Throughput, the best of repeat runs of a plain loop
+    best = None
+    for _ in range(repeat):
+        args = prepare()
+        gc.collect()
+        t0 = time.perf_counter()
+        for a in args:
+            op(a)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+
+    # Latency of each operation
+    args = prepare()
+    latencies = []
+    clock = time.perf_counter
+    for a in args:
+        t0 = clock()
+        op(a)
+        latencies.append(clock() - t0)
+    latencies.sort()
+
+    # Memory. Tracing is slow, so this is a separate pass.
+    args = prepare()
+    peak_total = 0
+    tracemalloc.start()
+    for a in args:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        op(a)
+        peak_total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    # Allocations, from snapshots before and after a batch. The results are held, so the blocks they
+    # allocate are still in the second snapshot, and tracemalloc's own blocks are not traced.
+    args = prepare()
+    held = [None] * len(args)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i, a in enumerate(args):
+        held[i] = op(a)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocs = sum(s.count_diff for s in after.compare_to(before, 'traceback') if s.count_diff > 0)
+
+    # Retained blocks, without tracing, which adds its own blocks
+    del held
+    args = prepare()
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    for a in args:
+        op(a)
+    gc.collect()
+    retained = sys.getallocatedblocks() - blocks_before
+
+    n = len(args)
+
+    return dict(
+        n=n,
+        ops_per_sec=n / best if best else 0.0,
+        p50_us=percentile(latencies, 50) * 1e6,
+        p99_us=percentile(latencies, 99) * 1e6,
+        peak_bytes=float(peak_total) / n if n else 0.0,
+        allocs=float(allocs) / n if n else 0.0,
+        retained=float(retained) / n if n else 0.0,
+    )
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except Exception:
+        return None
+
+
+def run(repeat=3, select=None):
+    parser = Parser()
+
+    cases = {}
+
+    for corpus, lines in sorted(inputs().items()):
+        ops = operations(parser, lines)
+        for layer in LAYERS:
+            name = '{}/{}'.format(layer, corpus)
+            if select and select not in name:
+                continue
+            cases[name] = measure(*ops[layer], repeat=repeat)
+            print_case(name, cases[name])
+
+    return dict(
+        meta=dict(commit=_git_commit(), python=platform.python_version(), platform=platform.platform(),
+                  time=time.strftime('%Y-%m-%dT%H:%M:%S')),
+        cases=cases
+    )
+
+
+def print_case(name, c, base=None):
+    line = ("{:40s} {:10.0f}/s  p50 {:8.1f}us  p99 {:8.1f}us  peak {:8.0f}B  allocs {:6.1f}  "
+            "retained {:6.1f}").format(
+        name, c['ops_per_sec'], c['p50_us'], c['p99_us'], c['peak_bytes'], c['allocs'], c['retained'])
+
+    if base:
+        line += "  {:+6.1f}%".format(change(base, c))
+
+    print(line)
+
+
+def change(base, c):
+    """Percent change in throughput from a baseline case"""
+    return (c['ops_per_sec'] / base['ops_per_sec'] - 1) * 100 if base['ops_per_sec'] else 0.0
+
+
+def compare(baseline, results, threshold):
+    """Print the throughput changes from a baseline, returning the names of the cases that are slower
+    by more than threshold percent"""
+
+    print()
+    print("Compared with {} ({})".format(baseline['meta'].get('commit'), baseline['meta'].get('time')))
+
+    slower = []
+
+    for name, c in sorted(results['cases'].items()):
+        base = baseline['cases'].get(name)
+        if not base:
+            continue
+        print_case(name, c, base)
+        if change(base, c) < -threshold:
+            slower.append(name)
+
+    return slower
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('-k', '--select', help='Only run the cases with names that contain this string')
+    ap.add_argument('-r', '--repeat', type=int, default=3, help='Throughput runs per case')
+    ap.add_argument('--save', help='Save the results to this JSON file')
+    ap.add_argument('--compare', help='Compare with the results in this JSON file')
+    ap.add_argument('--threshold', type=float, default=10.0,
+                    help='With --compare, exit with an error if any case is slower by more than this percent')
+    args = ap.parse_args(argv)
+
+    results = run(args.repeat, args.select)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(json.load(f), results, args.threshold)
+
+        if slower:
+            print("Slower than the baseline: " + ', '.join(slower))
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -49,6 +49,14 @@ setup(
     packages=packages,
     package_data=package_data,
     install_requires=requires,
+    extras_require={
+        'pandas': ['pandas'],
+    },
+    entry_points={
+        'console_scripts': [
+            'address-parser=address_parser.cli:main',
+        ],
+    },
     author='Eric Busboom',
     author_email='eric@sandiegodata.org',
     url='https://github.com/CivicKnowledge/address_parser',
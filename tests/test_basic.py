@@ -6,7 +6,7 @@ Created on Jan 17, 2013
 """
 
 from __future__ import print_function
-from address_parser import Parser
+from address_parser import Parser, ParseError
 
 import unittest
 
@@ -215,6 +215,1022 @@ class TestBase(unittest.TestCase):
 
         pprint(r.dict)
 
+    def test_parse_many(self):
+
+        parser = Parser()
+
+        lines = list(self.addresses.keys()) + ['', '   ', None, '100 main street']
+
+        records = list(parser.parse_many(lines, zip=['92101'] * len(lines)))
+
+        self.assertEqual(len(lines), len(records))
+        self.assertEqual(list(range(len(lines))), [r.index for r in records])
+
+        for line, r in zip(self.addresses.keys(), records):
+            self.assertTrue(r.ok)
+            self.assertEqual(str(parser.parse(line, zip='92101')), str(r.result))
+
+        self.assertIs(False, records[-4].result)
+        self.assertIs(False, records[-3].result)
+        self.assertIsInstance(records[-2].error, AttributeError)
+        self.assertEqual('92101', records[-1].result.locality.zip)
+
+        # Columns must have a value for each address
+        with self.assertRaisesRegex(ValueError, 'zip has fewer'):
+            list(parser.parse_many(lines, zip=['92101'] * (len(lines) - 1)))
+
+        with self.assertRaisesRegex(ValueError, 'city has more'):
+            list(parser.parse_many(lines[:2], city=iter(['a', 'b', 'c'])))
+
+        with self.assertRaisesRegex(ValueError, 'state has fewer'):
+            parser.parse_batch(lines, state=['ca'])
+
+        with self.assertRaises(ValueError):
+            list(parser.parse_parallel(lines, zip=['92101'], workers=2))
+
+    def test_parse_parallel(self):
+        import os
+        import pickle
+
+        parser = Parser()
+
+        with open(os.path.join(os.path.dirname(__file__), 'support', 'crime_addresses.txt')) as f:
+            lines = f.read().splitlines()
+
+        serial = list(parser.parse_many(lines))
+        parallel = list(parser.parse_parallel(lines, workers=2, chunksize=37))
+
+        self.assertEqual([r.index for r in serial], [r.index for r in parallel])
+        self.assertEqual([str(r.result) for r in serial], [str(r.result) for r in parallel])
+        self.assertEqual([type(r.error) for r in serial], [type(r.error) for r in parallel])
+
+        self.assertIsInstance(pickle.loads(pickle.dumps(parser)), Parser)
+
+    def test_cli(self):
+        import os
+        import io
+        import csv
+        import json
+        import shutil
+        import tempfile
+        from contextlib import redirect_stderr
+        from address_parser.cli import main
+
+        d = tempfile.mkdtemp()
+
+        try:
+            inp, out, err = (os.path.join(d, f) for f in ('in.csv', 'out.jsonl', 'errors.csv'))
+
+            with open(inp, 'w', newline='') as f:
+                w = csv.writer(f)
+                w.writerow(['id', 'street', 'zip'])
+                w.writerow([1, '1900 Grand Avenue, CHULA VISTA, CA', '91913'])
+                w.writerow([2, '   ', ''])
+                w.writerow([3, '400 F Street , CHULA VISTA, CA 91910', ''])
+                w.writerow([4, '500 H Street,\r\nCHULA VISTA', ''])
+
+            self.assertEqual(0, main([inp, '-c', 'street', '--zip-col', 'zip', '-o', out, '-e', err, '-q']))
+
+            with open(out) as f:
+                rows = [json.loads(line) for line in f]
+
+            self.assertEqual([0, 2, 3], [r['index'] for r in rows])
+            self.assertEqual(['Grand', 'F', 'H'], [r['name'] for r in rows])
+            self.assertEqual(['91913', '91910', 'None'], [str(r['zip']) for r in rows])
+            self.assertEqual(['91913', '91910', None], [r['zip4'] for r in rows])
+            # A line break inside a quoted field is kept as it is
+            self.assertEqual('500 H Street,\r\nCHULA VISTA', rows[2]['input'])
+            self.assertEqual(Parser().parse('1900 Grand Avenue, CHULA VISTA, CA', zip='91913').hash.hash,
+                             rows[0]['hash'])
+
+            with open(err) as f:
+                errors = list(csv.DictReader(f))
+
+            self.assertEqual(['1'], [r['index'] for r in errors])
+
+            # A missing column is a usage error, not a traceback, and is found before any output is written
+            os.remove(out)
+            for args in (['-c', 'address'], ['-c', 'street', '--zip-col', 'postcode']):
+                with redirect_stderr(io.StringIO()) as stderr:
+                    with self.assertRaises(SystemExit) as cm:
+                        main([inp, '-o', out, '-q'] + args)
+
+                self.assertEqual(2, cm.exception.code)
+                self.assertIn('column', stderr.getvalue())
+                self.assertFalse(os.path.exists(out))
+
+            # JSON lines rows that can't be read are errors, in their place in the input
+            inp = os.path.join(d, 'in.jsonl')
+            with open(inp, 'w') as f:
+                f.write('{"address": "1900 Grand Avenue, CHULA VISTA, CA"}\n{"address": \n[1]\n\n'
+                        '{"street": "400 F Street"}\n{"address": "400 F Street , CHULA VISTA, CA 91910"}\n"x"\n')
+
+            self.assertEqual(0, main([inp, '-o', out, '-e', err, '-q']))
+
+            with open(out) as f:
+                rows = [json.loads(line) for line in f]
+
+            with open(err) as f:
+                errors = list(csv.DictReader(f))
+
+            self.assertEqual([0, 4], [r['index'] for r in rows])
+            self.assertEqual(['Grand', 'F'], [r['name'] for r in rows])
+            self.assertEqual(['1', '2', '3', '5'], [r['index'] for r in errors])
+            self.assertEqual(['{"address": ', '[1]', '{"street": "400 F Street"}', '"x"'], [r['input'] for r in errors])
+            self.assertTrue(errors[0]['error'].startswith('Invalid JSON'))
+            self.assertEqual('Not a JSON object', errors[1]['error'])
+        finally:
+            shutil.rmtree(d)
+
+    def test_parse_file(self):
+        import os
+        import shutil
+        import tempfile
+
+        parser = Parser()
+
+        with open(os.path.join(os.path.dirname(__file__), 'support', 'crime_addresses.txt')) as f:
+            lines = f.read().splitlines()[:200]
+
+        # Windows line endings, a blank line, a non-ASCII line and no newline at the end
+        lines += ['', u'100 caf\xe9 st, san diego', 'unit @ apt', '3120 de la cruz boulevard']
+        data = '\r\n'.join(lines).encode('utf-8')
+
+        def texts(records):
+            return [(r.input, r.result.text if r.result else r.result, type(r.error)) for r in records]
+
+        expected = texts(parser.parse_many(lines))
+
+        d = tempfile.mkdtemp()
+        try:
+            path = os.path.join(d, 'addresses.txt')
+            with open(path, 'wb') as f:
+                f.write(data)
+
+            for workers, chunk_bytes in ((1, 1 << 16), (1, 100), (2, 500)):
+                records = list(parser.parse_file(path, workers=workers, chunk_bytes=chunk_bytes))
+
+                self.assertEqual(expected, texts(records))
+                self.assertEqual(list(range(1, len(lines) + 1)), [r.line for r in records])
+                self.assertEqual(0, records[0].offset)
+                self.assertEqual(len(data), records[-1].next_offset)
+
+                for r in records:
+                    self.assertEqual(r.input, data[r.offset:r.next_offset].rstrip(b'\r\n').decode('utf-8'))
+
+                # Resume after the 100th line
+                last = records[99]
+                resumed = list(parser.parse_file(path, workers=workers, chunk_bytes=chunk_bytes,
+                                                 offset=last.next_offset, line=last.line + 1))
+
+                self.assertEqual(texts(records[100:]), texts(resumed))
+                self.assertEqual([(r.line, r.offset, r.next_offset) for r in records[100:]],
+                                 [(r.line, r.offset, r.next_offset) for r in resumed])
+
+            open(path, 'w').close()
+            self.assertEqual([], list(parser.parse_file(path)))
+
+        finally:
+            shutil.rmtree(d)
+
+    def test_parse_batch(self):
+
+        parser = Parser()
+
+        lines = list(self.addresses.keys())
+        lines = lines + lines[:3] + ['  ' + lines[0].replace(' ', '  '), '', lines[0].lower()]
+
+        batch = parser.parse_batch(lines)
+
+        self.assertEqual(len(lines), len(batch))
+        self.assertEqual(len(set(lines[:-4])) + 2, len(batch.unique_results))
+        self.assertIs(batch[0], batch[len(lines) - 3])
+        self.assertIsNot(batch[0], batch[len(lines) - 1])
+        self.assertIs(False, batch[len(lines) - 2])
+
+        for r, b in zip(parser.parse_many(lines), batch.records()):
+            self.assertEqual(r.index, b.index)
+            self.assertEqual(r.input, b.input)
+            self.assertEqual(str(r.result), str(b.result))
+
+        stats = batch.stats
+        self.assertEqual(len(lines), stats['rows'])
+        self.assertAlmostEqual(1.0 - float(stats['unique']) / stats['rows'], stats['dedupe_ratio'])
+
+        # With case folding, the lowercased address is a duplicate too
+        folded = parser.parse_batch(lines, fold_case=True)
+        self.assertIs(folded[0], folded[len(lines) - 1])
+
+    def test_parse_columns(self):
+
+        parser = Parser()
+
+        lines = list(self.addresses.keys())
+        lines = lines + ['   '] + [l.lower() for l in lines[:3]] + lines[:5]
+
+        cols = parser.parse_columns(lines, state='CA')
+
+        self.assertEqual(len(lines), len(cols['name']))
+
+        for i, line in enumerate(lines):
+            r = parser.parse(line, state='CA')
+            if r:
+                self.assertIsNone(cols['error'][i])
+                self.assertEqual(r.road.name, cols['name'][i])
+                self.assertEqual(r.number.number, cols['number'][i])
+                self.assertEqual(r.hash.hash, cols['hash'][i])
+            else:
+                self.assertEqual('blank address', cols['error'][i])
+
+        cols = parser.parse_columns(lines, fields=('name',))
+        self.assertEqual(['error', 'name'], sorted(cols.keys()))
+
+    def test_pandas_accessor(self):
+        try:
+            import pandas as pd
+        except ImportError:
+            raise unittest.SkipTest('pandas is not installed')
+
+        import address_parser.accessor
+
+        lines = list(self.addresses.keys())
+        s = pd.Series(lines + lines[:3] + [None], index=range(100, 100 + len(lines) + 4))
+
+        df = s.address.parse()
+
+        self.assertEqual(list(s.index), list(df.index))
+        self.assertEqual('Int64', str(df['number'].dtype))
+        self.assertEqual('category', str(df['city'].dtype))
+        self.assertEqual('category', str(df['zip'].dtype))
+
+        cols = Parser().parse_columns(lines + lines[:3] + [''])
+
+        self.assertEqual(cols['name'], [None if pd.isna(v) else v for v in df['name']])
+        self.assertEqual(cols['zip'], [None if pd.isna(v) else v for v in df['zip']])
+
+        # Overrides are aligned on the index, and missing values are not overrides
+        s = pd.Series(['100 Main St', '200 Oak Ave', '300 Elm St'], index=[7, 3, 5])
+        city = pd.Series(['Chula Vista', None, float('nan')], index=[5, 7, 3])
+        zip = pd.Series([pd.NA, '92101', '91910'], index=[3, 7, 5], dtype='string')
+
+        df = s.address.parse(city=city, zip=zip, state=float('nan'))
+
+        self.assertEqual([None, None, 'Chula Vista'], [None if pd.isna(v) else v for v in df['city']])
+        self.assertEqual(['92101', None, '91910'], [None if pd.isna(v) else v for v in df['zip']])
+        self.assertEqual(['ca', None, 'ca'], [None if pd.isna(v) else v for v in df['state']])  # From the zips
+
+    def test_stage_stats(self):
+        import pickle
+
+        parser = Parser()
+        self.assertIsNone(parser.stage_stats)
+
+        parser.instrument()
+
+        lines = list(self.addresses.keys())
+        for line in lines:
+            parser.parse(line)
+
+        stats = parser.stage_stats.stats
+
+        self.assertEqual(len(lines), stats['parses'])
+        self.assertEqual(len(lines), stats['stages']['number']['calls'])
+        self.assertEqual(len(lines), stats['stages']['zip']['calls'])
+        self.assertEqual(len([l for l in lines if '9' in l.split(',')[-1]]), stats['stages']['zip']['hits'])
+        self.assertEqual(len([l for l in lines if 'block' in l.lower()]), stats['stages']['block']['hits'])
+        self.assertEqual(len(lines), sum(stats['branches'].values()))
+        self.assertEqual(len([v for v in self.addresses.values() if v[2] == 'highway']), stats['branches']['highway'])
+        self.assertTrue(str(parser.stage_stats).startswith('stage'))
+
+        # A parse that fails is counted, with the stages that ran before it
+        parser.stage_stats.record([0.001, 0.001], [True, False], None)
+        stats = parser.stage_stats.stats
+        self.assertEqual(1, stats['branches']['failed'])
+        self.assertEqual(len(lines) + 1, stats['stages']['fraction']['calls'])
+        self.assertEqual(len(lines), stats['stages']['zip']['calls'])
+
+        self.assertIsNotNone(pickle.loads(pickle.dumps(parser)).stage_stats)
+
+        parser.stage_stats.reset()
+        self.assertEqual(0, parser.stage_stats.stats['parses'])
+
+        parser.instrument(False)
+        self.assertIsNone(parser.stage_stats)
+
+    def test_metrics(self):
+        import threading
+        from address_parser.stats import Metrics
+
+        parser = Parser(metrics=True, cache_size=10)
+
+        parser.parse('100 main st, san diego, ca')
+        parser.parse('100 main st, san diego, ca')
+        parser.parse('  ')
+        parser.parse('S Coast Hwy / Eaton St, Oceanside, CA')
+
+        with self.assertRaises(ParseError) as cm:
+            parser.parse('unit @ apt')
+
+        self.assertEqual('no_suite_word', cm.exception.reason)
+
+        list(parser.parse_many(['', '400 F Street , CHULA VISTA, CA 91910', 'unit @ apt']))
+
+        stats = parser.metrics.stats
+
+        self.assertEqual(4, stats['parsed'])
+        self.assertEqual(2, stats['empty'])
+        self.assertEqual(1, stats['cross_streets'])
+        self.assertEqual({'no_suite_word': 2}, stats['failed'])
+        self.assertEqual(6, stats['latency']['count'])
+        self.assertEqual(6, stats['latency']['buckets'][float('inf')])
+        self.assertEqual(1, stats['cache']['hits'])
+
+        text = parser.metrics.prometheus()
+        self.assertIn('address_parser_parsed_total 4\n', text)
+        self.assertIn('address_parser_failed_total{reason="no_suite_word"} 2\n', text)
+        self.assertIn('address_parser_parse_seconds_bucket{le="+Inf"} 6\n', text)
+        self.assertIn('address_parser_cache_hits_total 1\n', text)
+
+        # Other exceptions are counted by their class name
+        m = Metrics()
+        m.observe_failure(KeyError('x'), 0.001)
+        self.assertEqual({'KeyError': 1}, m.stats['failed'])
+
+        # Parsers can share a Metrics, from many threads
+        shared = Metrics()
+        parsers = [Parser(metrics=shared) for _ in range(4)]
+
+        def work(p):
+            for _ in range(50):
+                p.parse('100 main st')
+
+        threads = [threading.Thread(target=work, args=(p,)) for p in parsers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(200, shared.stats['parsed'])
+
+        shared.reset()
+        self.assertEqual(0, shared.stats['latency']['count'])
+
+    def test_cross_street(self):
+
+        r = Parser().parse('Thunder Dr / Westwood Rd, Oceanside, CA')
+
+        self.assertEqual('Thunder', r.road.name)
+        self.assertEqual('Westwood', r._cross_street.road.name)
+        self.assertEqual('Thunder Dr / Westwood Rd, Oceanside, CA', r.text)
+
+    def test_async_parser(self):
+        import asyncio
+        from address_parser.aio import AsyncParser
+
+        lines = list(self.addresses.keys()) + ['', 'unit @ apt']
+        expected = [(str(r.result), type(r.error)) for r in Parser().parse_many(lines)]
+
+        produced = []
+
+        async def source(n):
+            for i in range(n):
+                produced.append(i)
+                yield lines[i % len(lines)]
+
+        async def main():
+            async with AsyncParser(batch_size=4, max_concurrency=2) as ap:
+
+                async def one(line):
+                    try:
+                        return str(await ap.parse(line)), type(None)
+                    except Exception as e:
+                        return 'None', type(e)
+
+                self.assertEqual(expected, list(await asyncio.gather(*[one(l) for l in lines])))
+
+                records = [r async for r in ap.parse_stream(source(len(lines)))]
+                self.assertEqual(list(range(len(lines))), [r.index for r in records])
+                self.assertEqual(expected, [(str(r.result), type(r.error)) for r in records])
+
+                # The source is only read a few batches ahead of the consumer
+                del produced[:]
+                stream = ap.parse_stream(source(1000))
+                await stream.__anext__()
+                await asyncio.sleep(0.05)
+                self.assertLess(len(produced), 40)
+                await stream.aclose()
+
+        async def consume(stream):
+            return [r async for r in stream]
+
+        async def failing():
+            # A batch that can't be submitted ends the stream with the error; the timeout turns a hang
+            # into a failure.
+            ap = AsyncParser()
+            ap.close()
+
+            with self.assertRaises(RuntimeError):
+                await asyncio.wait_for(consume(ap.parse_stream(lines)), 10)
+
+            async def broken_source():
+                yield lines[0]
+                raise ValueError('source failed')
+
+            async with AsyncParser() as ap:
+                with self.assertRaises(ValueError):
+                    await asyncio.wait_for(consume(ap.parse_stream(broken_source())), 10)
+
+        asyncio.run(main())
+        asyncio.run(failing())
+
+    def test_thread_safety(self):
+        import os
+        import sys
+        import random
+        import threading
+        from address_parser.parser import Scanner
+
+        with open(os.path.join(os.path.dirname(__file__), 'support', 'crime_addresses.txt')) as f:
+            lines = f.read().splitlines()
+
+        def outcome(p, line):
+            try:
+                r = p.parse(line)
+                return (r.dict, r.text) if r else r
+            except Exception as e:
+                return type(e)
+
+        expected = {line: outcome(Parser(), line) for line in lines}
+
+        # One parser for all of the threads, with every kind of shared state turned on. The small cache
+        # forces evictions, and the short switch interval forces threads to interleave.
+        for scanner_class in (None, Scanner):
+            parser = Parser(cache_size=50, metrics=True, instrument=True, scanner_class=scanner_class)
+            errors = []
+
+            def work(seed):
+                rnd = random.Random(seed)
+                mine = lines[:]
+                rnd.shuffle(mine)
+                for line in mine[:300]:
+                    if outcome(parser, line) != expected[line]:
+                        errors.append(line)
+
+            interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+            try:
+                threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+            finally:
+                sys.setswitchinterval(interval)
+
+            self.assertEqual([], errors)
+
+            stats = parser.metrics.stats
+            self.assertEqual(8 * 300, stats['parsed'] + sum(stats['failed'].values()) + stats['empty'])
+
+        records = list(Parser(cache_size=50).parse_threaded(lines, workers=4, chunksize=7))
+        self.assertEqual(list(range(len(lines))), [r.index for r in records])
+        self.assertEqual([expected[l] for l in lines],
+                         [(r.result.dict, r.result.text) if r.result else (r.result if r.error is None else type(r.error))
+                          for r in records])
+
+    def test_address_index(self):
+        import os
+        import shutil
+        import tempfile
+        from address_parser.index import AddressIndex
+
+        parser = Parser()
+
+        with open(os.path.join(os.path.dirname(__file__), 'support', 'crime_addresses.txt')) as f:
+            lines = f.read().splitlines()
+
+        records = [r for r in parser.parse_many(lines) if r.ok]
+
+        d = tempfile.mkdtemp()
+        try:
+            # A small run size exercises the external merge
+            idx = AddressIndex.build_from_records(os.path.join(d, 'a.idx'), records, run_size=100)
+
+            self.assertEqual(len(records), len(idx))
+            self.assertEqual(['a.idx'], os.listdir(d))  # The runs are removed
+
+            by_hash = {}
+            for r in records:
+                by_hash.setdefault(r.result.hash.hash, []).append(r.index)
+
+            for h, ids in by_hash.items():
+                self.assertEqual(ids, idx.get(h))
+                self.assertIn(h, idx)
+
+            self.assertNotIn('0' * 32, idx)
+            self.assertEqual([], idx.get('f' * 32))
+
+            self.assertEqual(sorted((h, ids) for h, ids in by_hash.items() if len(ids) > 1),
+                             sorted(idx.groups()))
+
+            # Merge with a shard that numbered its records from zero
+            shard = AddressIndex.build_from_records(os.path.join(d, 'b.idx'), records[:10])
+            merged = AddressIndex.merge(os.path.join(d, 'm.idx'), [idx, shard], offsets=[0, 100000])
+
+            self.assertEqual(len(idx) + 10, len(merged))
+            h = records[0].result.hash.hash
+            self.assertEqual(idx.get(h) + [100000 + i for i in shard.get(h)], merged.get(h))
+
+            for i in (idx, shard, merged):
+                i.close()
+
+            empty = AddressIndex.build(os.path.join(d, 'e.idx'), [])
+            self.assertEqual(0, len(empty))
+            self.assertEqual([], empty.get(h))
+            empty.close()
+
+        finally:
+            shutil.rmtree(d)
+
+    def test_linkage(self):
+        from address_parser.linkage import BlockIndex, link, blocking_keys
+
+        parser = Parser()
+
+        left = ['100 main st, san diego, ca 92101',
+                '100 main st, san diego, ca 92101',
+                '2500 el camino real, carlsbad, ca 92008',
+                '150 oak st, san diego, ca 92101',
+                '7 elm ave, la mesa, ca 91941']
+
+        right = ['100 mian st, san diego, ca 92101',  # Misspelled street
+                 '2500 el camino real, carlsbad',     # No zip
+                 '9999 nowhere ln, el centro, ca 92243']
+
+        index = BlockIndex()
+        self.assertEqual(len(left), index.add_records(parser.parse_many(left)))
+
+        candidates = list(index.match(parser.parse_many(right), threshold=0.8))
+
+        by_right = {}
+        for c in candidates:
+            by_right.setdefault(c.right, []).append(c)
+
+        self.assertEqual([0, 1], sorted(c.left for c in by_right[0]))
+        self.assertEqual([2], [c.left for c in by_right[1]])
+        self.assertNotIn(2, by_right)
+
+        for cs in by_right.values():
+            self.assertEqual(sorted((c.score for c in cs), reverse=True), [c.score for c in cs])
+            self.assertTrue(all(0.8 <= c.score <= 1.0 for c in cs))
+
+        s = index.stats
+        self.assertEqual(len(left) * len(right), s['possible'])
+        self.assertEqual(s['possible'] - s['compared'], s['avoided'])
+        self.assertLess(s['compared'], s['possible'])
+        self.assertEqual(len(candidates), s['matched'])
+
+        self.assertEqual(candidates, list(link(parser.parse_many(left), parser.parse_many(right), threshold=0.8)))
+        self.assertEqual(1, len(list(link(parser.parse_many(left), parser.parse_many(right[:1]), top=1))))
+
+        # Oversized blocks are dropped
+        index = BlockIndex(max_block_size=1)
+        index.add_records(parser.parse_many(left))
+        self.assertEqual({1}, set(len(index._blocks[k]) for k in index._blocks if index._blocks[k]))
+        self.assertGreater(index.stats['oversized_blocks'], 0)
+
+        self.assertEqual(3, len(blocking_keys(parser.parse(left[0]))))
+        self.assertEqual(1, len(blocking_keys(parser.parse('100 main st'))))
+
+    def test_persistent_cache(self):
+        import os
+        import pickle
+        import shutil
+        import tempfile
+        from address_parser import parallel
+        from address_parser.cache import SQLiteCache, DbmCache
+
+        lines = ['100 main st, san diego, ca 92101', '100  main st, san diego, ca 92101',
+                 '2500 el camino real, carlsbad', 'unit @ apt', '', '100 main st, san diego, ca 92101']
+
+        def texts(records):
+            return [(r.result.text if r.result else r.result, type(r.error)) for r in records]
+
+        expected = texts(Parser(cache_size=100).parse_many(lines))
+
+        d = tempfile.mkdtemp()
+        try:
+            for cls in (SQLiteCache, DbmCache):
+                path = os.path.join(d, cls.__name__)
+
+                with cls(path, write_batch=2) as cache:
+                    parser = Parser(cache=cache)
+                    self.assertEqual(expected, texts(parser.parse_many(lines)))
+                    self.assertEqual(2, cache.stats['hits'])  # The repeated lines
+                    self.assertEqual(2, len(cache))
+
+                    # Results can be changed without changing the cache
+                    r = parser.parse(lines[0])
+                    r._name = 'Other'
+                    self.assertEqual('Main', parser.parse(lines[0]).road.name)
+
+                # A rerun reads everything from the file
+                with cls(path) as cache:
+                    parser = Parser(cache=cache)
+                    self.assertEqual(expected, texts(parser.parse_many(lines)))
+                    # Failures are not cached
+                    self.assertEqual((4, 1), (cache.stats['hits'], cache.stats['misses']))
+                    self.assertEqual(0, cache.stats['writes'])
+
+                    b = parser.parse_batch(lines * 3)
+                    self.assertEqual([e[0] for e in expected * 3], [r.text if r else r for r in b.results])
+                    self.assertEqual((6, 2), (cache.stats['hits'], cache.stats['misses']))
+
+                    self.assertIn((lines[2], None, None, None), cache)
+                    self.assertNotIn((lines[2], 'carlsbad', None, None), cache)
+
+                    # Results from another version of the parser are discarded
+                    cache._set_meta('fingerprint', 'old')
+
+                with cls(path) as cache:
+                    self.assertEqual(0, len(cache))
+
+            # The parser, with a cache that processes can share, can be sent to a worker
+            with SQLiteCache(os.path.join(d, 'SQLiteCache')) as cache:
+                p2 = pickle.loads(pickle.dumps(Parser(cache=cache)))
+                self.assertIsInstance(p2.cache, SQLiteCache)
+                self.assertEqual(cache.path, p2.cache.path)
+                p2.cache.close()
+
+            with DbmCache(os.path.join(d, 'DbmCache')) as cache:
+                self.assertIsNone(pickle.loads(pickle.dumps(Parser(cache=cache))).cache)
+
+            # Forked workers open their own connection to a SQLite cache, and don't use a dbm cache
+            many = ['{} main st, san diego, ca 92101'.format(i) for i in range(1, 301)]
+            expected = texts(Parser().parse_many(many))
+
+            def size(path):
+                return sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d)
+                           if os.path.join(d, f).startswith(path))
+
+            for cls, n in ((SQLiteCache, len(many)), (DbmCache, 0)):
+                path = os.path.join(d, 'parallel_' + cls.__name__)
+
+                with cls(path) as cache:
+                    parser = Parser(cache=cache)
+
+                    parallel._init_worker(parser)
+                    self.assertIsNot(cache, parallel._worker_parser.cache)
+                    if parallel._worker_parser.cache is not None:
+                        parallel._worker_parser.cache.close()
+
+                    before = size(path)
+                    self.assertEqual(expected, texts(parser.parse_parallel(many, workers=2, chunksize=50)))
+
+                    if cls is DbmCache:
+                        self.assertEqual(before, size(path))
+
+                with cls(path) as cache:
+                    self.assertEqual(n, len(cache))
+                    self.assertEqual(expected, texts(Parser(cache=cache).parse_many(many)))
+                    self.assertEqual(n, cache.stats['hits'])
+
+            # The fingerprint covers the street type table that was loaded
+            from address_parser import cache as cache_module, grammar
+
+            fp, g = cache_module.fingerprint(), grammar._grammar
+            try:
+                grammar._grammar = grammar.Grammar(dict(g.street_types, plz='pl'))
+                cache_module._fingerprint = None
+                self.assertNotEqual(fp, cache_module.fingerprint())
+            finally:
+                grammar._grammar, cache_module._fingerprint = g, fp
+
+        finally:
+            shutil.rmtree(d)
+
+    def test_gazetteer(self):
+        import os
+        import pickle
+        import tempfile
+        from address_parser.gazetteer import Gazetteer, get_gazetteer
+
+        def city(parser, s):
+            return parser.parse(s).locality.city
+
+        plain = Parser()
+        parser = Parser(cities=True)
+
+        # Without a gazetteer, the city is found only after a comma
+        self.assertIsNone(plain.gazetteer)
+        self.assertIsNone(city(plain, '100 main st oceanside ca'))
+        self.assertEqual('oceanside', city(parser, '100 main st oceanside ca'))
+        self.assertEqual('oceanside', city(parser, '1000 S BLOCK CLEVELAND STREET  Oceanside CA'))
+        self.assertEqual('chula vista', city(parser, '100 main st, chula vista, ca'))
+
+        # The longest name wins
+        r = parser.parse('100 main st chula vista ca 91910')
+        self.assertEqual(('chula vista', 'Main', 'st', '91910'), (r.locality.city, r.road.name, r.road.suffix, r.locality.zip))
+        self.assertEqual('rancho santa fe', city(parser, '100 main st rancho santa fe'))
+        self.assertEqual('san diego', city(parser, '477 camino del rio s san diego ca 92108'))
+
+        # A city name that is the street is left alone
+        self.assertIsNone(city(parser, '100 w vista'))
+        self.assertEqual('Vista', parser.parse('100 vista way').road.name)
+
+        self.assertIs(get_gazetteer(True), parser.gazetteer)
+        self.assertIn('Chula Vista', parser.gazetteer)
+        self.assertNotIn('chula', parser.gazetteer)
+
+        # User lists, as names or a CSV file
+        mine = Parser(cities=['Springfield', 'North Haverbrook'])
+        self.assertEqual('north haverbrook', city(mine, '742 Evergreen Terrace North Haverbrook'))
+        self.assertIsNone(city(mine, '100 main st oceanside'))
+
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write('name,state\nShelbyville,XX\n')
+            self.assertEqual(['shelbyville'], Parser(cities=path).gazetteer.names)
+        finally:
+            os.remove(path)
+
+        # The gazetteer goes with the parser to worker processes, and is part of the cache key
+        p2 = pickle.loads(pickle.dumps(mine))
+        self.assertIsInstance(p2.gazetteer, Gazetteer)
+        self.assertEqual(mine.gazetteer.names, p2.gazetteer.names)
+        self.assertNotEqual(Parser(cache_size=10)._cache_tag, Parser(cities=True, cache_size=10)._cache_tag)
+
+    def test_states(self):
+        import pickle
+        from address_parser.states import zip_states, state_code
+
+        parser = Parser()
+
+        def locality(s, **kwargs):
+            l = parser.parse(s, **kwargs).locality
+            return l.city, l.state, l.zip, l.state_mismatch
+
+        self.assertEqual(('ca',), zip_states('92101-1234'))
+        self.assertEqual(('tx',), zip_states(73301))
+        self.assertEqual((), zip_states('9210'))
+        self.assertEqual((), zip_states('00100'))
+        self.assertEqual('nc', state_code('North  Carolina'))
+        self.assertEqual('ny', state_code('NY'))
+        self.assertIsNone(state_code('xx'))
+
+        # Abbreviations and full names, in either case
+        self.assertEqual(('portland', 'or', '97201', False), locality('100 main st, portland, or 97201'))
+        self.assertEqual(('raleigh', 'nc', None, False), locality('100 main st, raleigh, north carolina'))
+        self.assertEqual(('raleigh', 'nc', '27601', False), locality('100 Main St, Raleigh, North Carolina 27601'))
+        self.assertEqual((None, 'dc', '20500', False), locality('1600 Pennsylvania Ave NW District of Columbia 20500'))
+        self.assertEqual((None, 'tx', None, False), locality('100 main st tx'))
+
+        # Words that are also states need a comma or a zip in the state
+        r = parser.parse('100 main ct')
+        self.assertEqual(('ct', None), (r.road.suffix, r.locality.state))
+        self.assertIsNone(parser.parse('100 main st ne').locality.state)
+        self.assertEqual('Washington', parser.parse('100 washington').road.name)
+
+        # The state is filled in from the zip, and a state that the zip is not in is flagged
+        self.assertEqual((None, 'ca', '92101', False), locality('100 main st 92101'))
+        self.assertEqual(('boston', 'ma', '92101', True), locality('100 main st, boston, ma 92101'))
+        self.assertEqual((None, 'ca', '92101', False), locality('100 main st', zip='92101'))
+        self.assertEqual((None, 'California', '92101', False), locality('100 main st', state='California', zip='92101'))
+        self.assertTrue(locality('100 main st', state='Nevada', zip='92101')[3])
+
+        # But not for a PO box, or a number alone, where the five digits may not be a zip, and a state
+        # alone is left for the street
+        self.assertEqual('P.O Box 33170', parser.parse('P.O. Box 33170').text)
+        self.assertEqual((None, None, '33170', False), locality('PO Box 33170'))
+        self.assertIsNone(parser.parse('100 33170').locality.state)
+        self.assertEqual(('Nv', None), (parser.parse('nv').road.name, parser.parse('nv').locality.state))
+        self.assertEqual('ca', parser.parse('ca 92101').locality.state)
+
+        # Cross streets are checked too
+        r = parser.parse('100 main st / 200 oak ave 92101')
+        self.assertEqual('ca', r._cross_street.locality.state)
+        r = parser.parse('100 main st / 200 oak ave, boston, ma 92101')
+        self.assertTrue(r._cross_street.locality.state_mismatch)
+
+        r = parser.parse('100 main st, boston, ma 92101')
+        self.assertTrue(pickle.loads(pickle.dumps(r)).locality.state_mismatch)
+        self.assertTrue(r.copy().locality.state_mismatch)
+
+    def test_cache(self):
+
+        parser = Parser(cache_size=4)
+        uncached = Parser()
+
+        lines = list(self.addresses.keys())
+
+        for line in lines + lines[:4] + ['  ' + lines[0] + '  ']:
+            self.assertEqual(uncached.parse(line).dict, parser.parse(line).dict)
+
+        # The first four lines had been evicted when they were parsed again, but the padded copy
+        # of the first line normalizes to the same key as the first line.
+        self.assertEqual(4, len(parser.cache))
+        self.assertEqual(len(lines) + 4, parser.cache.misses)
+        self.assertEqual(1, parser.cache.hits)
+        self.assertEqual(len(lines), parser.cache.evictions)
+
+        r = parser.parse(lines[0])
+        self.assertEqual(2, parser.cache.hits)
+
+        # Changing a result must not change the cached copy
+        r.road.name = 'Changed'
+        self.assertEqual('Cleveland', parser.parse(lines[0]).road.name)
+
+        r = parser.parse(lines[0], city='La Mesa')
+        self.assertEqual('La Mesa', r.locality.city)
+
+        # Whitespace can survive into a result, and the cache parses the address as it is given
+        line = '8 Drive /,  San Diego Ca'
+        self.assertEqual(uncached.parse(line).text, parser.parse(line).text)
+
+    def test_result(self):
+        import pickle
+        from address_parser import ParsedAddress
+
+        parser = Parser()
+
+        r = parser.parse('1900 E Grand Avenue, CHULA VISTA, CA 91913-1234')
+
+        self.assertIsInstance(r, ParsedAddress)
+        self.assertFalse(hasattr(r, '__dict__'))
+
+        self.assertEqual(1900, r.number.number)
+        self.assertEqual('P', r.road.type)
+        self.assertEqual('Grand', r.road.name)
+        self.assertEqual('91913', r.locality.zip4)
+        self.assertEqual('1900 E Grand Ave, Chula Vista, CA 91913-1234', str(r))
+        self.assertEqual('1900 E Grand Ave', r.street_str())
+        self.assertEqual('chula vista', r.args['city'])
+
+        d = r.dict
+        self.assertEqual(['hash', 'locality', 'number', 'road', 'text'], sorted(d.keys()))
+        self.assertEqual('ave', d['road']['suffix'])
+        self.assertEqual(r.hash.hash, d['hash']['hash'])
+
+        self.assertEqual(d, pickle.loads(pickle.dumps(r)).dict)
+
+    def test_lazy_hash(self):
+
+        parser = Parser()
+
+        r = parser.parse('1900 Grand Avenue, CHULA VISTA, CA 91913')
+
+        self.assertIsNone(r._fuzzy_hash)
+
+        self.assertEqual('1900|.|.|.|.|grand|.|ave|chula vista|ca|91913', r.hash.hash_string)
+        self.assertEqual('1900|.|krnt|xlfst|k|91913', r.hash.fuzzy_hash_string)
+        self.assertEqual('f2fb21656714dc4f3235c35dd0092321', r.hash.fuzzy_hash)
+        self.assertEqual(r.hash.fuzzy_hash, r._fuzzy_hash)
+        self.assertEqual('1900 Grand Ave, Chula Vista, CA 91913', r.text)
+
+    def test_phonetic_cache(self):
+        from address_parser import phonetic_cache, phonetic_key, preload_phonetic_keys
+        from phonetics import metaphone
+
+        phonetic_cache.clear()
+
+        self.assertEqual(2, preload_phonetic_keys(['Jamacha\n', '', 'Chula Vista\n']))
+        self.assertEqual(2, phonetic_cache.misses)
+
+        self.assertEqual(metaphone('Jamacha'), phonetic_key('Jamacha'))
+        self.assertEqual(1, phonetic_cache.hits)
+
+        # Separate parsers share the cache
+        for parser in (Parser(), Parser()):
+            parser.parse('10700 Jamacha , SPRING VALLEY, CA 91978').hash.fuzzy_hash
+
+        # The street name was preloaded, and the city and state are only computed once
+        self.assertEqual(5, phonetic_cache.hits)
+        self.assertEqual(4, phonetic_cache.misses)
+
+    def test_token_stream(self):
+        from address_parser import TokenStream
+
+        def tokens(s):
+            return [(ord(c), c) for c in s]
+
+        ts = TokenStream(tokens('abcde'), classify=lambda v: 1 if v in 'bd' else 0, nbits=1)
+
+        self.assertEqual((97, 'a'), ts.take())
+        self.assertEqual((100, 'd'), ts.take(-2))
+        self.assertEqual((99, 'c'), ts.take(1))
+        self.assertEqual(tokens('be'), list(ts))
+
+        ts.insert(0, (120, 'x'))
+        ts.insert(1, (121, 'y'))
+        self.assertEqual(tokens('xybe'), list(ts))
+        self.assertEqual((101, 'e'), ts[-1])
+
+        self.assertTrue(ts.has_value('b'))
+        self.assertFalse(ts.has_value('a'))
+        self.assertTrue(ts.has_type(120))
+        self.assertEqual(2, ts.find_bit(0))
+        self.assertEqual(2, ts.find_flag(1))
+        self.assertIs(False, ts.find_flag(2))
+        self.assertEqual(3, ts.find_type(101, reverse=True))
+
+        ts.save()
+        self.assertEqual(tokens('xyb'), [ts.take(), ts.take(), ts.take()])
+        self.assertFalse(ts.has_bit(0))
+        ts.insert(0, (122, 'z'))
+        self.assertEqual(tokens('ze'), list(ts))
+
+        ts.restore()
+        self.assertEqual(tokens('xybe'), list(ts))
+        self.assertTrue(ts.has_bit(0))
+        self.assertFalse(ts.has_value('z'))
+
+        self.assertRaises(IndexError, lambda: ts[-5])
+        self.assertRaises(IndexError, lambda: ts.take(4))
+
+        # Far from the end, taken tokens leave tombstones, and putting one back fills its slot
+        values = list(range(200))
+        ts = TokenStream([(v % 7, v) for v in values], classify=lambda v: 1 if v % 10 == 0 else 0, nbits=1)
+
+        p = ts.find_value(50)
+        self.assertEqual((1, 50), ts.take(p))
+        ts.insert(p, (1, 50))
+        self.assertEqual(values, [v for _, v in ts])
+
+        for v in range(20, 120, 3):
+            self.assertEqual((v % 7, v), ts.take(ts.find_value(v)))
+            values.remove(v)
+
+        self.assertEqual(values, [v for _, v in ts])
+        self.assertEqual(values[-3], ts[-3][1])
+        self.assertEqual(values.index(130), ts.find_value(130))
+        self.assertEqual(values.index(190), ts.find_bit(0, reverse=True))
+
+        self.assertEqual(5, ts.discard(1, 5))
+        values = [v for v in values if v % 10 or v > 60]
+        self.assertEqual(values, [v for _, v in ts])
+        self.assertEqual(len(values), len(ts))
+
+    def test_fast_scanner(self):
+        import os
+        import glob
+        from address_parser import Scanner, FastScanner
+
+        parser = Parser()
+        scanner, fast = Scanner(parser), FastScanner(parser)
+
+        lines = [t for t in tests] + list(self.streets.keys()) + ['a\u00e9 12\u0663 \t#5']
+        for fn in glob.glob(os.path.join(os.path.dirname(__file__), 'support', '*.txt')):
+            with open(fn) as f:
+                lines.extend(f)
+
+        for line in lines:
+            self.assertEqual(scanner.scan(line), fast.scan(line), line)
+
+        self.assertIsInstance(parser.scanner, FastScanner)
+        self.assertIsInstance(Parser(scanner_class=Scanner).scanner, Scanner)
+
+    def test_grammar(self):
+        from address_parser.grammar import get_grammar, read_street_types, load_street_types
+
+        p1, p2 = Parser(), Parser()
+
+        self.assertIs(get_grammar(), p1.grammar)
+        self.assertIs(p1.grammar, p2.grammar)
+        self.assertIs(p1.scanner, p2.scanner)
+
+        with self.assertRaises(AttributeError):
+            p1.grammar.zip_regex = None
+
+        with self.assertRaises(TypeError):
+            p1.street_types['foo'] = 'bar'
+
+        # The snapshot must be regenerated, with 'make snapshot', when suffixes.csv changes
+        self.assertEqual(read_street_types(), load_street_types())
+
+    def test_token_flags(self):
+        from address_parser.grammar import get_grammar, STATE, STREET_TYPE, DIRECTION, HIGHWAY_WORD, SUITE_WORD
+
+        g = get_grammar()
+
+        self.assertTrue(g.token_flags('ave') & STREET_TYPE)
+        self.assertTrue(g.token_flags('hwy') & HIGHWAY_WORD)
+        self.assertTrue(g.token_flags('ca') & STATE)
+        self.assertTrue(g.token_flags('ne') & DIRECTION)
+        self.assertTrue(g.token_flags('apt') & SUITE_WORD)
+        self.assertEqual(0, g.token_flags('xyzzy'))
+
+        # The lexicon must agree with the patterns it replaces
+        for w in list(g.street_types) + list(g.suite_words) + ['n', 'nw', 'north', 'ca', 'caa', 'apt5', '92101']:
+            self.assertEqual(g.classify(w), g.token_flags(w), w)
+            self.assertEqual(bool(g.suite_regex.match(w)), bool(g.token_flags(w) & SUITE_WORD), w)
+            self.assertEqual(bool(g.state_regex.match(w)), bool(g.token_flags(w) & STATE), w)
+
+        tokens, flags, rest = Parser().scanner.scan_tagged('100 n main st')
+        self.assertEqual([g.token_flags(v) for _, v in tokens], flags)
+        self.assertTrue(flags[1] & DIRECTION)
+        self.assertTrue(flags[3] & STREET_TYPE)
+
 
 if __name__ == '__main__':
     unittest.main()